@@ -0,0 +1,134 @@
+'''Adapter benchmark against the local mock upstream.
+
+Two parts:
+  1. SSE parsing: the old `aiter_lines` + string slicing loop versus the
+     incremental byte-level SSEParser, on the same recorded stream.
+  2. End to end: every registered OpenAI-compatible adapter streams from the
+     same mock server with N concurrent requests (pooled client reused).
+
+Run:
+    python -m backend.benchmarks.bench_adapters --requests 200 --concurrency 20 --tokens 200
+'''
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from httpx._decoders import LineDecoder, TextDecoder
+
+from backend.benchmarks.mock_upstream import serve_in_thread
+from backend.services.ai.deepseek import DeepSeek
+from backend.services.ai.gemini import Gemini
+from backend.services.ai.openai import OpenAI
+from backend.services.ai.openai_compat import SSEParser
+
+MESSAGES = [{"role": "user", "content": "benchmark"}]
+
+
+def _recorded_stream(tokens: int, chunk_size: int) -> list[bytes]:
+    body = b"".join(
+        f"data: {json.dumps({'choices': [{'delta': {'content': f'tok{i} '}}]})}\n\n".encode()
+        for i in range(tokens)
+    ) + b"data: [DONE]\n\n"
+    return [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+
+def _parse_lines_baseline(chunks: list[bytes], loads=json.loads) -> int:
+    # What httpx's aiter_lines + the old adapter loop did: incremental text
+    # decoding, line splitting, then string prefix checks and slicing
+    count = 0
+    text_decoder = TextDecoder("utf-8")
+    line_decoder = LineDecoder()
+    for chunk in chunks:
+        for raw in line_decoder.decode(text_decoder.decode(chunk)):
+            if not raw.startswith("data: "):
+                continue
+            content = raw[6:]
+            if content == "[DONE]":
+                return count
+            loads(content)
+            count += 1
+    return count
+
+
+def _parse_sse(chunks: list[bytes], loads=json.loads) -> int:
+    count = 0
+    parser = SSEParser()
+    for chunk in chunks:
+        for data in parser.feed(chunk):
+            if data == "[DONE]":
+                return count
+            loads(data)
+            count += 1
+    return count
+
+
+def bench_parser(tokens: int, rounds: int) -> None:
+    print(f"SSE parsing, {tokens} events x {rounds} rounds")
+    # Framing alone, then framing plus json.loads of every payload
+    for json_label, loads in (("framing", len), ("framing+json", json.loads)):
+        for chunk_size in (64, 1024, 16384):
+            chunks = _recorded_stream(tokens, chunk_size)
+            for label, fn in (("aiter_lines+slice", _parse_lines_baseline), ("SSEParser", _parse_sse)):
+                t0 = time.perf_counter()
+                for _ in range(rounds):
+                    assert fn(chunks, loads) == tokens
+                elapsed = time.perf_counter() - t0
+                print(
+                    f"  {json_label:<12} chunk={chunk_size:>5}  {label:<18}"
+                    f" {tokens * rounds / elapsed:>12,.0f} events/s"
+                )
+
+
+async def _bench_adapter(adapter, requests: int, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    ttfbs: list[float] = []
+    events = 0
+
+    async def one():
+        nonlocal events
+        async with sem:
+            async for ev in await adapter.chat(MESSAGES, stream=True, model="mock"):
+                if "meta" in ev:
+                    ttfbs.append(ev["meta"]["ttfb"])
+                else:
+                    events += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - t0
+    await adapter.aclose()
+    return {
+        "req/s": requests / elapsed,
+        "events/s": events / elapsed,
+        "ttfb_ms": statistics.median(ttfbs) * 1000,
+    }
+
+
+def bench_adapters(args) -> None:
+    print(f"\nEnd to end, {args.requests} streams x {args.tokens} tokens, concurrency {args.concurrency}")
+    with serve_in_thread(args.port, tokens=args.tokens) as endpoint:
+        for cls in (DeepSeek, OpenAI, Gemini):
+            stats = asyncio.run(_bench_adapter(cls(endpoint=endpoint, api_key=""), args.requests, args.concurrency))
+            print(
+                f"  {cls.name:<9} {stats['req/s']:>8.1f} req/s  {stats['events/s']:>10,.0f} events/s"
+                f"  median ttfb {stats['ttfb_ms']:.1f} ms"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=200, help="Parser benchmark repetitions")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    bench_parser(args.tokens, args.rounds)
+    bench_adapters(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+'''Load-balancer benchmark against several local mock upstreams.
+
+Starts one mock server per entry in --ttfbs (each answering after that many
+seconds), plus optionally one that always answers 429, and sends N
+concurrent streaming requests through a single adapter whose pool holds all
+of them. Each strategy is run with a fresh pool; the report shows request
+latency percentiles and how traffic was spread across the backends.
+
+Run:
+    python -m backend.benchmarks.bench_balancer --requests 300 --concurrency 30 --ttfbs 0.01,0.05,0.2 --failing
+'''
+
+import argparse
+import asyncio
+import contextlib
+import statistics
+import time
+
+from backend.benchmarks.mock_upstream import serve_in_thread
+from backend.services.ai.balancer import STRATEGIES
+from backend.services.ai.deepseek import DeepSeek
+
+MESSAGES = [{"role": "user", "content": "benchmark"}]
+
+
+async def _run(adapter: DeepSeek, requests: int, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                async for _ in await adapter.chat(MESSAGES, stream=True, model="mock"):
+                    pass
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - t0
+    await adapter.aclose()
+    latencies.sort()
+    return {
+        "req/s": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else float("nan"),
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--ttfbs", default="0.01,0.05,0.2", help="Comma-separated response delay per mock backend")
+    parser.add_argument("--failing", action="store_true", help="Add a backend that always answers 429")
+    parser.add_argument("--port", type=int, default=9200, help="First port; one per backend")
+    args = parser.parse_args()
+
+    ttfbs = [float(t) for t in args.ttfbs.split(",") if t]
+    with contextlib.ExitStack() as stack:
+        endpoints = [
+            stack.enter_context(serve_in_thread(args.port + i, tokens=args.tokens, ttfb=ttfb))
+            for i, ttfb in enumerate(ttfbs)
+        ]
+        labels = [f"ttfb={t}" for t in ttfbs]
+        if args.failing:
+            endpoints.append(stack.enter_context(serve_in_thread(args.port + len(ttfbs), fail_status=429)))
+            labels.append("429")
+
+        print(f"{args.requests} streams, concurrency {args.concurrency}, backends: {', '.join(labels)}")
+        for strategy in STRATEGIES:
+            adapter = DeepSeek(backends=[(ep, None) for ep in endpoints], strategy=strategy)
+            stats = asyncio.run(_run(adapter, args.requests, args.concurrency))
+            share = "  ".join(
+                f"{label}:{u.requests}" for label, u in zip(labels, adapter.pool.upstreams)
+            )
+            print(
+                f"  {strategy:<16} {stats['req/s']:>7.1f} req/s  p50 {stats['p50_ms']:>7.1f} ms"
+                f"  p95 {stats['p95_ms']:>7.1f} ms  errors {stats['errors']}  | {share}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+'''File-system RPC over one WebSocket versus the HTTP routes.
+
+Serves the real app with uvicorn, points the userdata/ mount at a temporary
+directory holding --files small files and one --big-mb file, then measures:
+  1. latency: sequential stat / list / read of small files, one at a time
+  2. throughput: --ops small-file reads with --concurrency in flight; HTTP
+     is run both with 6 connections (what a browser allows per host over
+     HTTP/1.1) and with one connection per in-flight request
+  3. large read: the big file via GET /read versus chunk frames
+HTTP uses a keep-alive httpx client; WebSocket runs JSON and MessagePack.
+
+Run:
+    python -m backend.benchmarks.bench_fs_ws --files 200 --ops 2000 --concurrency 32
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from backend.services import file_operations, ws_codec
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+
+class WsRpc:
+    """Minimal multiplexing client for /frontend/fs/ws."""
+
+    def __init__(self, conn, msgpack: bool) -> None:
+        self.conn = conn
+        self.msgpack = msgpack
+        self.next_id = 0
+        self.pending: dict[int, asyncio.Future] = {}
+        self.chunks: dict[int, list] = {}
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        async for raw in self.conn:
+            msg = json.loads(raw) if isinstance(raw, str) else ws_codec.from_frame(ws_codec.unpackb(raw))
+            rid = msg["request_id"]
+            if "chunk" in msg:
+                self.chunks.setdefault(rid, []).append(msg["chunk"])
+                continue
+            chunks = self.chunks.pop(rid, None)
+            self.pending.pop(rid).set_result("".join(chunks) if chunks else msg.get("result", msg.get("error")))
+
+    async def call(self, op: str, path: str):
+        rid = self.next_id = self.next_id + 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[rid] = future
+        req = {"request_id": rid, "op": op, "mount": "userdata/", "path": path}
+        await self.conn.send(ws_codec.packb(ws_codec.to_frame(req)) if self.msgpack else json.dumps(req))
+        return await future
+
+
+async def _http_call(client: httpx.AsyncClient, op: str, path: str):
+    route = {"stat": "stat", "list": "list_dir", "read": "read"}[op]
+    resp = await client.get(f"/frontend/fs/{route}", params={"mount": "userdata/", "path": path})
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    return f"median {statistics.median(samples) * 1e3:6.3f} ms  p99 {p99 * 1e3:6.3f} ms"
+
+
+async def _latency(label: str, call, files: int) -> None:
+    for op in ("stat", "list", "read"):
+        samples = []
+        for i in range(files):
+            path = "small/" if op == "list" else f"small/f{i}.txt"
+            t0 = time.perf_counter()
+            await call(op, path)
+            samples.append(time.perf_counter() - t0)
+        print(f"  {label:<22} {op:<5} {_percentiles(samples)}")
+
+
+async def _throughput(label: str, call, files: int, ops: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await call("read", f"small/f{i % files}.txt")
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(ops)))
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:<30} {ops / elapsed:>8,.0f} ops/s")
+
+
+async def _run(args, base: str, ws_url: str) -> None:
+    big_size = os.path.getsize(file_operations.MOUNT_POINTS[0]["path"] + "big.txt")
+    limits = httpx.Limits(max_connections=6, max_keepalive_connections=6)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as http6, \
+            httpx.AsyncClient(base_url=base, limits=httpx.Limits(max_connections=args.concurrency), timeout=120) as http:
+        clients = [("HTTP", lambda op, p: _http_call(http, op, p))]
+        sockets = []
+        if websockets is not None:
+            for name, msgpack in (("WS json", False), ("WS msgpack", True)):
+                conn = await websockets.connect(ws_url, max_size=None,
+                                                subprotocols=[ws_codec.MSGPACK_SUBPROTOCOL] if msgpack else None)
+                rpc = WsRpc(conn, msgpack)
+                sockets.append((conn, rpc))
+                clients.append((name, rpc.call))
+        else:
+            print("  (WebSocket part skipped: the 'websockets' package is not installed)")
+
+        print(f"\n1. Sequential latency ({args.files} calls per op)")
+        for label, call in clients:
+            await _latency(label, call, args.files)
+
+        print(f"\n2. Throughput, {args.ops} small reads, {args.concurrency} in flight")
+        await _throughput("HTTP (6 connections)", lambda op, p: _http_call(http6, op, p), args.files, args.ops,
+                          args.concurrency)
+        await _throughput(f"HTTP ({args.concurrency} connections)", clients[0][1], args.files, args.ops,
+                          args.concurrency)
+        for label, call in clients[1:]:
+            await _throughput(f"{label} (1 socket)", call, args.files, args.ops, args.concurrency)
+
+        print(f"\n3. Large read ({big_size / 1e6:.0f} MB)")
+        for label, call in clients:
+            t0 = time.perf_counter()
+            text = await call("read", "big.txt")
+            elapsed = time.perf_counter() - t0
+            assert len(text) == big_size
+            print(f"  {label:<22} {elapsed * 1e3:8.1f} ms  {big_size / elapsed / 1e6:8.1f} MB/s")
+
+        for conn, rpc in sockets:
+            await conn.close()
+            rpc.reader.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--file-bytes", type=int, default=2048)
+    parser.add_argument("--big-mb", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=9320)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "small"))
+        for i in range(args.files):
+            with open(os.path.join(tmp, "small", f"f{i}.txt"), "w") as f:
+                f.write("x" * args.file_bytes)
+        with open(os.path.join(tmp, "big.txt"), "w") as f:
+            line = "lorem ipsum dolor sit amet " * 3 + "\n"
+            f.write(line * (args.big_mb * 1024 * 1024 // len(line)))
+        mount = next(mp for mp in file_operations.MOUNT_POINTS if mp["name"] == "userdata/")
+        mount["path"] = tmp.replace("\\", "/") + "/"
+
+        from backend.server import app
+        import logging
+        logging.getLogger().setLevel(logging.WARNING)  # per-request INFO lines would dominate the timings
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning",
+                                               ws_per_message_deflate=False))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        try:
+            asyncio.run(_run(args, f"http://127.0.0.1:{args.port}", f"ws://127.0.0.1:{args.port}/frontend/fs/ws"))
+        finally:
+            server.should_exit = True
+            thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+'''Line-indexed random access versus reading the whole file.
+
+Generates a synthetic log (variable-length lines), then reports:
+  - full read: time and peak memory of open().read() + splitlines(), which
+    is what perform_read_file costs the editor today
+  - index build: first read_lines() call (cold), and index size
+  - random seeks: latency of 200-line pages at random offsets (warm)
+  - tail and append: tail_lines() after appending, which extends the index
+    from its last block instead of rescanning
+Peak memory is measured with tracemalloc (Python allocations only).
+
+Run:
+    python -m backend.benchmarks.bench_line_index --mb 200
+'''
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from backend.services import line_index
+
+
+def _generate(path: str, mb: int) -> int:
+    rng = random.Random(1)
+    target = mb * 1024 * 1024
+    written = lines = 0
+    with open(path, "w", newline="") as f:
+        while written < target:
+            batch = "".join(
+                f"2025-01-01T00:00:{n % 60:02d} INFO worker-{n % 8} request {n} {'x' * rng.randint(10, 200)}\n"
+                for n in range(lines, lines + 10000)
+            )
+            f.write(batch)
+            written += len(batch)
+            lines += 10000
+    return lines
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=200, help="Size of the generated file")
+    parser.add_argument("--seeks", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.log")
+        total = _generate(path, args.mb)
+        print(f"File: {os.path.getsize(path) / 1e6:,.0f} MB, {total:,} lines")
+
+        def full_read():
+            with open(path, "r", encoding="utf-8") as f:
+                return len(f.read().splitlines())
+        _, elapsed, peak = _measure(full_read)
+        print(f"  full read + splitlines   {elapsed * 1e3:>9.1f} ms   peak {peak / 1e6:>8.1f} MB")
+
+        result, elapsed, peak = _measure(lambda: line_index.read_lines(path, total // 2, 200))
+        index = line_index._cache[path]
+        print(f"  index build (cold page)  {elapsed * 1e3:>9.1f} ms   peak {peak / 1e6:>8.1f} MB"
+              f"   index {index.block_lines.itemsize * len(index.block_lines) / 1e3:,.0f} KB")
+        assert result["total_lines"] == total
+
+        rng = random.Random(2)
+        timings = []
+        for _ in range(args.seeks):
+            start = rng.randrange(total)
+            t0 = time.perf_counter()
+            line_index.read_lines(path, start, 200)
+            timings.append((time.perf_counter() - t0) * 1e3)
+        timings.sort()
+        _, _, peak = _measure(lambda: line_index.read_lines(path, rng.randrange(total), 200))
+        print(f"  random 200-line pages    median {statistics.median(timings):.2f} ms"
+              f"   p99 {timings[int(len(timings) * 0.99) - 1]:.2f} ms   peak {peak / 1e6:.2f} MB")
+
+        with open(path, "a") as f:
+            f.write("".join(f"appended {i}\n" for i in range(1000)))
+        result, elapsed, _ = _measure(lambda: line_index.tail_lines(path, 50))
+        assert result["lines"][-1] == "appended 999"
+        print(f"  tail after append        {elapsed * 1e3:>9.2f} ms   (index extended, not rebuilt)")
+
+
+if __name__ == "__main__":
+    main()
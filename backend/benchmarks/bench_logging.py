@@ -0,0 +1,111 @@
+'''Request throughput with logging off, synchronous, and queued.
+
+Drives the real app in-process (httpx ASGITransport, no sockets) with
+concurrent GET /frontend/fs/read requests against a temporary userdata
+mount. Every request logs a few INFO lines; the log sink sleeps
+--sink-latency ms per write to stand in for a slow terminal or pipe.
+
+Modes:
+    off      root level WARNING, nothing is written
+    sync     a plain StreamHandler on the root logger (what basicConfig gave us)
+    queue    setup_logging(): records are queued, formatted and written by a
+             background thread
+    sampled  queue, plus GENESIS_LOG_SAMPLE-style sampling of /frontend/fs/ at 10%
+
+Run:
+    python -m backend.benchmarks.bench_logging --requests 3000 --concurrency 20 --sink-latency 0.2
+'''
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+from backend.server import app
+from backend.services import file_operations, logging_setup
+
+
+class SlowSink:
+    """File-like object that takes `latency` seconds per write."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.lines = 0
+        self._devnull = open(os.devnull, "w")
+
+    def write(self, text: str) -> int:
+        if self.latency:
+            time.sleep(self.latency)
+        self.lines += text.count("\n")
+        return self._devnull.write(text)
+
+    def flush(self) -> None:
+        self._devnull.flush()
+
+
+def _configure(mode: str, sink: SlowSink) -> None:
+    logging_setup.shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if mode == "off":
+        root.setLevel(logging.WARNING)
+    elif mode == "sync":
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    else:
+        sample = "/frontend/fs/=0.1" if mode == "sampled" else ""
+        logging_setup.setup_logging(level="INFO", sample=sample, rate_limit=0, stream=sink)
+
+
+async def _drive(requests: int, concurrency: int) -> float:
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # the load generator's own request lines
+    transport = httpx.ASGITransport(app=app)
+    params = {"mount": "userdata/", "path": "bench.txt"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue: asyncio.Queue = asyncio.Queue()
+        for _ in range(requests):
+            queue.put_nowait(None)
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                resp = await client.get("/frontend/fs/read", params=params)
+                resp.raise_for_status()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sink-latency", type=float, default=0.2, help="Milliseconds per log write")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "bench.txt"), "w", encoding="utf-8") as f:
+            f.write("hello\n" * 100)
+        for mp in file_operations.MOUNT_POINTS:
+            if mp["name"] == "userdata/":
+                mp["path"] = tmp.replace("\\", "/") + "/"
+
+        print(f"{args.requests} requests, concurrency {args.concurrency}, sink latency {args.sink_latency} ms/write")
+        for mode in ("off", "sync", "queue", "sampled"):
+            sink = SlowSink(args.sink_latency / 1000)
+            _configure(mode, sink)
+            elapsed = asyncio.run(_drive(args.requests, args.concurrency))
+            logging_setup.shutdown_logging()  # drain, so `lines` is the final count
+            print(f"  {mode:<8} {args.requests / elapsed:>8.0f} req/s   {sink.lines:>6} lines written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+'''Keystroke-level autosave: full rewrites (/write) versus patch writes (/patch).
+
+Serves the real app with uvicorn and points the userdata/ mount at a
+temporary directory. For each document size, simulates --saves autosaves,
+each after one typed character at a moving cursor (the DocumentEditor
+case), and saves either the whole document through POST /frontend/fs/write
+or the single changed range through POST /frontend/fs/patch against the
+previous ETag. Reports request bytes per save and save latency.
+
+Run:
+    python -m backend.benchmarks.bench_patch_write --sizes-kb 16,256,4096 --saves 200
+'''
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from backend.services import file_operations
+
+
+def _percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    return f"median {statistics.median(samples) * 1e3:7.3f} ms  p99 {p99 * 1e3:7.3f} ms"
+
+
+def _document(size: int) -> str:
+    line = "The quick brown fox jumps over the lazy dog, again and again. \n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def _post(client: httpx.Client, route: str, body: dict) -> tuple[int, httpx.Response]:
+    data = json.dumps(body).encode()
+    resp = client.post(f"/frontend/fs/{route}", content=data, headers={"Content-Type": "application/json"})
+    resp.raise_for_status()
+    return len(data), resp
+
+
+def _run(client: httpx.Client, size: int, saves: int, mode: str) -> None:
+    path = f"doc-{size}-{mode}.md"
+    text = _document(size)
+    _, resp = _post(client, "write", {"mount": "userdata/", "path": path, "content": text})
+    etag = resp.json()["etag"]
+    cursor = random.Random(size).randrange(len(text))
+
+    sent, latencies = 0, []
+    for i in range(saves):
+        char = "abcdefghij"[i % 10]
+        text = text[:cursor] + char + text[cursor:]
+        if mode == "write":
+            body = {"mount": "userdata/", "path": path, "content": text}
+        else:
+            body = {"mount": "userdata/", "path": path, "base_etag": etag,
+                    "edits": [{"start": cursor, "end": cursor, "text": char}]}
+        cursor += 1
+        t0 = time.perf_counter()
+        nbytes, resp = _post(client, mode, body)
+        latencies.append(time.perf_counter() - t0)
+        sent += nbytes
+        etag = resp.json()["etag"]
+
+    on_disk = open(file_operations.MOUNT_POINTS[0]["path"] + path, encoding="utf-8").read()
+    assert on_disk == text, "saved document differs from the editor's"
+    print(f"  {size / 1024:>7.0f} KiB  {mode:<6} {sent / saves:>11,.0f} B/save  {_percentiles(latencies)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-kb", default="16,256,4096")
+    parser.add_argument("--saves", type=int, default=200)
+    parser.add_argument("--port", type=int, default=9321)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mount = next(mp for mp in file_operations.MOUNT_POINTS if mp["name"] == "userdata/")
+        mount["path"] = tmp.replace("\\", "/") + "/"
+
+        from backend.server import app
+        import logging
+        logging.getLogger().setLevel(logging.WARNING)  # per-request INFO lines would dominate the timings
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{args.port}", timeout=120) as client:
+                print(f"{args.saves} single-character autosaves per document")
+                for size_kb in (int(s) for s in args.sizes_kb.split(",")):
+                    for mode in ("write", "patch"):
+                        _run(client, size_kb * 1024, args.saves, mode)
+        finally:
+            server.should_exit = True
+            thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+'''Throughput of the backend as the worker count grows from 1 to N.
+
+Starts ``backend.server`` once per worker count, hammers ``POST /frontend/echo/``
+from several load-generator processes and prints requests/second.
+
+Run:
+    python -m backend.benchmarks.bench_scaling --max-workers 4 --duration 5
+    python -m backend.benchmarks.bench_scaling --max-workers 4 --reuse-port
+'''
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+PAYLOAD = {"message": "hello", "numbers": list(range(32))}
+
+
+async def _load(url: str, concurrency: int, duration: float) -> int:
+    done = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+        async def worker():
+            nonlocal done
+            while time.perf_counter() < deadline:
+                resp = await client.post(url, json=PAYLOAD)
+                resp.raise_for_status()
+                done += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done
+
+
+def _load_process(url: str, concurrency: int, duration: float, results) -> None:
+    results.put(asyncio.run(_load(url, concurrency, duration)))
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/frontend/ai/models", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+
+def run_once(workers: int, args) -> float:
+    base_url = f"http://127.0.0.1:{args.port}"
+    cmd = [
+        sys.executable, "-m", "backend.server",
+        "--port", str(args.port),
+        "--workers", str(workers),
+        "--log-level", "warning",
+    ]
+    if args.reuse_port:
+        cmd.append("--reuse-port")
+    server = subprocess.Popen(cmd)
+    try:
+        _wait_ready(base_url)
+        results = multiprocessing.Queue()
+        loaders = [
+            multiprocessing.Process(
+                target=_load_process,
+                args=(f"{base_url}/frontend/echo/", args.concurrency, args.duration, results),
+            )
+            for _ in range(args.clients)
+        ]
+        for proc in loaders:
+            proc.start()
+        total = sum(results.get() for _ in loaders)
+        for proc in loaders:
+            proc.join()
+        return total / args.duration
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of load per run")
+    parser.add_argument("--clients", type=int, default=4, help="Load-generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="In-flight requests per client")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--reuse-port", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7}  {'req/s':>10}  {'speedup':>7}")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        rps = run_once(workers, args)
+        baseline = baseline or rps
+        print(f"{workers:>7}  {rps:>10.0f}  {rps / baseline:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
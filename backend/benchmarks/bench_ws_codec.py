@@ -0,0 +1,210 @@
+'''Bytes on the wire and CPU cost of the chat WebSocket codecs.
+
+Two parts:
+  1. Codec only: a recorded token stream encoded and decoded as JSON text
+     frames and as tagged MessagePack frames (pure-Python and, if installed,
+     the msgpack C extension), with and without permessage-deflate
+     (simulated with zlib the way WebSocket servers apply it: raw deflate,
+     shared context, sync flush per message).
+  2. End to end: the real app served by uvicorn, DeepSeek pointed at the
+     local mock upstream, and a `websockets` client streaming through a TCP
+     proxy that counts the bytes the server sends. Reported CPU is process
+     time for the whole run (server and client share this process).
+
+Run:
+    python -m backend.benchmarks.bench_ws_codec --tokens 500 --streams 20
+'''
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import zlib
+
+import uvicorn
+
+from backend.benchmarks.mock_upstream import serve_in_thread
+from backend.services import ws_codec
+
+try:
+    import websockets
+except ImportError:  # only needed for the end-to-end part
+    websockets = None
+
+
+def _recorded_events(tokens: int) -> list[dict]:
+    events = [{"request_id": 7, "text": f"tok{i} "} for i in range(tokens)]
+    events.append({"request_id": 7, "meta": {
+        "usage": {"prompt_tokens": 10, "completion_tokens": tokens, "total_tokens": 10 + tokens},
+        "latency": 1.234, "ttfb": 0.12, "ttft": 0.12, "model": "deepseek-chat",
+    }})
+    return events
+
+
+def _frame_header(n: int) -> int:
+    # Unmasked server-to-client frame header size
+    return 2 if n < 126 else 4 if n < 65536 else 10
+
+
+def _deflate_sizes(payloads: list[bytes]) -> list[int]:
+    compressor = zlib.compressobj(wbits=-15)
+    return [len(compressor.compress(p) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4 for p in payloads]
+
+
+def bench_codecs(tokens: int, rounds: int) -> None:
+    events = _recorded_events(tokens)
+    codecs = [
+        ("json", lambda e: json.dumps(e, separators=(",", ":"), ensure_ascii=False).encode(), json.loads),
+        ("msgpack (pure)", lambda e: _pure_packb(ws_codec.to_frame(e)), lambda b: ws_codec.from_frame(_pure_unpackb(b))),
+    ]
+    if ws_codec._msgpack is not None:
+        codecs.append(("msgpack (C)", lambda e: ws_codec.packb(ws_codec.to_frame(e)),
+                       lambda b: ws_codec.from_frame(ws_codec.unpackb(b))))
+
+    print(f"Codec only, {len(events)} frames x {rounds} rounds")
+    print(f"  {'codec':<15} {'payload B':>10} {'wire B':>9} {'+deflate B':>11}"
+          f" {'enc us/fr':>10} {'dec us/fr':>10} {'deflate us/fr':>14}")
+    for label, encode, decode in codecs:
+        payloads = [encode(e) for e in events]
+        assert [decode(p) for p in payloads] == events
+        payload = sum(map(len, payloads))
+        wire = sum(len(p) + _frame_header(len(p)) for p in payloads)
+        deflated = sum(n + _frame_header(n) for n in _deflate_sizes(payloads))
+
+        t0 = time.process_time()
+        for _ in range(rounds):
+            for e in events:
+                encode(e)
+        enc = (time.process_time() - t0) / (rounds * len(events)) * 1e6
+        t0 = time.process_time()
+        for _ in range(rounds):
+            for p in payloads:
+                decode(p)
+        dec = (time.process_time() - t0) / (rounds * len(events)) * 1e6
+        t0 = time.process_time()
+        for _ in range(rounds):
+            _deflate_sizes(payloads)
+        dfl = (time.process_time() - t0) / (rounds * len(events)) * 1e6
+        print(f"  {label:<15} {payload:>10,} {wire:>9,} {deflated:>11,} {enc:>10.2f} {dec:>10.2f} {dfl:>14.2f}")
+
+
+def _pure_packb(obj) -> bytes:
+    out = bytearray()
+    ws_codec._pack_into(obj, out)
+    return bytes(out)
+
+
+def _pure_unpackb(data: bytes):
+    return ws_codec._unpack_from(data, 0)[0]
+
+
+# --- End to end ---
+
+class CountingProxy:
+    """TCP proxy that counts bytes flowing from the upstream server to the client."""
+
+    def __init__(self, upstream_port: int) -> None:
+        self.upstream_port = upstream_port
+        self.downstream_bytes = 0
+
+    async def _pipe(self, reader, writer, count: bool) -> None:
+        try:
+            while data := await reader.read(65536):
+                if count:
+                    self.downstream_bytes += len(data)
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, client_reader, client_writer) -> None:
+        up_reader, up_writer = await asyncio.open_connection("127.0.0.1", self.upstream_port)
+        await asyncio.gather(
+            self._pipe(client_reader, up_writer, count=False),
+            self._pipe(up_reader, client_writer, count=True),
+        )
+
+    async def start(self, port: int):
+        return await asyncio.start_server(self._handle, "127.0.0.1", port)
+
+
+async def _stream_all(url: str, protocol: str, deflate: bool, streams: int) -> int:
+    subprotocols = [ws_codec.MSGPACK_SUBPROTOCOL] if protocol == "msgpack" else None
+    codec = ws_codec.MsgpackCodec() if protocol == "msgpack" else ws_codec.JsonCodec()
+    received = 0
+    async with websockets.connect(url, subprotocols=subprotocols, compression="deflate" if deflate else None,
+                                  max_size=None) as ws:
+        assert ws.subprotocol == codec.subprotocol
+        for request_id in range(streams):
+            request = {"request_id": request_id, "model": "deepseek-chat", "stream": True,
+                       "messages": [{"role": "user", "content": "benchmark"}]}
+            if protocol == "msgpack":
+                await ws.send(ws_codec.packb(ws_codec.to_frame(request)))
+            else:
+                await ws.send(json.dumps(request))
+            while True:
+                raw = await ws.recv()
+                event = json.loads(raw) if isinstance(raw, str) else ws_codec.from_frame(ws_codec.unpackb(raw))
+                received += 1
+                if "meta" in event or "error" in event:
+                    assert "error" not in event, event
+                    break
+    return received
+
+
+def bench_end_to_end(args) -> None:
+    if websockets is None:
+        print("\nEnd to end skipped: the 'websockets' package is not installed")
+        return
+    from backend.server import app
+    from backend.services.ai import registry
+    from backend.services.ai.deepseek import DeepSeek
+
+    print(f"\nEnd to end, {args.streams} streams x {args.tokens} tokens")
+    with serve_in_thread(args.port, tokens=args.tokens) as endpoint:
+        registry._PROVIDERS["deepseek"] = DeepSeek(endpoint=endpoint, api_key="")
+        for deflate in (False, True):
+            server = uvicorn.Server(uvicorn.Config(
+                app, host="127.0.0.1", port=args.port + 1, log_level="warning", ws_per_message_deflate=deflate,
+            ))
+            thread = threading.Thread(target=server.run, daemon=True)
+            thread.start()
+            while not server.started:
+                time.sleep(0.01)
+            try:
+                for protocol in ("json", "msgpack"):
+                    async def run():
+                        proxy = CountingProxy(args.port + 1)
+                        listener = await proxy.start(args.port + 2)
+                        t0, c0 = time.perf_counter(), time.process_time()
+                        frames = await _stream_all(f"ws://127.0.0.1:{args.port + 2}/frontend/ws/chat",
+                                                   protocol, deflate, args.streams)
+                        elapsed, cpu = time.perf_counter() - t0, time.process_time() - c0
+                        listener.close()
+                        await listener.wait_closed()
+                        return frames, proxy.downstream_bytes, elapsed, cpu
+                    frames, wire, elapsed, cpu = asyncio.run(run())
+                    print(f"  {protocol:<8} deflate={'on ' if deflate else 'off'}  {wire:>10,} B down"
+                          f"  {wire / frames:>6.1f} B/frame  {frames / elapsed:>8,.0f} frames/s"
+                          f"  {cpu / frames * 1e6:>6.1f} us CPU/frame")
+            finally:
+                server.should_exit = True
+                thread.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20, help="Codec benchmark repetitions")
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--port", type=int, default=9300, help="Uses this port and the next two")
+    args = parser.parse_args()
+    bench_codecs(args.tokens, args.rounds)
+    bench_end_to_end(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+'''Local mock of an OpenAI-compatible chat-completions server.
+
+Used by the benchmarks so adapters can be measured without network access
+or API keys. Streams `--tokens` SSE chunks, sleeping `--delay` seconds
+between them, and ends with a usage chunk and `data: [DONE]`.
+
+Run standalone:
+    python -m backend.benchmarks.mock_upstream --port 9100 --tokens 200 --delay 0.001
+
+Or in-process:
+    with serve_in_thread(9100, tokens=50) as endpoint:
+        adapter = OpenAI(endpoint=endpoint)
+'''
+
+import argparse
+import asyncio
+import contextlib
+import json
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(tokens: int = 100, delay: float = 0.0, ttfb: float = 0.0, fail_status: int | None = None) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        if fail_status:
+            return JSONResponse({"error": {"message": "mock failure"}}, status_code=fail_status)
+        model = body.get("model", "mock")
+        usage = {"prompt_tokens": 10, "completion_tokens": tokens, "total_tokens": 10 + tokens}
+
+        if not body.get("stream"):
+            if ttfb or delay:
+                await asyncio.sleep(ttfb + delay * tokens)
+            text = " ".join(f"tok{i}" for i in range(tokens))
+            return {
+                "id": "mock",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}}],
+                "usage": usage,
+            }
+
+        async def events():
+            if ttfb:
+                await asyncio.sleep(ttfb)
+            for i in range(tokens):
+                chunk = {"id": "mock", "model": model, "choices": [{"index": 0, "delta": {"content": f"tok{i} "}}]}
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+                if delay:
+                    await asyncio.sleep(delay)
+            yield f"data: {json.dumps({'id': 'mock', 'choices': [], 'usage': usage})}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+@contextlib.contextmanager
+def serve_in_thread(port: int, host: str = "127.0.0.1", **app_kwargs):
+    """Runs a mock server in a background thread; yields its chat-completions URL."""
+    server = uvicorn.Server(uvicorn.Config(create_app(**app_kwargs), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://{host}:{port}/chat/completions"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible upstream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--ttfb", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--fail-status", type=int, default=None, help="Answer every request with this status")
+    args = parser.parse_args()
+    app = create_app(args.tokens, args.delay, args.ttfb, args.fail_status)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
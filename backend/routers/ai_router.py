@@ -1,15 +1,35 @@
 from __future__ import annotations
 
 import asyncio
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query
+import json
+import os
+import time
+from contextlib import aclosing, asynccontextmanager
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import Any, AsyncIterator, Literal
 import traceback
 
+from backend.services.ai import attachments
+from backend.services.ai.balancer import merge_stats
+from backend.services.ai.context import ContextPolicy, compact_messages
 from backend.services.ai.models import AI_MODELS, list_by_vendor
-from backend.services.ai.registry import get_provider
+from backend.services.ai.registry import get_provider, list_providers
+from backend.services.ai.sessions import ChatSession, session_store
+from backend.services.ai.streams import StreamLog, stream_store
+from backend.services import ws_codec
+from backend.services.shared_state import SharedState, get_shared_state
 
 router = APIRouter()
 
+# Seconds of upstream silence before an HTTP stream sends a keep-alive
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("GENESIS_STREAM_HEARTBEAT", "15"))
+# Events buffered between the provider and a slow HTTP client
+STREAM_QUEUE_SIZE = 64
+# With several workers, how often each one shares its balancer stats for /metrics
+METRICS_SHARE_SECONDS = 5.0
+
 
 # ---------------------------------------------------------------------
 # Pydantic schemas
@@ -20,6 +40,15 @@ class ModelCard(BaseModel):
     name: str
     display_name: str
     supports_thinking: bool
+    context_window: int
+    max_output_tokens: int
+
+
+class ContextOptions(BaseModel):
+    # Overrides for the server's default context policy (see services/ai/context.py)
+    policy: Literal["none", "truncate", "window"] | None = None
+    max_messages: int | None = None   # window size for the "window" policy
+    max_tokens: int | None = None     # prompt budget below the model's own limit
 
 
 class ChatRequest(BaseModel):
@@ -27,17 +56,172 @@ class ChatRequest(BaseModel):
     request_id: int | None = None
     model: str
     system_prompt: str | None = None
-    messages: list[dict[str, str]]
+    # Each message may carry "attachments": [{mount, path[, start_line, line_count]}] (see services/ai/attachments.py)
+    messages: list[dict[str, Any]]
     stream: bool = False
     temperature: float | None = None
+    context: ContextOptions | None = None
+    # Session mode: history lives server-side, `messages` carries only the new turn
+    session_id: str | None = None
+    # Resumable streaming: a client-chosen id to resume the turn by (see services/ai/streams.py)
+    stream_id: str | None = None
+
+
+class ResumeRequest(BaseModel):
+    # Sent over WS after a reconnect; resumed events are tagged with this request_id
+    request_id: int
+    stream_id: str
+    last_seq: int = -1  # seq of the last event received; -1 replays everything
 
 # A single, uniform envelope that works for both REST and WS that works for both REST and WS
 class ChatReply(BaseModel):
     request_id: int | None = None
+    session_id: str | None = None  # echoed in session mode
     text: str | None = None        # full answer or incremental token
     thinking: str | None = None    # incremental "thought" token
     meta: dict | None = None       # final metadata once per request
     error: str | None = None       # populated only on failure
+    seq: int | None = None         # position in a resumable stream
+
+
+# ---------------------------------------------------------------------
+# Message preparation shared by REST and WS
+# ---------------------------------------------------------------------
+
+def build_messages(req: ChatRequest, session: ChatSession | None = None) -> tuple[list[dict[str, str]], dict]:
+    """Injects the system prompt and attachments and compacts the history to the model's budget.
+
+    In session mode the stored history is prepended to the request's messages.
+    Returns the messages to send upstream and the compaction stats for `meta`.
+    Attachments are expanded on copies, so `req` and the session keep only
+    the references. Reads files; see prepare_messages for async callers.
+    """
+    system_prompt = req.system_prompt
+    history = req.messages
+    if session is not None:
+        if system_prompt is None:
+            system_prompt = session.system_prompt
+        history = session.messages + req.messages
+
+    attachment_stats = None
+    if attachments.has_attachments(history):
+        history, attachment_stats = attachments.expand_attachments(
+            history, req.model, strict_from=len(history) - len(req.messages),
+        )
+
+    msgs: list[dict[str, str]] = []
+    if system_prompt:
+        msgs.append({"role": "system", "content": system_prompt})
+    msgs.extend(history)
+
+    defaults = ContextPolicy()
+    opts = req.context or ContextOptions()
+    policy = ContextPolicy(
+        policy=opts.policy or defaults.policy,
+        max_messages=opts.max_messages or defaults.max_messages,
+        max_tokens=opts.max_tokens,
+    )
+    msgs, stats = compact_messages(msgs, req.model, policy)
+    if attachment_stats is not None:
+        stats["attachments"] = attachment_stats
+    return msgs, stats
+
+
+async def prepare_messages(req: ChatRequest, session: ChatSession | None = None) -> tuple[list[dict[str, str]], dict]:
+    """build_messages, moved off the event loop when attachments have to be read."""
+    if attachments.has_attachments(req.messages) or (session is not None and attachments.has_attachments(session.messages)):
+        return await asyncio.to_thread(build_messages, req, session)
+    return build_messages(req, session)
+
+
+@asynccontextmanager
+async def open_session(req: ChatRequest) -> AsyncIterator[ChatSession | None]:
+    """Holds the request's session for the whole turn; yields None outside session mode."""
+    if not req.session_id:
+        yield None
+        return
+    async with session_store.hold(req.session_id) as session:
+        yield session
+
+
+async def commit_turn(session: ChatSession | None, req: ChatRequest, text: str) -> None:
+    """Appends the new messages and the assistant's answer to the session."""
+    if session is None:
+        return
+    if req.system_prompt is not None:
+        session.system_prompt = req.system_prompt
+    await session_store.append(session, [*req.messages, {"role": "assistant", "content": text}])
+
+
+def error_location(exc: BaseException) -> str:
+    """Formats an exception with the file and line it was raised from."""
+    tb_list = traceback.extract_tb(exc.__traceback__)
+    last_frame = tb_list[-1] if tb_list else None
+    location = f"{last_frame.filename}:{last_frame.lineno}" if last_frame else "unknown location"
+    return f"{str(exc)} (at {location})"
+
+
+async def chat_events(req: ChatRequest, prov) -> AsyncIterator[dict[str, Any]]:
+    """
+    Runs one streamed turn and yields the wire events shared by WS and HTTP:
+    {"request_id", "text"} / {"request_id", "thinking"} per token, then one
+    {"request_id", "meta"}. The session (if any) is held for the whole turn
+    and updated once the stream completes. Closing the generator early closes
+    the provider's stream, which cancels the upstream request.
+    """
+    async with open_session(req) as session:
+        msgs, context_stats = await prepare_messages(req, session)
+        extra_meta = {"context": context_stats}
+        if session is not None:
+            extra_meta["session_id"] = session.session_id
+
+        # Get the stream iterable from the provider
+        stream_iter = await prov.chat(
+            msgs,
+            stream=True,
+            temperature=req.temperature or 0.8,
+            model=req.model,
+        )
+        if not hasattr(stream_iter, "__aiter__"):
+            # Provide descriptive error indicating wrong return type
+            provider_name = prov.__class__.__name__
+            module_name = prov.__class__.__module__
+            raise TypeError(
+                f"Streaming provider '{module_name}.{provider_name}'.chat expected async iterable but got {type(stream_iter)}"
+            )
+
+        text_parts: list[str] = []
+        async with aclosing(stream_iter) as events:
+            async for ev in events:
+                # ev is a dict: {'text': ..., 'thinking': ..., or 'meta': ...}
+                if "text" in ev:
+                    text_parts.append(ev["text"])
+                elif "meta" in ev:
+                    ev = {"meta": {**ev["meta"], **extra_meta}}
+                yield {"request_id": req.request_id, **ev}
+        await commit_turn(session, req, "".join(text_parts))
+
+
+async def errors_as_events(events: AsyncIterator[dict[str, Any]]) -> AsyncIterator[dict[str, Any]]:
+    """Passes events through, turning a failure into a final {"error"} event."""
+    try:
+        async with aclosing(events):
+            async for ev in events:
+                yield ev
+    except Exception as exc:
+        yield {"error": error_location(exc)}
+
+
+async def start_stream(req: ChatRequest, prov) -> StreamLog:
+    """Starts a resumable turn: generation runs in the stream store, independent of the caller."""
+    return await stream_store.start(req.stream_id, errors_as_events(chat_events(req, prov)))
+
+
+async def sequenced(log: StreamLog, request_id: int | None, last_seq: int = -1) -> AsyncIterator[dict[str, Any]]:
+    """Follows a stream's log, tagging each event with the caller's request_id and its seq."""
+    async with aclosing(log.follow(last_seq)) as events:
+        async for seq, ev in events:
+            yield {"request_id": request_id, **ev, "seq": seq}
 
 
 # ---------------------------------------------------------------------
@@ -53,30 +237,213 @@ async def list_models(
 
 
 # ---------------------------------------------------------------------
-# POST /chat  (non‑stream, one‑shot)
+# POST /chat  (one‑shot, or streamed as SSE / NDJSON when stream=true)
 # ---------------------------------------------------------------------
 
+async def with_heartbeats(events: AsyncIterator[dict], interval: float) -> AsyncIterator[dict | None]:
+    """
+    Yields the events, plus None whenever nothing arrived for `interval` seconds.
+
+    The events are pulled by a separate task into a bounded queue, so waiting
+    for a heartbeat never interrupts the provider mid-read, and a slow client
+    applies backpressure instead of growing a buffer. When the consumer stops
+    early (client disconnect) that task is cancelled, closing the upstream.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    done = object()
+
+    async def pump():
+        try:
+            async with aclosing(events):
+                async for ev in events:
+                    await queue.put(ev)
+        except Exception as exc:
+            await queue.put({"error": error_location(exc)})
+        await queue.put(done)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                ev = await asyncio.wait_for(queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if ev is done:
+                return
+            yield ev
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def _dumps(ev: dict) -> str:
+    return json.dumps(ev, ensure_ascii=False, separators=(",", ":"))
+
+
+def sse_frame(ev: dict | None) -> bytes:
+    # Comment lines are ignored by SSE parsers (EventSource, SSEParser) and keep proxies from timing out
+    if ev is None:
+        return b": keep-alive\n\n"
+    # The seq doubles as the SSE event id, so a reconnecting EventSource sends it back as Last-Event-ID
+    seq = ev.get("seq")
+    event_id = "" if seq is None else f"id: {seq}\n"
+    return f"{event_id}data: {_dumps(ev)}\n\n".encode()
+
+
+def ndjson_frame(ev: dict | None) -> bytes:
+    # Blank lines are the NDJSON keep-alive; readers skip them
+    return b"\n" if ev is None else (_dumps(ev) + "\n").encode()
+
+
+def stream_response(events: AsyncIterator[dict], request_id: int | None, accept: str) -> StreamingResponse:
+    """SSE by default; NDJSON when the client asks for application/x-ndjson."""
+    ndjson = "application/x-ndjson" in accept or "application/jsonl" in accept
+    frame = ndjson_frame if ndjson else sse_frame
+
+    async def body() -> AsyncIterator[bytes]:
+        async for ev in with_heartbeats(events, STREAM_HEARTBEAT_SECONDS):
+            if ev is not None and "error" in ev:
+                ev = {"request_id": request_id, **ev}
+            yield frame(ev)  # one chunk per event: uvicorn writes it to the socket right away
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # stop nginx-style proxies from buffering the stream
+        },
+    )
+
+
 @router.post("/chat", response_model=ChatReply)
-async def chat_once(req: ChatRequest):
+async def chat_once(req: ChatRequest, request: Request):
     prov = get_provider(req.model)
+    if req.stream:
+        # With a stream_id, dropping the connection does not stop generation; resume via GET /streams/{id}
+        events = sequenced(await start_stream(req, prov), req.request_id) if req.stream_id else chat_events(req, prov)
+        return stream_response(events, req.request_id, request.headers.get("accept", ""))
 
-    # build message list, injecting system prompt if provided
-    msgs: list[dict[str, str]] = []
-    if req.system_prompt:
-        msgs.append({"role": "system", "content": req.system_prompt})
-    msgs.extend(req.messages)
+    async with open_session(req) as session:
+        msgs, context_stats = await prepare_messages(req, session)
+        try:
+            text, meta = await prov.chat(
+                msgs,
+                stream=False,
+                temperature=req.temperature or 0.8,
+                model=req.model,
+            )
+        except Exception as exc:
+            raise HTTPException(status_code=502, detail=str(exc)) from exc
 
-    try:
-        text, meta = await prov.chat(
-            msgs,
-            stream=False,
-            temperature=req.temperature or 0.8,
-            model=req.model,
+        await commit_turn(session, req, text)
+        return ChatReply(
+            request_id=req.request_id,
+            session_id=req.session_id,
+            text=text,
+            meta={**meta, "context": context_stats},
         )
-        return ChatReply(request_id=req.request_id, text=text, meta=meta)
 
-    except Exception as exc:
-        raise HTTPException(status_code=502, detail=str(exc)) from exc
+
+# ---------------------------------------------------------------------
+# GET/DELETE /streams/{stream_id}  (resume or stop a resumable stream)
+# ---------------------------------------------------------------------
+
+async def close_streams():
+    """Called from the app's lifespan at shutdown."""
+    await stream_store.close()
+
+
+@router.get("/streams/{stream_id}")
+async def resume_stream(
+    stream_id: str,
+    request: Request,
+    last_seq: int | None = Query(None, description="Seq of the last event received; defaults to Last-Event-ID"),
+    request_id: int | None = None,
+):
+    if last_seq is None:
+        header = request.headers.get("last-event-id", "")
+        last_seq = int(header) if header.isdigit() else -1
+    log = await stream_store.find(stream_id)
+    log.since(last_seq)  # 410 now rather than mid-response if the events were dropped
+    return stream_response(sequenced(log, request_id, last_seq), request_id, request.headers.get("accept", ""))
+
+
+@router.delete("/streams/{stream_id}")
+async def cancel_stream(stream_id: str):
+    await stream_store.cancel(stream_id)
+    return {"message": f"Stream '{stream_id}' cancelled."}
+
+
+# ---------------------------------------------------------------------
+# GET /metrics  (per-backend load-balancer stats, of every worker)
+# ---------------------------------------------------------------------
+
+def _local_metrics() -> dict[str, Any]:
+    return {
+        name: prov.pool.stats()
+        for name, prov in list_providers().items()
+        if hasattr(prov, "pool")
+    }
+
+
+def share_metrics(state: SharedState, worker_id: str) -> dict[str, Any]:
+    """Stores this worker's stats under `balancer-metrics` and returns every live worker's."""
+    now = time.time()
+    stats = _local_metrics()
+
+    def put(current: dict | None) -> dict:
+        workers = {k: v for k, v in (current or {}).items() if now - v["time"] < 3 * METRICS_SHARE_SECONDS}
+        workers[worker_id] = {"time": now, "providers": stats}
+        return workers
+
+    return state.update("balancer-metrics", put)
+
+
+async def share_metrics_forever():
+    """Runs for the app's lifetime (from its lifespan) when several workers share state."""
+    state = get_shared_state()
+    if not state.cross_process:
+        return
+    while True:
+        await asyncio.to_thread(share_metrics, state, str(os.getpid()))
+        await asyncio.sleep(METRICS_SHARE_SECONDS)
+
+
+@router.get("/metrics")
+async def provider_metrics():
+    state = get_shared_state()
+    if not state.cross_process:
+        return _local_metrics()
+    workers = await asyncio.to_thread(share_metrics, state, str(os.getpid()))
+    per_provider: dict[str, list[dict]] = {}
+    for worker in workers.values():
+        for name, stats in worker["providers"].items():
+            per_provider.setdefault(name, []).append(stats)
+    return {name: merge_stats(stats) for name, stats in per_provider.items()}
+
+
+# ---------------------------------------------------------------------
+# GET/DELETE /sessions/{session_id}
+# ---------------------------------------------------------------------
+
+@router.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = await session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    return session.to_dict()
+
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not await session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    return {"message": f"Session '{session_id}' deleted."}
 
 
 # ---------------------------------------------------------------------
@@ -86,70 +453,72 @@ async def chat_once(req: ChatRequest):
 
 @router.websocket("/chat")
 async def chat_socket(ws: WebSocket):
-    await ws.accept()
+    # JSON text frames unless the client offers the binary MessagePack subprotocol
+    codec = ws_codec.negotiate(ws)
+    await ws.accept(subprotocol=codec.subprotocol)
     active_tasks: set[asyncio.Task] = set()
 
-    async def handle_request(init: ChatRequest):
-        prov = get_provider(init.model)
-
-        msgs: list[dict[str, str]] = []
-        if init.system_prompt:
-            msgs.append({"role": "system", "content": init.system_prompt})
-        msgs.extend(init.messages)
+    async def send(reply: ChatReply):
+        # Must await the send to ensure the message is transmitted and errors propagated
+        await codec.send(ws, reply.model_dump(exclude_none=True))
 
-        async def send(reply: ChatReply):
-            # Must await send_json to ensure the message is transmitted and errors propagated
-            await ws.send_json(reply.model_dump(exclude_none=True))
+    async def forward(events: AsyncIterator[dict[str, Any]]):
+        # Closing explicitly detaches from a resumable stream as soon as this task is cancelled
+        async with aclosing(events):
+            async for payload in events:
+                await codec.send(ws, payload)
 
+    async def handle_request(init: ChatRequest):
         try:
+            prov = get_provider(init.model)
+
+            # stream: incremental replies; adapters emit flat dicts with 'text', 'thinking', or 'meta'
+            if init.stream:
+                # A stream_id moves generation into the stream store, so it survives this socket
+                await forward(sequenced(await start_stream(init, prov), init.request_id) if init.stream_id
+                              else chat_events(init, prov))
+                return
+
             # non‑stream: single reply
-            if not init.stream:
+            async with open_session(init) as session:
+                msgs, context_stats = await prepare_messages(init, session)
+                extra_meta = {"context": context_stats}
+                if session is not None:
+                    extra_meta["session_id"] = session.session_id
                 text, meta = await prov.chat(
                     msgs,
                     stream=False,
                     temperature=init.temperature or 0.8,
                     model=init.model,
                 )
-                await send(ChatReply(request_id=init.request_id, text=text, meta=meta))
-                return
-
-            # stream: incremental replies; adapters now emit flat dicts with 'text', 'thinking', or 'meta'
-            # Get the stream iterable from the provider
-            stream_iter = await prov.chat(
-                msgs,
-                stream=True,
-                temperature=init.temperature or 0.8,
-                model=init.model,
-            )
-            # Iterate over the stream, catching TypeError if not async iterable
-            try:
-                async for ev in stream_iter:
-                    # ev is a dict: {'text': ..., 'thinking': ..., or 'meta': ...}
-                    payload = {"request_id": init.request_id, **ev}
-                    await ws.send_json(payload)
-            except TypeError as exc:
-                # Provide descriptive error indicating wrong return type
-                provider_name = prov.__class__.__name__
-                module_name = prov.__class__.__module__
-                raise Exception(
-                    f"Streaming provider '{module_name}.{provider_name}'.chat expected async iterable but got {type(stream_iter)}: {exc}"
-                ) from exc
+                await commit_turn(session, init, text)
+                await send(ChatReply(
+                    request_id=init.request_id,
+                    session_id=init.session_id,
+                    text=text,
+                    meta={**meta, **extra_meta},
+                ))
         except Exception as exc:
             # send error envelope with file and line details
-            tb_list = traceback.extract_tb(exc.__traceback__)
-            last_frame = tb_list[-1] if tb_list else None
-            if last_frame:
-                location = f"{last_frame.filename}:{last_frame.lineno}"
-            else:
-                location = "unknown location"
-            error_msg = f"{str(exc)} (at {location})"
-            await send(ChatReply(request_id=init.request_id, error=error_msg))
+            await send(ChatReply(request_id=init.request_id, error=error_location(exc)))
+
+    async def handle_resume(resume: ResumeRequest):
+        try:
+            log = await stream_store.find(resume.stream_id)
+            await forward(sequenced(log, resume.request_id, resume.last_seq))
+        except HTTPException as exc:
+            # 404 (expired) / 410 (events dropped): the client falls back to regenerating
+            await codec.send(ws, {"request_id": resume.request_id, "error": exc.detail, "status": exc.status_code})
+        except Exception as exc:
+            await send(ChatReply(request_id=resume.request_id, error=error_location(exc)))
 
     try:
         while True:
-            data = await ws.receive_json()
-            init = ChatRequest.model_validate(data)
-            task = asyncio.create_task(handle_request(init))
+            data = await codec.receive(ws)
+            if "last_seq" in data:
+                task = asyncio.create_task(handle_resume(ResumeRequest.model_validate(data)))
+            else:
+                task = asyncio.create_task(handle_request(ChatRequest.model_validate(data)))
             active_tasks.add(task)
             task.add_done_callback(active_tasks.discard)
 
@@ -158,12 +527,5 @@ async def chat_socket(ws: WebSocket):
             t.cancel()
     except Exception as exc:
         # on fatal errors, send and close with file and line details
-        tb_list = traceback.extract_tb(exc.__traceback__)
-        last_frame = tb_list[-1] if tb_list else None
-        if last_frame:
-            location = f"{last_frame.filename}:{last_frame.lineno}"
-        else:
-            location = "unknown location"
-        error_msg = f"{str(exc)} (at {location})"
-        await ws.send_json({"error": error_msg})
+        await codec.send(ws, {"error": error_location(exc)})
         await ws.close(code=1011)
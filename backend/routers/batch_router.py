@@ -0,0 +1,89 @@
+'''API routes for offline batch chat jobs.'''
+
+from fastapi import APIRouter, Body, HTTPException, Request, status
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List
+import asyncio
+import os
+
+from backend.routers.ai_router import ChatRequest, prepare_messages
+from backend.services.ai import batch
+from backend.services.ai.batch import BatchManager
+
+router = APIRouter()
+
+
+async def _prepare(line: Dict[str, Any]):
+    """Validates one input line exactly like POST /chat would."""
+    req = ChatRequest.model_validate(line)
+    msgs, _ = await prepare_messages(req)
+    return req.model, msgs, {"temperature": req.temperature or 0.8}
+
+
+manager = BatchManager(_prepare)
+
+
+async def resume_batch_jobs():
+    """Called from the app's lifespan at startup."""
+    manager.resume_interrupted()
+
+
+# --- Pydantic Models ---
+
+class BatchSubmitPayload(BaseModel):
+    mount: str = Field(..., description="The mount point holding the JSONL file")
+    path: str = Field(..., description="Path of the JSONL file relative to the mount point")
+
+class BatchJob(BaseModel):
+    job_id: str
+    status: str
+    source: str
+    total: int
+    done: int
+    failed: int
+    created: float
+    updated: float
+    error: str | None = None
+
+# --- API Endpoints ---
+
+@router.post("/", response_model=BatchJob, status_code=status.HTTP_201_CREATED)
+async def submit_batch(payload: BatchSubmitPayload = Body(...)):
+    """Starts a job from a JSONL file of ChatRequests on a mount."""
+    return await manager.submit_from_mount(payload.mount, payload.path)
+
+@router.post("/upload", response_model=BatchJob, status_code=status.HTTP_201_CREATED)
+async def upload_batch(request: Request):
+    """Starts a job from a JSONL request body, streamed to disk as it arrives."""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > batch.BATCH_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Batch upload exceeds {batch.BATCH_MAX_UPLOAD_BYTES} bytes")
+    return await manager.submit_upload(request.stream())
+
+@router.get("/", response_model=List[BatchJob])
+async def list_batches():
+    return await asyncio.to_thread(manager.list_jobs)
+
+@router.get("/{job_id}", response_model=BatchJob)
+async def get_batch(job_id: str):
+    """Progress of a job: total, done and failed line counts."""
+    return await asyncio.to_thread(manager.get_job, job_id)
+
+@router.get("/{job_id}/results")
+async def get_batch_results(job_id: str):
+    """Streams the JSONL results written so far."""
+    path = await asyncio.to_thread(manager.results_path, job_id)
+    if not os.path.exists(path):
+        open(path, 'a').close()
+    return FileResponse(path, media_type="application/x-ndjson", filename=f"{job_id}.results.jsonl")
+
+@router.post("/{job_id}/cancel", response_model=BatchJob)
+async def cancel_batch(job_id: str):
+    return await manager.cancel(job_id)
+
+@router.post("/{job_id}/resume", response_model=BatchJob)
+async def resume_batch(job_id: str):
+    """Restarts a cancelled or failed job, skipping lines that already have results."""
+    return await manager.resume(job_id)
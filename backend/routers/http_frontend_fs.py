@@ -1,16 +1,17 @@
 '''API routes for frontend file system operations.'''
 
-from fastapi import APIRouter, HTTPException, Query, Body, status
-from pydantic import BaseModel, Field
-from typing import List, Dict, Literal
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query, Body, Header, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Literal, Optional
 # Removed direct os, shutil imports as logic moved to service
 import logging
 
 # Import the service functions
-from backend.services import file_operations
+from backend.services import archives, file_operations, fs_rpc, ws_codec
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -24,22 +25,56 @@ class PathPayload(BaseModel):
 class WriteFilePayload(PathPayload):
     content: str = Field(..., description="The content to write to the file.")
 
+class TextEdit(BaseModel):
+    start: int = Field(..., ge=0, description="Start offset in the base text, in Unicode code points")
+    end: int = Field(..., ge=0, description="End offset (exclusive); equal to start for an insert")
+    text: str = Field("", description="Replacement text")
+
+class PatchFilePayload(PathPayload):
+    base_etag: Optional[str] = Field(None, description="ETag of the version the patch applies to (or send If-Match)")
+    edits: Optional[List[TextEdit]] = Field(None, description="Sorted, non-overlapping edits against the base")
+    diff: Optional[str] = Field(None, description="A unified diff against the base, instead of edits")
+
 # --- API Endpoints (Simplified to call service layer) ---
 
 @router.get("/read", response_model=str)
 async def read_file_endpoint(
+    response: Response,
     mount: str = Query(..., description="The mount point name"),
     path: str = Query(..., description="The path relative to the mount point")
 ):
     """Reads the content of a specified file via the service layer."""
-    logger.info(f"Router received request to read file: {mount}{path}")
-    return file_operations.perform_read_file(mount, path)
+    logger.info("Router received request to read file: %s%s", mount, path)
+    content, etag = await asyncio.to_thread(file_operations.perform_read_file_versioned, mount, path)
+    response.headers["ETag"] = f'"{etag}"'  # base version for /patch
+    return content
 
 @router.post("/write", status_code=status.HTTP_201_CREATED)
-async def write_file_endpoint(payload: WriteFilePayload = Body(...)):
+async def write_file_endpoint(response: Response, payload: WriteFilePayload = Body(...)):
     """Writes content to a specified file via the service layer."""
-    logger.info(f"Router received request to write file: {payload.mount}{payload.path}")
-    return file_operations.perform_write_file(payload.mount, payload.path, payload.content)
+    logger.info("Router received request to write file: %s%s", payload.mount, payload.path)
+    result = await asyncio.to_thread(file_operations.perform_write_file, payload.mount, payload.path, payload.content)
+    response.headers["ETag"] = f'"{result["etag"]}"'
+    return result
+
+@router.post("/patch")
+async def patch_file_endpoint(
+    response: Response,
+    payload: PatchFilePayload = Body(...),
+    if_match: Optional[str] = Header(None),
+):
+    """Applies edits or a unified diff to the file version named by base_etag / If-Match (409 if it changed)."""
+    base_etag = payload.base_etag or if_match
+    if not base_etag:
+        raise HTTPException(status_code=status.HTTP_428_PRECONDITION_REQUIRED,
+                            detail="A patch needs the base version: send base_etag or If-Match")
+    edits = None if payload.edits is None else [(e.start, e.end, e.text) for e in payload.edits]
+    logger.info("Router received request to patch file: %s%s", payload.mount, payload.path)
+    result = await asyncio.to_thread(
+        file_operations.perform_patch_file, payload.mount, payload.path, base_etag, edits, payload.diff,
+    )
+    response.headers["ETag"] = f'"{result["etag"]}"'
+    return result
 
 @router.delete("/delete", status_code=status.HTTP_200_OK)
 async def delete_file_endpoint(
@@ -47,13 +82,13 @@ async def delete_file_endpoint(
     path: str = Query(..., description="The path relative to the mount point")
 ):
     """Deletes a specified file via the service layer."""
-    logger.info(f"Router received request to delete file: {mount}{path}")
-    return file_operations.perform_delete_file(mount, path)
+    logger.info("Router received request to delete file: %s%s", mount, path)
+    return await asyncio.to_thread(file_operations.perform_delete_file, mount, path)
 
 @router.put("/create_dir", status_code=status.HTTP_201_CREATED)
 async def create_directory_endpoint(payload: PathPayload = Body(...)):
     """Creates a new directory via the service layer."""
-    logger.info(f"Router received request to create directory: {payload.mount}{payload.path}")
+    logger.info("Router received request to create directory: %s%s", payload.mount, payload.path)
     return file_operations.perform_create_directory(payload.mount, payload.path)
 
 # Define the response model for list_directory based on service output
@@ -68,7 +103,7 @@ async def list_directory_endpoint(
     path: str = Query(..., description="The path relative to the mount point")
 ):
     """Lists the contents of a specified directory via the service layer."""
-    logger.info(f"Router received request to list directory: {mount}{path}")
+    logger.info("Router received request to list directory: %s%s", mount, path)
     return file_operations.perform_list_directory(mount, path)
 
 @router.delete("/delete_dir", status_code=status.HTTP_200_OK)
@@ -77,9 +112,159 @@ async def delete_directory_endpoint(
     path: str = Query(..., description="The path relative to the mount point")
 ):
     """Deletes a specified empty directory via the service layer."""
-    logger.info(f"Router received request to delete directory: {mount}{path}")
+    logger.info("Router received request to delete directory: %s%s", mount, path)
     return file_operations.perform_delete_directory(mount, path)
 
+# Line-oriented reads for files too large to load whole (see services/line_index.py)
+class LinesResponse(BaseModel):
+    start: int
+    lines: List[str]
+    next_line: int = Field(..., description="Line number to request next (pass as from_line when following)")
+    total_lines: int
+    complete_lines: int = Field(..., description="Lines terminated by a newline")
+    size: int
+    mtime: float
+    eof: bool
+    truncated: bool = Field(..., description="True if an overlong line was cut")
+    reset: Optional[bool] = Field(None, description="Follow only: the file shrank and reading restarted at line 0")
+
+@router.get("/lines", response_model=LinesResponse)
+async def read_lines_endpoint(
+    mount: str = Query(..., description="The mount point name"),
+    path: str = Query(..., description="The path relative to the mount point"),
+    start: int = Query(0, ge=0, description="First line to return (0-based)"),
+    count: int = Query(200, ge=1, le=5000, description="Maximum number of lines to return")
+):
+    """Reads a range of lines via the line index."""
+    logger.info("Router received request to read lines %d+%d: %s%s", start, count, mount, path)
+    return await asyncio.to_thread(file_operations.perform_read_lines, mount, path, start, count)
+
+@router.get("/tail", response_model=LinesResponse)
+async def tail_lines_endpoint(
+    mount: str = Query(..., description="The mount point name"),
+    path: str = Query(..., description="The path relative to the mount point"),
+    count: int = Query(200, ge=1, le=5000, description="Number of lines from the end")
+):
+    """Reads the last lines of a file via the line index."""
+    logger.info("Router received request to tail %d lines: %s%s", count, mount, path)
+    return await asyncio.to_thread(file_operations.perform_tail_lines, mount, path, count)
+
+@router.get("/follow", response_model=LinesResponse)
+async def follow_lines_endpoint(
+    mount: str = Query(..., description="The mount point name"),
+    path: str = Query(..., description="The path relative to the mount point"),
+    from_line: int = Query(0, ge=0, description="First line not yet seen (next_line of the previous call)"),
+    wait: float = Query(25.0, ge=0, le=30, description="Seconds to wait for new lines before returning empty")
+):
+    """Long-polls for lines appended to a file."""
+    logger.debug("Router received request to follow %s%s from line %d", mount, path, from_line)
+    return await file_operations.perform_follow_lines(mount, path, from_line, wait)
+
+class StatResponse(FileSystemItem):
+    size: int
+    mtime: float
+
+@router.get("/stat", response_model=StatResponse)
+async def stat_endpoint(
+    mount: str = Query(..., description="The mount point name"),
+    path: str = Query(..., description="The path relative to the mount point")
+):
+    """Returns type, size and modification time of a path via the service layer."""
+    logger.info("Router received request to stat: %s%s", mount, path)
+    return file_operations.perform_stat(mount, path)
+
+# --- Directory archives (see services/archives.py) ---
+
+class ImportResult(BaseModel):
+    message: str
+    files: int
+    directories: int
+    bytes: int
+
+@router.get("/export")
+async def export_directory_endpoint(
+    mount: str = Query(..., description="The mount point name"),
+    path: str = Query(..., description="The directory relative to the mount point"),
+    format: Literal["zip", "tar", "tar.gz"] = Query("zip", description="Archive format"),
+    skip_compressed: bool = Query(True, description="Zip only: store already-compressed file types without deflating")
+):
+    """Streams a directory as an archive built on the fly."""
+    logger.info("Router received request to export %s%s as %s", mount, path, format)
+    stream, filename = archives.export_directory(mount, path, format, skip_compressed)
+    return StreamingResponse(
+        stream,
+        media_type=archives.ARCHIVE_FORMATS[format][0],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/import", response_model=ImportResult, status_code=status.HTTP_201_CREATED)
+async def import_archive_endpoint(
+    request: Request,
+    mount: str = Query(..., description="The mount point name"),
+    path: str = Query(..., description="Destination directory relative to the mount point"),
+    format: Literal["auto", "zip", "tar", "tar.gz"] = Query("auto", description="Archive format; auto-detected by default"),
+    overwrite: bool = Query(False, description="Replace files that already exist")
+):
+    """Extracts an archive streamed in the request body into a directory."""
+    logger.info("Router received request to import an archive into %s%s", mount, path)
+    return await archives.import_archive(mount, path, request.stream(), format, overwrite)
+
+# --- Version history (see services/snapshots.py) ---
+
+class VersionInfo(BaseModel):
+    v: int
+    time: float
+    op: Literal["write", "patch", "restore", "external", "delete"]
+    size: Optional[int] = None
+    etag: Optional[str] = None
+
+class RestorePayload(PathPayload):
+    version: int = Field(..., ge=1, description="The version to restore")
+
+class SnapshotGcResult(BaseModel):
+    paths: int
+    versions: int
+    versions_removed: int
+    objects: int
+    objects_removed: int
+    bytes_freed: int
+
+@router.get("/versions", response_model=List[VersionInfo])
+async def list_versions_endpoint(
+    mount: str = Query(..., description="The mount point name"),
+    path: str = Query(..., description="The path relative to the mount point")
+):
+    """Lists the recorded versions of a file, oldest first (also for a deleted file)."""
+    logger.info("Router received request to list versions of %s%s", mount, path)
+    return await asyncio.to_thread(file_operations.perform_list_versions, mount, path)
+
+@router.get("/version")
+async def read_version_endpoint(
+    mount: str = Query(..., description="The mount point name"),
+    path: str = Query(..., description="The path relative to the mount point"),
+    version: int = Query(..., ge=1, description="The version to read")
+):
+    """Streams the content of an old version of a file."""
+    logger.info("Router received request to read version %d of %s%s", version, mount, path)
+    chunks, size = await asyncio.to_thread(file_operations.open_version_for_streaming, mount, path, version)
+    return StreamingResponse(chunks, media_type="application/octet-stream", headers={"Content-Length": str(size)})
+
+@router.post("/restore")
+async def restore_version_endpoint(response: Response, payload: RestorePayload = Body(...)):
+    """Replaces a file with one of its versions; the restore is recorded as a new version."""
+    logger.info("Router received request to restore %s%s to version %d", payload.mount, payload.path, payload.version)
+    result = await asyncio.to_thread(
+        file_operations.perform_restore_version, payload.mount, payload.path, payload.version,
+    )
+    response.headers["ETag"] = f'"{result["etag"]}"'
+    return result
+
+@router.post("/snapshots/gc", response_model=SnapshotGcResult)
+async def snapshot_gc_endpoint():
+    """Applies the snapshot retention policy and deletes chunks no version references."""
+    logger.info("Router received request to collect snapshot garbage")
+    return await asyncio.to_thread(file_operations.perform_snapshot_gc)
+
 # Define the response model for mounts based on service output
 class MountPointInfo(BaseModel):
     name: str
@@ -95,4 +280,53 @@ async def get_mounts_endpoint():
     # Consider creating a filtered DTO if exposing absolute paths is undesirable.
     return file_operations.get_mount_info()
 
+# --- WebSocket: multiplexed FS operations (see services/fs_rpc.py) ---
+
+@router.websocket("/ws")
+async def fs_socket(ws: WebSocket):
+    codec = ws_codec.negotiate(ws)
+    await ws.accept(subprotocol=codec.subprotocol)
+    active_tasks: set[asyncio.Task] = set()
+    in_flight = asyncio.Semaphore(fs_rpc.WS_MAX_IN_FLIGHT)
+
+    async def handle_request(req: fs_rpc.FsRequest):
+        async def emit(event: dict):
+            await codec.send(ws, {"request_id": req.request_id, **event})
+
+        try:
+            result = await fs_rpc.execute(req, emit)
+            await emit({"result": result})
+        except HTTPException as exc:
+            await emit({"error": exc.detail, "status": exc.status_code})
+        except Exception as exc:
+            logger.exception("FS socket %s failed for %s%s", req.op, req.mount, req.path)
+            await emit({"error": str(exc), "status": status.HTTP_500_INTERNAL_SERVER_ERROR})
+        finally:
+            in_flight.release()
+
+    try:
+        while True:
+            data = await codec.receive(ws)
+            try:
+                req = fs_rpc.FsRequest.model_validate(data)
+            except ValidationError as exc:
+                request_id = data.get("request_id") if isinstance(data, dict) else None
+                await codec.send(ws, {"request_id": request_id, "error": str(exc),
+                                      "status": status.HTTP_422_UNPROCESSABLE_ENTITY})
+                continue
+            logger.debug("FS socket request %d: %s %s%s", req.request_id, req.op, req.mount, req.path)
+            await in_flight.acquire()  # stop reading new requests while the socket is saturated
+            task = asyncio.create_task(handle_request(req))
+            active_tasks.add(task)
+            task.add_done_callback(active_tasks.discard)
+
+    except WebSocketDisconnect:
+        for t in active_tasks:
+            t.cancel()
+    except Exception as exc:
+        # Undecodable frame: report and close, like the chat socket
+        logger.warning("FS socket closed after bad frame: %s", exc)
+        await codec.send(ws, {"error": str(exc)})
+        await ws.close(code=1011)
+
 # --- Endpoints End --- 
\ No newline at end of file
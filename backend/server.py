@@ -1,4 +1,12 @@
 '''Main FastAPI server application.'''
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,6 +14,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from backend.routers import http_frontend_echo
 from backend.routers import http_frontend_fs 
 from backend.routers import ai_router
+from backend.routers import batch_router
+from backend.services import logging_setup, shared_state
 
 origins = [
     "http://localhost:5173",
@@ -14,10 +24,19 @@ origins = [
     "http://127.0.0.1:8000",
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await batch_router.resume_batch_jobs()
+    metrics = asyncio.create_task(ai_router.share_metrics_forever())
+    yield
+    metrics.cancel()
+    await ai_router.close_streams()
+
 app = FastAPI(
     title="Genesis Backend",
     description="Backend services for Genesis project.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -26,7 +45,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "ETag"],
 )
+# Added last so it is the outermost middleware and sets the request id before anything logs
+app.add_middleware(logging_setup.RequestContextMiddleware)
 
 # Include routers
 app.include_router(
@@ -44,6 +66,11 @@ app.include_router(
     prefix="/frontend/ai",
     tags=["Frontend AI"]
 )
+app.include_router(
+    batch_router.router,
+    prefix="/frontend/ai/batch",
+    tags=["Frontend AI Batch"]
+)
 app.include_router(
     ai_router.router,
     prefix="/frontend/ws",
@@ -51,10 +78,124 @@ app.include_router(
 )
 
 
-if __name__ == "__main__":
+def create_app() -> FastAPI:
+    """uvicorn's app factory, run in every worker process: one queue-backed logging pipeline per process."""
+    logging_setup.ensure_logging()
+    return app
+
+
+# ---------------------------------------------------------------------
+# Process model
+# ---------------------------------------------------------------------
+# Single worker by default. With --workers N uvicorn starts N processes that
+# accept from one shared listening socket. With --reuse-port every worker binds
+# its own SO_REUSEPORT socket instead and the kernel balances connections
+# between them (Linux/BSD only). Cross-worker state (chat sessions, stream
+# resume/cancel, balancer metrics and file write locks) goes through
+# backend.services.shared_state, which is switched to the SQLite backend
+# automatically when more than one worker is running. The file ETag and text
+# caches stay per worker; they are validated against the file on every use.
+
+def _bind_reuseport_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def _serve_reuseport_worker(host: str, port: int, log_level: str, ws_deflate: bool) -> None:
+    config = uvicorn.Config(
+        "backend.server:create_app",
+        factory=True,
+        host=host,
+        port=port,
+        log_level=log_level,
+        ws_per_message_deflate=ws_deflate,
+        log_config=None,  # logging is set up by create_app
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=[_bind_reuseport_socket(host, port)])
+
+
+def _run_reuseport(host: str, port: int, workers: int, log_level: str, ws_deflate: bool) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(
+            target=_serve_reuseport_worker,
+            args=(host, port, log_level, ws_deflate),
+            name=f"genesis-worker-{i}",
+        )
+        for i in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+
+    # Treat SIGTERM like Ctrl+C so the workers are taken down with the parent
+    def _on_sigterm(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _on_sigterm)
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        for proc in procs:
+            proc.join()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the Genesis backend.")
+    parser.add_argument("--host", default=os.getenv("GENESIS_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("GENESIS_PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("GENESIS_WORKERS", "1")),
+        help="Number of worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--reuse-port", action="store_true", default=os.getenv("GENESIS_REUSE_PORT") == "1",
+        help="Give each worker its own SO_REUSEPORT socket instead of sharing one",
+    )
+    parser.add_argument(
+        "--state-backend", default=os.getenv(shared_state.STATE_BACKEND_ENV),
+        help="Shared state backend (memory, sqlite). Defaults to sqlite when workers > 1",
+    )
+    parser.add_argument(
+        "--ws-deflate", action=argparse.BooleanOptionalAction, default=os.getenv("GENESIS_WS_DEFLATE", "1") != "0",
+        help="Accept permessage-deflate on WebSockets when the client offers it (default: on)",
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    logging_setup.setup_logging()
+
+    # Workers inherit the environment, so this is how the choice reaches them
+    state_backend = args.state_backend or ("sqlite" if args.workers > 1 else "memory")
+    if args.workers > 1 and state_backend == "memory":
+        parser.error("--state-backend memory is per-process and can't be shared by --workers > 1")
+    os.environ[shared_state.STATE_BACKEND_ENV] = state_backend
+
+    if args.reuse_port and args.workers > 1:
+        if hasattr(socket, "SO_REUSEPORT"):
+            _run_reuseport(args.host, args.port, args.workers, args.log_level, args.ws_deflate)
+            return
+        print("WARNING: SO_REUSEPORT is not supported on this platform; using a shared listening socket")
+
     uvicorn.run(
-        "backend.server:app",  # Points to the 'app' instance in this 'server.py' file
-        host="127.0.0.1",
-        port=8000,
-        log_level="info",
-    ) 
\ No newline at end of file
+        "backend.server:create_app",  # returns the 'app' instance in this 'server.py' file
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        log_config=None,  # keep uvicorn's loggers on the root queue handler
+        ws_per_message_deflate=args.ws_deflate,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# backend/services/ai/attachments.py
+"""
+File attachments referenced from chat messages.
+
+Instead of reading a file through /frontend/fs/read and pasting it back into
+the prompt, a message can carry references that are resolved server-side:
+
+    {"role": "user", "content": "Why does this fail?",
+     "attachments": [{"mount": "src/", "path": "services/WS/msgpack.ts"},
+                     {"mount": "userdata/", "path": "big.log", "start_line": 1000, "line_count": 200}]}
+
+Each reference goes through the same mount validation and permission checks
+as the file API; line ranges are read through the line index, so a slice of
+a huge file never loads the rest of it. The content is injected in front of
+the message text as
+
+    <file path="src/services/WS/msgpack.ts">
+    ...
+    </file>
+
+on a copy of the message; the request and the stored session history keep
+only the references. Every turn therefore sees the current version of the
+file, while an LRU cache validated by (mtime, size) avoids rereading files
+that have not changed.
+
+Limits are per attachment: ATTACHMENT_MAX_BYTES of UTF-8 text and
+ATTACHMENT_MAX_TOKENS estimated tokens (413 when exceeded; attach a line
+range instead). Binary files are refused with 415. References in earlier
+session turns that no longer resolve (deleted or moved files) are replaced
+by an `unavailable` marker instead of failing the turn.
+"""
+
+from __future__ import annotations
+
+import html
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from backend.services import file_operations, line_index
+from .base import Message
+from .context import count_tokens
+
+# ---------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------
+
+ATTACHMENT_MAX_BYTES = int(os.getenv("GENESIS_ATTACHMENT_MAX_BYTES", str(256 * 1024)))
+ATTACHMENT_MAX_TOKENS = int(os.getenv("GENESIS_ATTACHMENT_MAX_TOKENS", "32000"))
+ATTACHMENT_CACHE_BYTES = int(os.getenv("GENESIS_ATTACHMENT_CACHE_BYTES", str(64 * 1024 * 1024)))
+MAX_ATTACHMENTS_PER_MESSAGE = 20
+
+# Bytes inspected for NUL when deciding whether a file is binary
+_BINARY_SNIFF_BYTES = 8192
+
+
+@dataclass(frozen=True)
+class AttachmentRef:
+    mount: str
+    path: str
+    start_line: Optional[int] = None  # 0-based; with line_count, attach only that range
+    line_count: Optional[int] = None
+
+    @classmethod
+    def parse(cls, raw: Any) -> "AttachmentRef":
+        if not isinstance(raw, dict) or not isinstance(raw.get("mount"), str) or not isinstance(raw.get("path"), str):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Each attachment needs string 'mount' and 'path' fields")
+        start, count = raw.get("start_line"), raw.get("line_count")
+        if (start is None) != (count is None) or any(
+            v is not None and (not isinstance(v, int) or v < 0) for v in (start, count)
+        ):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Attachment line ranges need non-negative 'start_line' and 'line_count'")
+        return cls(raw["mount"], raw["path"], start, count)
+
+    @property
+    def label(self) -> str:
+        label = self.mount + self.path.lstrip("/")
+        if self.start_line is not None:
+            label += f"#L{self.start_line + 1}-{self.start_line + self.line_count}"
+        return label
+
+
+def has_attachments(messages: List[Message]) -> bool:
+    """True when any message carries the key, even an empty list: it must not reach the provider."""
+    return any("attachments" in m for m in messages)
+
+
+# ---------------------------------------------------------------------
+# Content cache
+# ---------------------------------------------------------------------
+
+class ContentCache:
+    """LRU of decoded attachment text under a byte cap, validated by (mtime, size)."""
+
+    def __init__(self, max_bytes: int = ATTACHMENT_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[int, int, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, st: os.stat_result) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[:2] != (st.st_mtime_ns, st.st_size):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: tuple, st: os.stat_result, text: str) -> None:
+        size = len(text)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._entries[key] = (st.st_mtime_ns, st.st_size, text)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[2])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+content_cache = ContentCache()
+
+
+# ---------------------------------------------------------------------
+# Resolution
+# ---------------------------------------------------------------------
+
+def _too_large(ref: AttachmentRef, what: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Attachment {ref.label} exceeds the {what} limit; attach a line range instead",
+    )
+
+
+def _read(ref: AttachmentRef, abs_path: str, st: os.stat_result) -> str:
+    if ref.start_line is not None:
+        result = line_index.read_lines(abs_path, ref.start_line, ref.line_count)
+        text = "\n".join(result["lines"])
+        if result["truncated"] or result["next_line"] < min(ref.start_line + ref.line_count, result["total_lines"]):
+            raise _too_large(ref, "line range")
+    else:
+        if st.st_size > ATTACHMENT_MAX_BYTES:
+            raise _too_large(ref, f"{ATTACHMENT_MAX_BYTES}-byte")
+        with open(abs_path, "rb") as f:
+            data = f.read(ATTACHMENT_MAX_BYTES + 1)
+        if b"\0" in data[:_BINARY_SNIFF_BYTES]:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                detail=f"Attachment {ref.label} looks like a binary file")
+        text = data.decode("utf-8", errors="replace")
+    if len(text.encode("utf-8")) > ATTACHMENT_MAX_BYTES:
+        raise _too_large(ref, f"{ATTACHMENT_MAX_BYTES}-byte")
+    return text
+
+
+def load_attachment(ref: AttachmentRef) -> Tuple[str, bool]:
+    """Returns (text, cache_hit) for a reference, enforcing permissions and the byte limit."""
+    abs_path = file_operations.resolve_readable_file(ref.mount, ref.path)
+    try:
+        st = os.stat(abs_path)
+        key = (abs_path, ref.start_line, ref.line_count)
+        text = content_cache.get(key, st)
+        if text is not None:
+            return text, True
+        text = _read(ref, abs_path, st)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {ref.label}")
+    content_cache.put(key, st, text)
+    return text, False
+
+
+def render(ref: AttachmentRef, text: str) -> str:
+    if not text.endswith("\n"):
+        text += "\n"
+    return f'<file path="{html.escape(ref.label, quote=True)}">\n{text}</file>'
+
+
+def expand_attachments(
+    messages: List[Message],
+    model: str,
+    strict_from: int = 0,
+) -> Tuple[List[Message], Dict[str, int]]:
+    """
+    Returns copies of `messages` with attachment content injected and the
+    `attachments` key removed, plus stats for the reply's `meta`.
+
+    Errors in messages at index >= `strict_from` (the new turn) are raised;
+    earlier ones (stored history) become `unavailable` markers.
+    """
+    stats = {"count": 0, "bytes": 0, "tokens": 0, "cache_hits": 0, "unavailable": 0}
+    expanded: List[Message] = []
+    for i, message in enumerate(messages):
+        refs = message.get("attachments")
+        if not refs:
+            expanded.append({k: v for k, v in message.items() if k != "attachments"} if "attachments" in message else message)
+            continue
+        if not isinstance(refs, list) or len(refs) > MAX_ATTACHMENTS_PER_MESSAGE:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"'attachments' must be a list of at most {MAX_ATTACHMENTS_PER_MESSAGE} references")
+
+        parts: List[str] = []
+        for raw in refs:
+            ref = AttachmentRef.parse(raw)
+            try:
+                text, hit = load_attachment(ref)
+                tokens = count_tokens(text, model)
+                if tokens > ATTACHMENT_MAX_TOKENS:
+                    raise _too_large(ref, f"{ATTACHMENT_MAX_TOKENS}-token")
+            except HTTPException as exc:
+                if i >= strict_from:
+                    raise
+                parts.append(f'<file path="{html.escape(ref.label, quote=True)}" '
+                             f'unavailable="{html.escape(str(exc.detail), quote=True)}"/>')
+                stats["unavailable"] += 1
+                continue
+            parts.append(render(ref, text))
+            stats["count"] += 1
+            stats["bytes"] += len(text)
+            stats["tokens"] += tokens
+            stats["cache_hits"] += hit
+
+        content = message.get("content") or ""
+        copy = {k: v for k, v in message.items() if k != "attachments"}
+        copy["content"] = "\n\n".join(parts + ([content] if content else []))
+        expanded.append(copy)
+    return expanded, stats
@@ -0,0 +1,214 @@
+# backend/services/ai/balancer.py
+"""
+Client-side load balancing across several upstream endpoint/key pairs.
+
+Each OpenAI-compatible provider owns an UpstreamPool. Requests pick a
+backend with one of these strategies (GENESIS_LB_STRATEGY):
+
+    ewma            lowest EWMA response latency × (in-flight + 1)  (default)
+    least_in_flight fewest requests currently running
+    round_robin     rotate through healthy backends (baseline for benchmarks)
+
+A backend that answers 429, 5xx or fails to connect is ejected for an
+exponentially growing period (or the server's Retry-After, capped at
+EJECT_MAX_SECONDS). When it comes back its weight ramps from 10% to 100%
+over SLOW_START_SECONDS, so it is re-admitted gradually instead of taking
+a full share of traffic at once. A backend that rejects its key (401/403)
+fails fast and would otherwise look like the best choice, so it is ejected
+for AUTH_EJECT_SECONDS.
+If every backend is ejected the one due back soonest is used anyway.
+
+Configuration, per provider:
+    <NAME>_BACKENDS="https://host-a/v1/chat/completions|key-a,http://127.0.0.1:8080/v1/chat/completions|"
+An empty key sends no Authorization header (typical for local servers).
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# ---------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------
+
+STRATEGIES = ("ewma", "least_in_flight", "round_robin")
+DEFAULT_STRATEGY = os.getenv("GENESIS_LB_STRATEGY", "ewma")
+
+EWMA_ALPHA = 0.3
+EJECT_BASE_SECONDS = 1.0
+EJECT_MAX_SECONDS = 60.0
+AUTH_EJECT_SECONDS = 300.0
+AUTH_FAILURE_STATUSES = (401, 403)
+SLOW_START_SECONDS = 10.0
+MIN_WEIGHT = 0.1
+
+
+@dataclass(eq=False)  # identity, not config, tells upstreams apart (exclude/candidates checks)
+class Upstream:
+    endpoint: str
+    api_key: Optional[str] = None
+    in_flight: int = 0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ewma_latency: Optional[float] = None
+    ejected_until: float = 0.0
+    last_status: Optional[int] = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def weight(self, now: float) -> float:
+        """Slow-start weight after re-admission: MIN_WEIGHT → 1.0 over SLOW_START_SECONDS."""
+        if not self.ejected_until:
+            return 1.0
+        ramp = (now - self.ejected_until) / SLOW_START_SECONDS
+        return min(1.0, max(MIN_WEIGHT, ramp))
+
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+
+def parse_backends(spec: str) -> List[Tuple[str, Optional[str]]]:
+    """Parses "url|key,url|key" (the key part is optional)."""
+    backends = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        endpoint, _, key = entry.partition("|")
+        backends.append((endpoint.strip(), key.strip() or None))
+    return backends
+
+
+class UpstreamPool:
+    """Picks a backend per request and tracks its health."""
+
+    def __init__(self, backends: List[Tuple[str, Optional[str]]], strategy: str = DEFAULT_STRATEGY) -> None:
+        if not backends:
+            raise ValueError("UpstreamPool needs at least one backend")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown load-balancing strategy {strategy!r}. Valid strategies are: {list(STRATEGIES)}")
+        self.strategy = strategy
+        self.upstreams = [Upstream(endpoint, key) for endpoint, key in backends]
+        self._rotation = itertools.cycle(range(len(self.upstreams)))
+
+    def __len__(self) -> int:
+        return len(self.upstreams)
+
+    def pick(self, exclude: Tuple[Upstream, ...] = ()) -> Upstream:
+        now = time.monotonic()
+        candidates = [u for u in self.upstreams if u.available(now) and u not in exclude]
+        if not candidates:
+            # Everything is ejected (or already tried): fail open on the one due back first
+            remaining = [u for u in self.upstreams if u not in exclude] or self.upstreams
+            return min(remaining, key=lambda u: u.ejected_until)
+
+        if self.strategy == "round_robin":
+            for _ in range(len(self.upstreams)):
+                upstream = self.upstreams[next(self._rotation)]
+                if upstream in candidates:
+                    return upstream
+
+        if self.strategy == "least_in_flight":
+            return min(candidates, key=lambda u: ((u.in_flight + 1) / u.weight(now), u.ewma_latency or 0.0))
+
+        # ewma: untried backends borrow the best known latency so they get probed
+        known = [u.ewma_latency for u in candidates if u.ewma_latency is not None]
+        default = min(known) if known else 0.0
+        return min(
+            candidates,
+            key=lambda u: ((u.ewma_latency if u.ewma_latency is not None else default) or 1e-3)
+            * (u.in_flight + 1) / u.weight(now),
+        )
+
+    def start(self, upstream: Upstream) -> float:
+        """Counts a request against the backend; pair with release()."""
+        upstream.in_flight += 1
+        upstream.requests += 1
+        return time.monotonic()
+
+    def release(self, upstream: Upstream) -> None:
+        upstream.in_flight -= 1
+
+    def succeeded(self, upstream: Upstream, started: float, status: int = 200) -> None:
+        """Records a healthy response; latency runs from start() to now (response headers)."""
+        latency = time.monotonic() - started
+        upstream.last_status = status
+        upstream.consecutive_failures = 0
+        if upstream.ewma_latency is None:
+            upstream.ewma_latency = latency
+        else:
+            upstream.ewma_latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * upstream.ewma_latency
+
+    def failed(self, upstream: Upstream, status: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        """Records a 401/403/429/5xx/connection failure and ejects the backend."""
+        upstream.failures += 1
+        upstream.last_status = status
+        upstream.consecutive_failures += 1
+        if status in AUTH_FAILURE_STATUSES:
+            upstream.ejected_until = time.monotonic() + AUTH_EJECT_SECONDS  # the key won't start working by itself
+            return
+        backoff = min(EJECT_BASE_SECONDS * 2 ** (upstream.consecutive_failures - 1), EJECT_MAX_SECONDS)
+        upstream.ejected_until = time.monotonic() + (min(retry_after, EJECT_MAX_SECONDS) if retry_after else backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "backends": [
+                {
+                    "endpoint": u.endpoint,
+                    "in_flight": u.in_flight,
+                    "requests": u.requests,
+                    "failures": u.failures,
+                    "ewma_ms": round(u.ewma_latency * 1000, 2) if u.ewma_latency is not None else None,
+                    "ejected_for_s": round(max(0.0, u.ejected_until - now), 2),
+                    "weight": round(u.weight(now), 2),
+                    "last_status": u.last_status,
+                }
+                for u in self.upstreams
+            ],
+        }
+
+
+def merge_stats(per_worker: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combines one pool's stats() from several workers (which share the pool's
+    configuration, so their backends line up). Counts add up, the EWMA is
+    weighted by requests, a backend counts as ejected while any worker ejects
+    it, and its weight and last status come from the worker that sent it the
+    most requests.
+    """
+    backends = []
+    for views in zip(*(stats["backends"] for stats in per_worker)):
+        busiest = max(views, key=lambda b: b["requests"])
+        timed = [(b["ewma_ms"], max(1, b["requests"])) for b in views if b["ewma_ms"] is not None]
+        backends.append({
+            "endpoint": busiest["endpoint"],
+            "in_flight": sum(b["in_flight"] for b in views),
+            "requests": sum(b["requests"] for b in views),
+            "failures": sum(b["failures"] for b in views),
+            "ewma_ms": round(sum(ms * n for ms, n in timed) / sum(n for _, n in timed), 2) if timed else None,
+            "ejected_for_s": max(b["ejected_for_s"] for b in views),
+            "weight": busiest["weight"],
+            "last_status": busiest["last_status"],
+        })
+    return {"strategy": per_worker[0]["strategy"], "workers": len(per_worker), "backends": backends}
+
+
+def is_retryable_status(status: int) -> bool:
+    """Statuses that eject the backend and move the request to another one."""
+    return status == 429 or status >= 500 or status in AUTH_FAILURE_STATUSES
+
+
+def retry_after_seconds(headers: Any) -> Optional[float]:
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to exponential backoff
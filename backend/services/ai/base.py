@@ -14,7 +14,9 @@ class MetaData(TypedDict, total=False):
     usage: Dict[str, Any]
     latency: float
     ttfb: float
+    ttft: float
     model: str
+    endpoint: str  # backend that served the request
 
 # Events streamed by providers when stream=True
 class TextEvent(TypedDict):
@@ -0,0 +1,404 @@
+# backend/services/ai/batch.py
+"""
+Offline batch processing of chat requests.
+
+A job is a JSONL file with one ChatRequest per line. Each job lives in its
+own directory under a readwrite mount:
+
+    <mount>/.batch/<job_id>/job.json       status and counters
+    <mount>/.batch/<job_id>/input.jsonl    the submitted requests
+    <mount>/.batch/<job_id>/results.jsonl  one result per finished line, in completion order
+
+Results are appended as soon as each request finishes, so a job interrupted
+by a restart resumes from where it stopped: lines whose index is already in
+results.jsonl are skipped. Requests run through the regular provider registry
+with at most GENESIS_BATCH_CONCURRENCY requests in flight per provider. Each
+line waits for its provider's slot in its own task, so a saturated provider
+does not hold up lines for the others; up to BATCH_MAX_PENDING lines are read
+ahead. Results are written in batches from a worker thread.
+
+A job only runs while its runner holds an OS lock on `<job>/lease`, so when
+several processes resume interrupted jobs at startup each job runs once. The
+lock goes away with its process, so a crashed runner never blocks a resume.
+Cancelling a job that runs in another process leaves a `cancel` file there,
+which the runner picks up within PROGRESS_FLUSH_SECONDS.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import IO, Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from fastapi import HTTPException, status
+
+from backend.services import file_operations
+from .base import Message
+from .registry import get_provider
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------
+
+BATCH_MOUNT = os.getenv("GENESIS_BATCH_MOUNT", "userdata/")
+BATCH_DIR = ".batch"
+BATCH_CONCURRENCY = int(os.getenv("GENESIS_BATCH_CONCURRENCY", "4"))  # per provider
+BATCH_MAX_UPLOAD_BYTES = int(os.getenv("GENESIS_BATCH_MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
+# Lines read ahead of a free provider slot; bounds memory for huge inputs
+BATCH_MAX_PENDING = 1024
+# job.json is rewritten at most this often, and the cancel marker checked this often, while a job runs
+PROGRESS_FLUSH_SECONDS = 1.0
+
+ACTIVE_STATES = ("queued", "running")
+
+# Turns one parsed input line into (model, messages, chat options)
+Prepare = Callable[[Dict[str, Any]], Awaitable[Tuple[str, List[Message], Dict[str, Any]]]]
+
+
+def _job_dir(job_id: str) -> str:
+    if not job_id.isalnum():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid job id: {job_id}")
+    abs_path, mount_info = file_operations.resolve_path(BATCH_MOUNT, f"{BATCH_DIR}/{job_id}")
+    file_operations.check_permissions(mount_info, 'write')
+    return abs_path
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _append_results(f: IO[str], results: List[Dict[str, Any]]) -> None:
+    f.write("".join(json.dumps(result) + "\n" for result in results))
+    f.flush()
+
+
+def _count_lines(path: str) -> int:
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _completed_indices(path: str) -> Tuple[Set[int], int]:
+    """Indices already in results.jsonl and how many of them failed."""
+    done: Set[int] = set()
+    failed = 0
+    if not os.path.exists(path):
+        return done, failed
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn final line from a crash; that request is simply rerun
+            done.add(record["index"])
+            failed += "error" in record
+    return done, failed
+
+
+def _take_lease(job_dir: str) -> Optional[IO[bytes]]:
+    """Locks `<job_dir>/lease` without waiting; the open file is the lease (closing it releases it)."""
+    lease = open(os.path.join(job_dir, "lease"), 'a+b')
+    try:
+        if fcntl is not None:
+            fcntl.flock(lease.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lease.seek(0)
+            msvcrt.locking(lease.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lease.close()
+        return None
+    return lease
+
+
+def _leased_elsewhere(job_dir: str) -> bool:
+    lease = _take_lease(job_dir)
+    if lease is None:
+        return True
+    lease.close()
+    return False
+
+
+class BatchManager:
+    """Owns the running job tasks and the per-provider concurrency limits."""
+
+    def __init__(self, prepare: Prepare, concurrency: int = BATCH_CONCURRENCY) -> None:
+        self.prepare = prepare
+        self.concurrency = concurrency
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+
+    # --- Job metadata ---
+
+    def _read_job(self, job_id: str) -> Dict[str, Any]:
+        path = os.path.join(_job_dir(job_id), "job.json")
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Batch job not found: {job_id}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_job(self, job: Dict[str, Any]) -> None:
+        job["updated"] = time.time()
+        _write_json(os.path.join(_job_dir(job["job_id"]), "job.json"), job)
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        return self._read_job(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        abs_path, mount_info = file_operations.resolve_path(BATCH_MOUNT, f"{BATCH_DIR}/")
+        file_operations.check_permissions(mount_info, 'read')
+        if not os.path.isdir(abs_path):
+            return []
+        jobs = []
+        for job_id in sorted(os.listdir(abs_path)):
+            if os.path.isfile(os.path.join(abs_path, job_id, "job.json")):
+                jobs.append(self._read_job(job_id))
+        return jobs
+
+    def results_path(self, job_id: str) -> str:
+        self._read_job(job_id)  # 404 for unknown jobs
+        return os.path.join(_job_dir(job_id), "results.jsonl")
+
+    # --- Submission ---
+
+    def _create_job(self, job_id: str, source: str, fill_input: Callable[[str], None]) -> Dict[str, Any]:
+        job_dir = _job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        input_path = os.path.join(job_dir, "input.jsonl")
+        fill_input(input_path)
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "source": source,
+            "total": _count_lines(input_path),
+            "done": 0,
+            "failed": 0,
+            "created": now,
+            "updated": now,
+        }
+        self._save_job(job)
+        return job
+
+    async def submit_from_mount(self, mount_name: str, user_path: str) -> Dict[str, Any]:
+        """Creates a job from a JSONL file on a mount; the file is copied so later edits don't affect it."""
+        abs_path, mount_info = file_operations.resolve_path(mount_name, user_path)
+        file_operations.check_permissions(mount_info, 'read')
+        if not os.path.isfile(abs_path):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {user_path}")
+        job = await asyncio.to_thread(
+            self._create_job, uuid.uuid4().hex[:12], f"{mount_name}{user_path}",
+            lambda dest: shutil.copyfile(abs_path, dest),
+        )
+        self.start(job["job_id"])
+        return job
+
+    async def submit_upload(self, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Creates a job from a streamed JSONL upload without holding it in memory."""
+        job_id = uuid.uuid4().hex[:12]
+        staging = _job_dir(job_id) + ".upload"
+        await asyncio.to_thread(os.makedirs, os.path.dirname(staging), exist_ok=True)
+        try:
+            with open(staging, 'wb') as f:
+                size = 0
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > BATCH_MAX_UPLOAD_BYTES:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Batch upload exceeds {BATCH_MAX_UPLOAD_BYTES} bytes",
+                        )
+                    await asyncio.to_thread(f.write, chunk)
+            job = await asyncio.to_thread(self._create_job, job_id, "upload", lambda dest: os.replace(staging, dest))
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+        self.start(job["job_id"])
+        return job
+
+    # --- Execution ---
+
+    def start(self, job_id: str) -> None:
+        if job_id in self._tasks and not self._tasks[job_id].done():
+            return
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def cancel(self, job_id: str) -> Dict[str, Any]:
+        job = await asyncio.to_thread(self._read_job, job_id)
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            job = await asyncio.to_thread(self._read_job, job_id)
+        elif job["status"] in ACTIVE_STATES:
+            job_dir = _job_dir(job_id)
+            if await asyncio.to_thread(_leased_elsewhere, job_dir):
+                # Running in another process, which stops at its next progress flush
+                await asyncio.to_thread(_write_json, os.path.join(job_dir, "cancel"), {"requested": time.time()})
+            else:
+                job["status"] = "cancelled"
+                await asyncio.to_thread(self._save_job, job)
+        return job
+
+    async def resume(self, job_id: str) -> Dict[str, Any]:
+        job = await asyncio.to_thread(self._read_job, job_id)
+        if job["status"] == "completed":
+            return job
+        cancel_marker = os.path.join(_job_dir(job_id), "cancel")
+        if os.path.exists(cancel_marker):
+            os.remove(cancel_marker)
+        if job["status"] not in ACTIVE_STATES:
+            job["status"] = "queued"
+            await asyncio.to_thread(self._save_job, job)
+        self.start(job_id)  # a no-op if another process still runs it
+        return job
+
+    def resume_interrupted(self) -> None:
+        """Restarts jobs that were queued or running when the server stopped."""
+        try:
+            jobs = self.list_jobs()
+        except HTTPException as exc:
+            logger.warning("Batch resume skipped: %s", exc.detail)
+            return
+        for job in jobs:
+            if job["status"] in ACTIVE_STATES:
+                self.start(job["job_id"])
+
+    def _limit(self, provider_name: str) -> asyncio.Semaphore:
+        if provider_name not in self._limits:
+            self._limits[provider_name] = asyncio.Semaphore(self.concurrency)
+        return self._limits[provider_name]
+
+    async def _run_one(self, index: int, line: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            model, msgs, opts = await self.prepare(line)
+            prov = get_provider(model)
+            text, meta = await prov.chat(msgs, stream=False, model=model, **opts)
+            return {"index": index, "request_id": line.get("request_id"), "text": text, "meta": meta}
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+            return {"index": index, "request_id": line.get("request_id"), "error": detail}
+
+    async def _run(self, job_id: str) -> None:
+        job_dir = _job_dir(job_id)
+        lease = await asyncio.to_thread(_take_lease, job_dir)
+        if lease is None:
+            logger.info("Batch job %s is running in another process", job_id)
+            return
+        try:
+            await self._run_leased(job_id, job_dir)
+        finally:
+            lease.close()
+
+    async def _run_leased(self, job_id: str, job_dir: str) -> None:
+        job = await asyncio.to_thread(self._read_job, job_id)
+        if job["status"] not in ACTIVE_STATES:
+            return  # finished or cancelled by the previous lease holder
+        results_path = os.path.join(job_dir, "results.jsonl")
+        cancel_marker = os.path.join(job_dir, "cancel")
+        done, failed = await asyncio.to_thread(_completed_indices, results_path)
+        job.update(status="running", done=len(done), failed=failed)
+        await asyncio.to_thread(self._save_job, job)
+
+        in_flight: Set[asyncio.Task] = set()
+        pending = asyncio.Semaphore(BATCH_MAX_PENDING)
+        finished: asyncio.Queue = asyncio.Queue()  # results, then None once every line is in
+        runner = asyncio.current_task()
+
+        async def watch_cancel_marker() -> None:
+            while not await asyncio.to_thread(os.path.exists, cancel_marker):
+                await asyncio.sleep(PROGRESS_FLUSH_SECONDS)
+            runner.cancel()
+
+        async def write_results() -> None:
+            # Whatever finished since the last write goes out in one call; job.json at most every flush period
+            last_flush = time.monotonic()
+            while True:
+                batch = [await finished.get()]
+                while not finished.empty():
+                    batch.append(finished.get_nowait())
+                closing = batch[-1] is None
+                batch = [result for result in batch if result is not None]
+                if batch:
+                    await asyncio.to_thread(_append_results, results, batch)
+                    job["done"] += len(batch)
+                    job["failed"] += sum("error" in result for result in batch)
+                if closing:
+                    return
+                if time.monotonic() - last_flush >= PROGRESS_FLUSH_SECONDS:
+                    last_flush = time.monotonic()
+                    await asyncio.to_thread(self._save_job, job)
+
+        async def run_line(index: int, line: Dict[str, Any], provider_name: str) -> None:
+            try:
+                async with self._limit(provider_name):
+                    finished.put_nowait(await self._run_one(index, line))
+            finally:
+                pending.release()
+
+        watcher = asyncio.create_task(watch_cancel_marker())
+        results = await asyncio.to_thread(open, results_path, 'a', encoding='utf-8')
+        writer = asyncio.create_task(write_results())
+        try:
+            with open(os.path.join(job_dir, "input.jsonl"), 'r', encoding='utf-8') as source:
+                index = -1
+                for raw in source:
+                    if not raw.strip():
+                        continue
+                    index += 1
+                    if index in done:
+                        continue
+                    try:
+                        line = json.loads(raw)
+                    except json.JSONDecodeError as exc:
+                        finished.put_nowait({"index": index, "error": f"Invalid JSON: {exc}"})
+                        continue
+                    try:
+                        provider_name = get_provider(line.get("model", "")).name
+                    except KeyError:
+                        provider_name = ""  # _run_one records the error for this line
+                    await pending.acquire()
+                    task = asyncio.create_task(run_line(index, line, provider_name))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.gather(*in_flight)
+            job["status"] = "completed"
+        except asyncio.CancelledError:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            job["status"] = "cancelled"
+            raise
+        except Exception as exc:
+            job["status"] = "failed"
+            job["error"] = str(exc)
+        finally:
+            watcher.cancel()
+            finished.put_nowait(None)
+            await asyncio.gather(writer, return_exceptions=True)  # results that finished are still recorded
+            await asyncio.to_thread(results.close)
+            if job["status"] != "running" and os.path.exists(cancel_marker):
+                os.remove(cancel_marker)
+            await asyncio.to_thread(self._save_job, job)
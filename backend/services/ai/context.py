@@ -0,0 +1,215 @@
+# backend/services/ai/context.py
+"""
+Context management applied to a conversation before it is sent upstream.
+
+Token counts are local estimates (no network, no tokenizer downloads): text
+is split with a GPT-style pre-tokenizer regex and every piece is costed by
+the provider's average characters-per-token. Counts are memoised by a digest
+of the message text, so the unchanged history prefix of a long conversation
+is only tokenized once no matter how many turns follow, and the memo never
+keeps message bodies (expanded attachments can be large) alive.
+
+Policies
+--------
+    none      - forward everything
+    truncate  - drop the oldest non-system messages until the budget fits
+    window    - keep only the last `max_messages` non-system messages,
+                then apply `truncate`
+
+The budget is the model's context window minus the room reserved for the
+reply, optionally lowered further by the caller.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from . import models
+from .base import Message
+
+# ---------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------
+
+POLICIES = ("none", "truncate", "window")
+DEFAULT_POLICY = os.getenv("GENESIS_CONTEXT_POLICY", "truncate")
+DEFAULT_MAX_MESSAGES = int(os.getenv("GENESIS_CONTEXT_MAX_MESSAGES", "0")) or None
+
+# Used for models missing from AI_MODELS
+FALLBACK_CONTEXT_WINDOW = 32_768
+FALLBACK_MAX_OUTPUT_TOKENS = 4_096
+
+# Average characters per token for each provider's tokenizer family
+_CHARS_PER_TOKEN: Dict[str, float] = {
+    "deepseek": 3.6,
+    "openai": 4.0,
+    "gemini": 4.0,
+}
+_DEFAULT_CHARS_PER_TOKEN = 4.0
+
+# Fixed cost of the chat template around every message (role markers etc.)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Letters, digits, punctuation runs and whitespace, like tiktoken's pre-tokenizer
+_PIECE_RE = re.compile(r"'(?:s|t|re|ve|m|ll|d)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+")
+# CJK ideographs, kana and hangul tokenize at roughly one token per character
+_WIDE_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+@dataclass(frozen=True)
+class ContextPolicy:
+    policy: str = DEFAULT_POLICY
+    max_messages: Optional[int] = DEFAULT_MAX_MESSAGES
+    max_tokens: Optional[int] = None  # further cap below the model's own budget
+
+
+# ---------------------------------------------------------------------
+# Token counting
+# ---------------------------------------------------------------------
+
+_COUNT_CACHE_SIZE = 8192
+_count_cache: "OrderedDict[Tuple[bytes, float], int]" = OrderedDict()
+_count_lock = threading.Lock()
+
+
+def _tokenize_count(text: str, chars_per_token: float) -> int:
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        wide = 0 if piece.isascii() else len(_WIDE_RE.findall(piece))
+        rest = len(piece) - wide
+        tokens += wide + (math.ceil(rest / chars_per_token) if rest else 0)
+    return tokens
+
+
+def _count_text(text: str, chars_per_token: float) -> int:
+    """_tokenize_count, memoised under a 16-byte digest of the text."""
+    key = (hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest(), chars_per_token)
+    with _count_lock:
+        tokens = _count_cache.get(key)
+        if tokens is not None:
+            _count_cache.move_to_end(key)
+            return tokens
+    tokens = _tokenize_count(text, chars_per_token)
+    with _count_lock:
+        _count_cache[key] = tokens
+        while len(_count_cache) > _COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return tokens
+
+
+def _model_info(model: str) -> Tuple[str, int, int]:
+    try:
+        info = models.get(model)
+        return info.provider, info.context_window, info.max_output_tokens
+    except KeyError:
+        return "", FALLBACK_CONTEXT_WINDOW, FALLBACK_MAX_OUTPUT_TOKENS
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Estimated token count of `text` for `model`."""
+    provider, _, _ = _model_info(model)
+    return _count_text(text, _CHARS_PER_TOKEN.get(provider, _DEFAULT_CHARS_PER_TOKEN))
+
+
+def count_message_tokens(messages: List[Message], model: str) -> int:
+    """Estimated prompt size of a message list, including per-message overhead."""
+    provider, _, _ = _model_info(model)
+    ratio = _CHARS_PER_TOKEN.get(provider, _DEFAULT_CHARS_PER_TOKEN)
+    return sum(_count_text(m.get("content") or "", ratio) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def token_budget(model: str, max_tokens: Optional[int] = None) -> int:
+    """Prompt tokens available for `model` once room for the reply is reserved."""
+    _, context_window, max_output = _model_info(model)
+    budget = context_window - max_output
+    if max_tokens:
+        budget = min(budget, max_tokens)
+    return max(budget, 0)
+
+
+# ---------------------------------------------------------------------
+# Compaction
+# ---------------------------------------------------------------------
+
+def _trim_to_tokens(message: Message, tokens: int, ratio: float) -> Message:
+    """Keeps the tail of an oversize message so it fits in `tokens`."""
+    content = message.get("content") or ""
+    keep_chars = max(int(tokens * ratio), 0)
+    # Bypass the cache: trimmed variants are never seen again
+    while keep_chars and _tokenize_count(content[-keep_chars:], ratio) > tokens:
+        keep_chars = int(keep_chars * 0.9)
+    return {**message, "content": content[-keep_chars:] if keep_chars else ""}
+
+
+def compact_messages(
+    messages: List[Message],
+    model: str,
+    policy: Optional[ContextPolicy] = None,
+) -> Tuple[List[Message], Dict[str, Any]]:
+    """
+    Applies `policy` to `messages` for `model`.
+
+    System messages are always kept, as is the most recent message. Returns the
+    compacted list and a stats dict suitable for the reply's `meta`. Raises 413
+    when the system messages leave no room for the most recent message.
+    """
+    policy = policy or ContextPolicy()
+    if policy.policy not in POLICIES:
+        raise ValueError(f"Unknown context policy {policy.policy!r}. Valid policies are: {list(POLICIES)}")
+
+    provider, _, _ = _model_info(model)
+    ratio = _CHARS_PER_TOKEN.get(provider, _DEFAULT_CHARS_PER_TOKEN)
+    sizes = [_count_text(m.get("content") or "", ratio) + MESSAGE_OVERHEAD_TOKENS for m in messages]
+    tokens_before = sum(sizes)
+    budget = token_budget(model, policy.max_tokens)
+
+    kept = list(range(len(messages)))
+    if policy.policy != "none":
+        system = [i for i in kept if messages[i].get("role") == "system"]
+        history = [i for i in kept if messages[i].get("role") != "system"]
+
+        if policy.policy == "window" and policy.max_messages:
+            history = history[-policy.max_messages:]
+
+        # Drop the oldest history until it fits, never the latest message
+        total = sum(sizes[i] for i in system) + sum(sizes[i] for i in history)
+        while total > budget and len(history) > 1:
+            total -= sizes[history.pop(0)]
+        kept = sorted(system + history)
+
+    compacted = [messages[i] for i in kept]
+    tokens_after = sum(sizes[i] for i in kept)
+
+    # A single message can still be larger than the whole budget
+    if policy.policy != "none" and tokens_after > budget and compacted:
+        last = len(compacted) - 1
+        room = budget - (tokens_after - sizes[kept[last]]) - MESSAGE_OVERHEAD_TOKENS
+        trimmed_message = _trim_to_tokens(compacted[last], max(room, 0), ratio)
+        if compacted[last].get("content") and not trimmed_message["content"]:
+            # The system messages alone take the whole budget; an empty prompt is not worth sending
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"The system prompt alone exceeds the {budget}-token context budget of {model}",
+            )
+        compacted[last] = trimmed_message
+        trimmed = _tokenize_count(compacted[last]["content"], ratio) + MESSAGE_OVERHEAD_TOKENS
+        tokens_after = tokens_after - sizes[kept[last]] + trimmed
+
+    stats = {
+        "policy": policy.policy,
+        "budget": budget,
+        "messages_before": len(messages),
+        "messages_after": len(compacted),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+    }
+    return compacted, stats
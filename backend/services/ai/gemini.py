@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from .openai_compat import OpenAICompatibleProvider
+
+__all__ = ["Gemini"]
+
+
+class Gemini(OpenAICompatibleProvider):
+    """Adapter for Gemini through Google's OpenAI-compatible endpoint."""
+
+    name: str = "gemini"
+
+    default_endpoint = "https://generativelanguage.googleapis.com/v1beta/openai/chat/completions"
+    endpoint_env = "GEMINI_ENDPOINT"
+    api_key_env = "GEMINI_API_KEY"
+    backends_env = "GEMINI_BACKENDS"
+    default_model = "gemini-2.0-flash"
+
+
+PROVIDER = Gemini
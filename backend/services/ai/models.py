@@ -8,13 +8,17 @@ class ModelInfo:
     name: str          # model identifier used in payloads
     display_name: str  # user‑facing label
     supports_thinking: bool  # True if the provider returns “thought” chunks
+    context_window: int = 32_768     # total tokens the model accepts (prompt + reply)
+    max_output_tokens: int = 4_096   # tokens reserved for the reply
 
 AI_MODELS: List[ModelInfo] = [
-    ModelInfo("deepseek", "deepseek-chat",       "DeepSeek Chat",     False),
-    ModelInfo("deepseek", "deepseek-reasoner",   "DeepSeek Reasoner", True),
-    ModelInfo("gemini",   "gemini-2.5-pro-preview-03-25", "Gemini 2.5 Pro (Paid)", False),
-    ModelInfo("gemini",   "gemini-2.5-pro-exp-03-25",     "Gemini 2.5 Pro",        False),
-    ModelInfo("gemini",   "gemini-2.0-flash",             "Gemini 2.0 Flash",      False),
+    ModelInfo("deepseek", "deepseek-chat",       "DeepSeek Chat",     False, 65_536, 8_192),
+    ModelInfo("deepseek", "deepseek-reasoner",   "DeepSeek Reasoner", True,  65_536, 8_192),
+    ModelInfo("gemini",   "gemini-2.5-pro-preview-03-25", "Gemini 2.5 Pro (Paid)", False, 1_048_576, 65_536),
+    ModelInfo("gemini",   "gemini-2.5-pro-exp-03-25",     "Gemini 2.5 Pro",        False, 1_048_576, 65_536),
+    ModelInfo("gemini",   "gemini-2.0-flash",             "Gemini 2.0 Flash",      False, 1_048_576, 8_192),
+    ModelInfo("openai",   "gpt-4o",                       "GPT-4o",                False, 128_000, 16_384),
+    ModelInfo("openai",   "gpt-4o-mini",                  "GPT-4o mini",           False, 128_000, 16_384),
 ]
 
 # quick lookup helpers
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from .openai_compat import OpenAICompatibleProvider
+
+__all__ = ["OpenAI"]
+
+
+class OpenAI(OpenAICompatibleProvider):
+    """Adapter for OpenAI's chat-completions endpoint (also any local OpenAI-compatible server)."""
+
+    name: str = "openai"
+
+    default_endpoint = "https://api.openai.com/v1/chat/completions"
+    endpoint_env = "OPENAI_ENDPOINT"
+    api_key_env = "OPENAI_API_KEY"
+    backends_env = "OPENAI_BACKENDS"
+    default_model = "gpt-4o-mini"
+
+
+PROVIDER = OpenAI
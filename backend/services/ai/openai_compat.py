@@ -0,0 +1,314 @@
+# backend/services/ai/openai_compat.py
+"""
+Shared base for providers that speak the OpenAI chat-completions protocol
+(DeepSeek, OpenAI, Gemini's OpenAI endpoint, local llama.cpp/vLLM servers).
+
+Subclasses only declare their name, endpoint and API-key variable; payload
+building, SSE parsing, connection pooling, load balancing, timing and
+meta assembly live here so every adapter behaves (and is measured) the
+same way.
+
+Each adapter sends through an UpstreamPool (see balancer.py). With a
+single endpoint that pool has one backend; with <NAME>_BACKENDS set the
+request goes to the best backend and, when it answers 429/5xx or cannot
+be reached before any output was produced, is retried on another one.
+
+Meta timings, all in seconds from the moment the request is sent:
+    ttfb     first streamed token of any kind (thinking or text);
+             response headers for non-stream calls
+    ttft     first user-visible text token (stream only)
+    latency  end of the response
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import httpx
+from dotenv import load_dotenv
+
+from .balancer import UpstreamPool, Upstream, DEFAULT_STRATEGY, parse_backends, is_retryable_status, retry_after_seconds
+from .base import StreamEvent, MetaData, Message
+
+load_dotenv()
+
+try:  # HTTP/2 needs the optional 'h2' package
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+__all__ = ["SSEParser", "sse_payloads", "OpenAICompatibleProvider"]
+
+# Backends tried per request before the last error is surfaced
+MAX_ATTEMPTS = 3
+
+
+class SSEParser:
+    """
+    Incremental parser for `text/event-stream` bodies.
+
+    Feed it raw bytes as they arrive from the socket; it returns the `data`
+    payload of every event completed by that chunk. Framing happens on bytes:
+    everything up to the last blank-line separator is decoded in one call
+    (the separator is ASCII, so a multi-byte character is never split) and
+    the incomplete remainder is carried over. The common single-line
+    `data: ...` event is handled without a per-line loop. Comment lines
+    (heartbeats) and fields other than `data` are ignored. CRLF line endings
+    are normalised; bare CR line endings are not supported.
+    """
+
+    __slots__ = ("_tail",)
+
+    def __init__(self) -> None:
+        self._tail = b""
+
+    @staticmethod
+    def _parse_block(block: str) -> str | None:
+        data = [
+            line[6:] if line[5:6] == " " else line[5:]
+            for line in block.split("\n")
+            if line.startswith("data:")
+        ]
+        return "\n".join(data) if data else None
+
+    def feed(self, chunk: bytes) -> List[str]:
+        buf = self._tail + chunk if self._tail else chunk
+        if b"\r" in buf:
+            buf = buf.replace(b"\r\n", b"\n")
+        cut = buf.rfind(b"\n\n")
+        if cut < 0:
+            self._tail = buf
+            return []
+        self._tail = buf[cut + 2:]  # incomplete event, completed by a later chunk
+        events: List[str] = []
+        for block in buf[:cut].decode("utf-8").split("\n\n"):
+            if block.startswith("data: ") and "\n" not in block:
+                events.append(block[6:])  # fast path: one data line
+            elif block:
+                data = self._parse_block(block)
+                if data is not None:
+                    events.append(data)
+        return events
+
+    def flush(self) -> List[str]:
+        """Returns an event left unterminated when the stream closed."""
+        tail, self._tail = self._tail, b""
+        data = self._parse_block(tail.decode("utf-8", "replace").rstrip("\r\n")) if tail else None
+        return [data] if data is not None else []
+
+
+async def sse_payloads(resp: httpx.Response) -> AsyncIterator[str]:
+    """Yields the `data` payload of every event in a streaming response."""
+    parser = SSEParser()
+    async for chunk in resp.aiter_bytes():
+        for data in parser.feed(chunk):
+            yield data
+    for data in parser.flush():
+        yield data
+
+
+class OpenAICompatibleProvider:
+    """
+    Base adapter for OpenAI-style `/chat/completions` endpoints.
+
+    Subclasses set `name`, `default_endpoint`, `endpoint_env`, `api_key_env`,
+    `backends_env` and `default_model`. The endpoints and keys are read when
+    the adapter is created, so tests and benchmarks can point an adapter at
+    local servers, either one (`endpoint=`) or a pool (`backends=`).
+    """
+
+    name: str = ""
+    default_endpoint: str = ""
+    endpoint_env: str = ""
+    api_key_env: str = ""
+    backends_env: str = ""
+    default_model: str = ""
+    # Ask for token usage in the final stream chunk
+    stream_usage: bool = True
+
+    def __init__(
+        self,
+        endpoint: Optional[str] = None,
+        api_key: Optional[str] = None,
+        backends: Optional[List[Tuple[str, Optional[str]]]] = None,
+        strategy: str = DEFAULT_STRATEGY,
+    ) -> None:
+        self.endpoint = endpoint or os.getenv(self.endpoint_env or "", "") or self.default_endpoint
+        self.api_key = api_key if api_key is not None else os.getenv(self.api_key_env or "")
+        if backends is None:
+            spec = os.getenv(self.backends_env or "", "") if endpoint is None else ""
+            backends = parse_backends(spec) or [(self.endpoint, self.api_key)]
+        self.pool = UpstreamPool(backends, strategy)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ------------------------------------------------------------------
+    # Connection pooling
+    # ------------------------------------------------------------------
+
+    def client(self) -> httpx.AsyncClient:
+        """One pooled client per adapter (shared by all backends), recreated if the event loop changes."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                http2=_HTTP2,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ------------------------------------------------------------------
+    # Load balancing
+    # ------------------------------------------------------------------
+
+    @asynccontextmanager
+    async def _send(self, payload: dict, timeout: int) -> AsyncIterator[Tuple[Upstream, httpx.Response]]:
+        """
+        Opens a streaming POST on the best backend and yields it once the
+        response headers are in. Retryable failures (401/403, 429, 5xx,
+        connection errors) eject that backend and move on to another one, up to
+        MAX_ATTEMPTS; errors after the response was handed out are recorded
+        but never retried, since output may already have reached the caller.
+        """
+        tried: List[Upstream] = []
+        attempts = min(len(self.pool), MAX_ATTEMPTS)
+        while True:
+            upstream = self.pool.pick(exclude=tuple(tried))
+            tried.append(upstream)
+            started = self.pool.start(upstream)
+            handed_out = False
+            try:
+                async with self.client().stream(
+                    "POST", upstream.endpoint, json=payload, headers=upstream.headers(), timeout=timeout
+                ) as resp:
+                    if resp.is_error:
+                        await resp.aread()
+                        if is_retryable_status(resp.status_code):
+                            self.pool.failed(upstream, resp.status_code, retry_after_seconds(resp.headers))
+                            if len(tried) < attempts:
+                                continue
+                        resp.raise_for_status()
+                    self.pool.succeeded(upstream, started, resp.status_code)
+                    handed_out = True
+                    yield upstream, resp
+                    return
+            except httpx.TransportError:
+                self.pool.failed(upstream)
+                if handed_out or len(tried) >= attempts:
+                    raise
+            finally:
+                self.pool.release(upstream)
+
+    # ------------------------------------------------------------------
+    # Protocol hooks
+    # ------------------------------------------------------------------
+
+    def build_payload(
+        self, messages: List[Message], *, model: str, temperature: float, stream: bool
+    ) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": stream,
+        }
+        if stream and self.stream_usage:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def parse_delta(self, delta: Dict[str, Any]) -> List[StreamEvent]:
+        """Turns one streamed `choices[0].delta` into events (thinking first, then text)."""
+        events: List[StreamEvent] = []
+        reasoning = delta.get("reasoning_content")
+        if reasoning:
+            events.append({"thinking": reasoning})  # internal reasoning token
+        text = delta.get("content")
+        if text:
+            events.append({"text": text})  # user token
+        return events
+
+    # ------------------------------------------------------------------
+    # ChatProvider
+    # ------------------------------------------------------------------
+
+    async def chat(
+        self,
+        messages: list[Message],
+        *,
+        stream: bool = False,
+        model: Optional[str] = None,
+        temperature: float = 0.0,
+        timeout: int = 60,
+        **opts: Any,
+    ) -> Union[Tuple[str, MetaData], AsyncIterator[StreamEvent]]:
+        """Implements ChatProvider for any OpenAI-compatible endpoint."""
+        model = model or self.default_model
+        payload = self.build_payload(messages, model=model, temperature=temperature, stream=bool(stream))
+
+        if not stream:
+            return await self._complete(payload, timeout, model)
+        return self._stream(payload, timeout, model)
+
+    async def _complete(self, payload: dict, timeout: int, model: str) -> Tuple[str, MetaData]:
+        t0 = time.perf_counter()
+        async with self._send(payload, timeout) as (upstream, resp):
+            headers_t = time.perf_counter()
+            body = await resp.aread()
+        data = json.loads(body)
+
+        text = (data["choices"][0]["message"].get("content") or "").strip()
+        meta: MetaData = {
+            "usage": data.get("usage") or {},
+            "latency": time.perf_counter() - t0,
+            "ttfb": headers_t - t0,
+            "model": model,
+            "endpoint": upstream.endpoint,
+        }
+        return text, meta
+
+    async def _stream(self, payload: dict, timeout: int, model: str) -> AsyncIterator[StreamEvent]:
+        t0 = time.perf_counter()
+        first_token_t: float | None = None
+        first_text_t: float | None = None
+        usage: Dict[str, Any] | None = None
+        loads = json.loads
+
+        async with self._send(payload, timeout) as (upstream, resp):
+            async with aclosing(sse_payloads(resp)) as payloads:
+                async for data in payloads:
+                    if data == "[DONE]":
+                        break
+                    chunk = loads(data)
+                    choices = chunk.get("choices")
+                    if choices:
+                        for ev in self.parse_delta(choices[0].get("delta") or {}):
+                            now = time.perf_counter()
+                            if first_token_t is None:
+                                first_token_t = now
+                            if first_text_t is None and "text" in ev:
+                                first_text_t = now
+                            yield ev
+                    # capture usage if present
+                    if chunk.get("usage"):
+                        usage = chunk["usage"]
+
+        meta: MetaData = {
+            "usage": usage or {},
+            "latency": time.perf_counter() - t0,
+            "ttfb": (first_token_t - t0) if first_token_t else None,
+            "ttft": (first_text_t - t0) if first_text_t else None,
+            "model": model,
+            "endpoint": upstream.endpoint,
+        }
+        yield {"meta": meta}  # final metadata
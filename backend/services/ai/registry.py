@@ -14,9 +14,8 @@ Usage
 from __future__ import annotations
 
 import importlib
-import inspect  # Import inspect module
 from pathlib import Path
-from typing import Dict, Type # Import Type
+from typing import Dict, Optional, Type
 
 from .base import ChatProvider
 
@@ -24,31 +23,19 @@ _PROVIDERS: Dict[str, ChatProvider] = {}
 
 
 def _load_providers() -> None:
+    # A provider module names its adapter class in a module-level PROVIDER; every other module is a helper
     here = Path(__file__).parent
     for py in here.glob("*.py"):
-        if py.stem in {"__init__", "base", "registry"}:
+        if py.stem in {"__init__", "registry"}:
             continue
         try:
             module_name = f"{__name__[:-9]}.{py.stem}" # backend.services.ai.<name>
             mod = importlib.import_module(module_name)
 
-            found_provider_class = None
-            for name, obj in inspect.getmembers(mod):
-                # Check if it's a class defined in this module (not imported)
-                # and structurally looks like a ChatProvider (has name attr and chat method)
-                if inspect.isclass(obj) and \
-                   obj.__module__ == module_name and \
-                   hasattr(obj, 'name') and \
-                   hasattr(obj, 'chat') and \
-                   callable(getattr(obj, 'chat', None)):
-                   # We don't check 'obj is not ChatProvider' because ChatProvider itself won't be in the module
-                   found_provider_class = obj
-                   break # Assume one provider class per file
-
-            if found_provider_class:
-                ProviderClass: Type[ChatProvider] = found_provider_class # Type hint
+            ProviderClass: Optional[Type[ChatProvider]] = getattr(mod, "PROVIDER", None)
+            if ProviderClass is not None:
                 inst = ProviderClass()
-                if hasattr(inst, 'name') and inst.name: # Double check instance has name
+                if inst.name:
                     _PROVIDERS[inst.name] = inst
 
         except Exception as e:
@@ -58,7 +45,9 @@ def _load_providers() -> None:
     print(f"Registry contains: {list(_PROVIDERS.keys())}")
 
 
-_load_providers()
+def list_providers() -> Dict[str, ChatProvider]:
+    """All registered provider instances keyed by name."""
+    return dict(_PROVIDERS)
 
 
 def get_provider(model_name: str) -> ChatProvider:
@@ -76,3 +65,7 @@ def get_provider(model_name: str) -> ChatProvider:
         provider = _PROVIDERS["gemini"]
         return provider
     raise KeyError(f"No provider registered for model {model_name!r}")
+
+
+# Last, so helper modules that import get_provider from here load cleanly during discovery
+_load_providers()
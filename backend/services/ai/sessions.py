@@ -0,0 +1,345 @@
+# backend/services/ai/sessions.py
+"""
+Server-side conversation sessions.
+
+In session mode a client sends only the new message(s) plus a `session_id`;
+the history and system prompt live here. Sessions are kept in memory under
+a byte cap with LRU eviction. When GENESIS_SESSION_MOUNT names a readwrite
+mount (e.g. "userdata/"), every completed turn is also written to
+`<mount>/.sessions/<session_id>.json`, so evicted sessions are reloaded from
+disk on their next turn and survive restarts. Without a mount an evicted
+session is gone: using its id again answers 410 instead of silently starting
+over with an empty history (ids are remembered up to SESSION_EVICTED_MEMORY).
+
+Turns on the same session are serialised with the session's lock; different
+sessions run concurrently. A turn holds its session through hold(), which
+pins it from the moment it is opened, so it cannot be evicted while the turn
+waits for the lock. The in-memory map is only touched on the event loop;
+disk reads and writes run in worker threads.
+
+With several workers (a cross-process shared state backend, see
+services/shared_state.py) the shared state holds the authoritative copy of
+every session under `session:<id>`, with a version that each completed turn
+bumps; the in-memory map is a cache of it. A turn also takes a lease on
+`session-turn:<id>`, so turns on one session are serialised across workers
+too, and reloads the shared copy once it holds the lease when its cached
+version is stale. Shared copies expire SESSION_SHARED_TTL_SECONDS after
+their last turn (the disk copy, when enabled, remains).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from backend.services import file_operations
+from backend.services.shared_state import SharedState, get_shared_state
+from .base import Message
+
+# ---------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------
+
+SESSION_MAX_BYTES = int(os.getenv("GENESIS_SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_MAX_COUNT = int(os.getenv("GENESIS_SESSION_MAX_COUNT", "1000"))
+SESSION_MOUNT = os.getenv("GENESIS_SESSION_MOUNT") or None  # disk persistence off when unset
+SESSION_DIR = ".sessions"
+# How many evicted session ids are remembered to answer 410 rather than start over
+SESSION_EVICTED_MEMORY = 10 * SESSION_MAX_COUNT
+# Multi-worker only: lifetime of a session's shared copy, and of a turn's lease (the longest a turn may run)
+SESSION_SHARED_TTL_SECONDS = float(os.getenv("GENESIS_SESSION_SHARED_TTL", str(7 * 86400)))
+SESSION_TURN_LEASE_SECONDS = float(os.getenv("GENESIS_SESSION_TURN_LEASE", "600"))
+SESSION_TURN_POLL_SECONDS = 0.05
+
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+@dataclass
+class ChatSession:
+    session_id: str
+    system_prompt: Optional[str] = None
+    messages: List[Message] = field(default_factory=list)
+    updated: float = field(default_factory=time.time)
+    size: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+    pins: int = field(default=0, repr=False)  # turns holding or waiting for the lock
+    version: int = field(default=0, repr=False)  # of the shared copy this one reflects (multi-worker)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "system_prompt": self.system_prompt,
+            "messages": self.messages,
+            "updated": self.updated,
+        }
+
+
+def _session_size(session: ChatSession) -> int:
+    return len(session.system_prompt or "") + sum(len(m.get("content") or "") for m in session.messages)
+
+
+def validate_session_id(session_id: str) -> str:
+    if not _SESSION_ID_RE.match(session_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid session_id: use 1-64 letters, digits, '-' or '_'",
+        )
+    return session_id
+
+
+class SessionStore:
+    """LRU map of session id → ChatSession with a memory cap and optional disk backing."""
+
+    def __init__(
+        self,
+        max_bytes: int = SESSION_MAX_BYTES,
+        max_sessions: int = SESSION_MAX_COUNT,
+        mount: Optional[str] = SESSION_MOUNT,
+        state: Optional[SharedState] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.mount = mount
+        self._state = state  # resolved on first use, once the server has chosen the backend
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._bytes = 0
+        self._evicted: "OrderedDict[str, None]" = OrderedDict()
+
+    # --- Disk persistence ---
+
+    def _disk_path(self, session_id: str) -> Optional[str]:
+        if not self.mount:
+            return None
+        abs_path, mount_info = file_operations.resolve_path(self.mount, f"{SESSION_DIR}/{session_id}.json")
+        file_operations.check_permissions(mount_info, 'write')
+        return abs_path
+
+    def _load(self, session_id: str) -> Optional[ChatSession]:
+        path = self._disk_path(session_id)
+        if not path or not os.path.isfile(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return ChatSession(
+            session_id=session_id,
+            system_prompt=data.get("system_prompt"),
+            messages=data.get("messages", []),
+            updated=data.get("updated", time.time()),
+        )
+
+    def _save(self, session_id: str, data: Dict[str, Any]) -> None:
+        path = self._disk_path(session_id)
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _remove(self, session_id: str) -> bool:
+        path = self._disk_path(session_id)
+        if not path or not os.path.isfile(path):
+            return False
+        os.remove(path)
+        return True
+
+    # --- Shared copy (multi-worker) ---
+
+    @property
+    def shared(self) -> Optional[SharedState]:
+        """The shared state when other workers can see it, else None."""
+        if self._state is None:
+            self._state = get_shared_state()
+        return self._state if self._state.cross_process else None
+
+    def _load_shared(self, session_id: str) -> Optional[ChatSession]:
+        data = self.shared.get(f"session:{session_id}")
+        if data is None:
+            return None
+        return ChatSession(
+            session_id=session_id,
+            system_prompt=data.get("system_prompt"),
+            messages=data["messages"],
+            updated=data["updated"],
+            version=data["version"],
+        )
+
+    def _load_any(self, session_id: str) -> Optional[ChatSession]:
+        if self.shared is not None:
+            session = self._load_shared(session_id)
+            if session is not None:
+                return session
+        return self._load(session_id) if self.mount else None
+
+    async def _lease(self, session_id: str) -> str:
+        """Waits for the cross-worker turn lease of a session; returns its token for _release."""
+        token = uuid.uuid4().hex
+        key = f"session-turn:{session_id}"
+        while True:
+            owner = await asyncio.to_thread(self.shared.update, key, lambda current: current or token,
+                                            SESSION_TURN_LEASE_SECONDS)
+            if owner == token:
+                return token
+            await asyncio.sleep(SESSION_TURN_POLL_SECONDS)
+
+    def _release(self, session_id: str, token: str) -> None:
+        self.shared.update(f"session-turn:{session_id}", lambda current: None if current == token else current)
+
+    def _delete_shared(self, session_id: str) -> bool:
+        """Deletes the shared copy; True if there was one."""
+        found = False
+
+        def drop(current: Any) -> None:
+            nonlocal found
+            found = current is not None
+            return None
+
+        self.shared.update(f"session:{session_id}", drop)
+        return found
+
+    async def _refresh(self, session: ChatSession) -> None:
+        """Catches the cached session up with turns other workers committed, or with its deletion."""
+        latest = await asyncio.to_thread(self._load_any, session.session_id) or ChatSession(session.session_id)
+        if latest.version != session.version:
+            session.system_prompt = latest.system_prompt
+            session.messages = latest.messages
+            session.updated = latest.updated
+            session.version = latest.version
+            if self._sessions.get(session.session_id) is session:
+                self._account(session)
+
+    # --- Memory accounting ---
+
+    def _account(self, session: ChatSession) -> None:
+        new_size = _session_size(session)
+        self._bytes += new_size - session.size
+        session.size = new_size
+
+    def _evict(self, keep: str) -> None:
+        # Oldest first; sessions mid-turn are skipped so their history can't vanish under them
+        for session_id in list(self._sessions):
+            if self._bytes <= self.max_bytes and len(self._sessions) <= self.max_sessions:
+                break
+            session = self._sessions[session_id]
+            if session_id == keep or session.pins or session.lock.locked():
+                continue
+            del self._sessions[session_id]
+            self._bytes -= session.size
+            self._evicted[session_id] = None
+            while len(self._evicted) > SESSION_EVICTED_MEMORY:
+                self._evicted.popitem(last=False)
+
+    def _check_not_evicted(self, session_id: str) -> None:
+        if not self.mount and self.shared is None and session_id in self._evicted:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail=f"Session expired: {session_id} was evicted from memory and is not persisted; start a new session",
+            )
+
+    # --- Public API ---
+
+    async def open(self, session_id: str) -> ChatSession:
+        """Returns the session, loading it from disk or creating it if needed."""
+        validate_session_id(session_id)
+        session = self._sessions.get(session_id)
+        if session is None:
+            self._check_not_evicted(session_id)
+            loaded = await asyncio.to_thread(self._load_any, session_id) if self.mount or self.shared else None
+            session = loaded or ChatSession(session_id)
+            # Another turn may have loaded it while we were reading the file
+            session = self._sessions.setdefault(session_id, session)
+            self._account(session)
+        self._sessions.move_to_end(session_id)
+        self._evict(keep=session_id)
+        return session
+
+    @asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[ChatSession]:
+        """Opens the session and holds its lock for one turn, pinned in memory while it waits."""
+        session = await self.open(session_id)
+        session.pins += 1  # no await since open() returned, so it is still in the map
+        try:
+            async with session.lock:
+                if self.shared is None:
+                    yield session
+                    return
+                token = await self._lease(session_id)
+                try:
+                    await self._refresh(session)
+                    yield session
+                finally:
+                    await asyncio.to_thread(self._release, session_id, token)
+        finally:
+            session.pins -= 1
+
+    async def append(self, session: ChatSession, messages: List[Message]) -> None:
+        """Records a completed turn and persists it when disk backing is enabled."""
+        if self.shared is not None:
+            data = await asyncio.to_thread(self._append_shared, session, messages)
+            session.messages = data["messages"]
+            session.version = data["version"]
+        else:
+            session.messages.extend(messages)
+        session.updated = time.time()
+        if session.session_id in self._sessions:
+            self._account(session)
+            self._evict(keep=session.session_id)
+        if self.mount:
+            await asyncio.to_thread(self._save, session.session_id, session.to_dict())
+
+    def _append_shared(self, session: ChatSession, messages: List[Message]) -> Dict[str, Any]:
+        def merge(current: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            # A session not shared yet (new, or loaded from disk) is seeded from this copy
+            base = current or {**session.to_dict(), "version": session.version}
+            return {
+                "system_prompt": session.system_prompt,
+                "messages": base["messages"] + messages,
+                "updated": time.time(),
+                "version": base["version"] + 1,
+            }
+        return self.shared.update(f"session:{session.session_id}", merge, SESSION_SHARED_TTL_SECONDS)
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        validate_session_id(session_id)
+        session = self._sessions.get(session_id)
+        if self.shared is not None:
+            loaded = await asyncio.to_thread(self._load_any, session_id)
+            # A cached copy that was shared but no longer is was deleted by another worker
+            return loaded or (session if session is not None and not session.version else None)
+        if session is not None:
+            return session
+        self._check_not_evicted(session_id)
+        return await asyncio.to_thread(self._load_any, session_id)
+
+    async def delete(self, session_id: str) -> bool:
+        validate_session_id(session_id)
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.size
+        evicted = self._evicted.pop(session_id, False) is None
+        shared = await asyncio.to_thread(self._delete_shared, session_id) if self.shared is not None else False
+        on_disk = await asyncio.to_thread(self._remove, session_id)
+        return session is not None or evicted or shared or on_disk
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "max_sessions": self.max_sessions,
+            "persist_mount": self.mount,
+        }
+
+
+session_store = SessionStore()
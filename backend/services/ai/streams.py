@@ -0,0 +1,445 @@
+# backend/services/ai/streams.py
+"""
+Resumable chat streams.
+
+A streamed turn that carries a client-chosen `stream_id` is generated by a
+producer task owned by this store, not by the socket or HTTP response that
+started it. Every event the producer sees is appended to the stream's log
+with a sequence number (0, 1, 2, ...) and fanned out to whoever follows
+the stream:
+
+    {"request_id": 3, "text": "hel", "seq": 41}
+
+When the client goes away mid-generation the producer keeps running for
+STREAM_GRACE_SECONDS. A client that reconnects within that window resumes
+with the last seq it received and gets only what it missed, then the live
+tail:
+
+    WS:   {"request_id": 0, "stream_id": "b6f1...", "last_seq": 41}
+    HTTP: GET /frontend/ai/streams/b6f1...?last_seq=41   (or Last-Event-ID)
+
+A replayed backlog is coalesced: consecutive text (or thinking) events are
+sent as one event carrying the seq of the last one merged. If nobody
+resumes within the grace period the upstream request is cancelled and the
+log ends with an error event.
+
+Finished logs are kept for STREAM_LOG_TTL_SECONDS so a client that missed
+only the final `meta` can still fetch it. Memory is bounded twice: a log
+over STREAM_LOG_MAX_STREAM_BYTES drops its oldest events (resuming from
+before them fails with 410), and when all logs together exceed
+STREAM_LOG_MAX_BYTES the oldest finished ones are evicted early.
+
+With several workers (a cross-process shared state backend, see
+services/shared_state.py) a resume or cancel may land on a worker other than
+the producer's. The producer's worker then claims the id under
+`stream:<id>` and mirrors the log into the `stream-events:<id>` channel; the
+other worker follows that channel (RemoteStreamLog) and marks the stream as
+followed under `stream-followers:<id>`, which holds off the producer's grace
+timer, and a remote cancel is a `stream-cancel:<id>` key the producer polls.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from backend.services.shared_state import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------
+
+STREAM_GRACE_SECONDS = float(os.getenv("GENESIS_STREAM_GRACE_SECONDS", "30"))
+STREAM_LOG_TTL_SECONDS = float(os.getenv("GENESIS_STREAM_LOG_TTL", "300"))
+STREAM_LOG_MAX_BYTES = int(os.getenv("GENESIS_STREAM_LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+STREAM_LOG_MAX_STREAM_BYTES = int(os.getenv("GENESIS_STREAM_LOG_MAX_STREAM_BYTES", str(8 * 1024 * 1024)))
+
+# Multi-worker only: how often the producer checks for remote followers and cancels (and renews its claim),
+# how often a remote follower polls, and how long those marks live without renewal
+STREAM_SHARED_CHECK_SECONDS = 0.5
+STREAM_SHARED_POLL_SECONDS = 0.05
+STREAM_SHARED_MARK_TTL_SECONDS = 5.0
+_SHARED_POLL_BATCH = 1000
+
+# Rough per-event bookkeeping cost (tuple, dict, small ints) on top of the text itself
+_EVENT_OVERHEAD_BYTES = 100
+_STREAM_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_COALESCED_KEYS = ("text", "thinking")
+
+Event = Dict[str, Any]
+
+
+def validate_stream_id(stream_id: str) -> str:
+    if not _STREAM_ID_RE.match(stream_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid stream_id: use 1-64 letters, digits, '-' or '_'",
+        )
+    return stream_id
+
+
+def _event_size(event: Event) -> int:
+    return _EVENT_OVERHEAD_BYTES + sum(len(v) for v in event.values() if isinstance(v, str))
+
+
+def coalesce(events: List[Tuple[int, Event]]) -> List[Tuple[int, Event]]:
+    """Merges runs of single-key text / thinking events, keeping the last seq of each run."""
+    merged: List[Tuple[int, Event]] = []
+    for seq, event in events:
+        key = next(iter(event)) if len(event) == 1 else None
+        if key in _COALESCED_KEYS and merged and set(merged[-1][1]) == {key}:
+            merged[-1] = (seq, {key: merged[-1][1][key] + event[key]})
+        else:
+            merged.append((seq, event))
+    return merged
+
+
+# ---------------------------------------------------------------------
+# Per-stream log
+# ---------------------------------------------------------------------
+
+class StreamLog:
+    """Sequenced events of one turn, readable from any seq still retained."""
+
+    def __init__(self, stream_id: str, store: "StreamStore") -> None:
+        self.stream_id = stream_id
+        self._store = store
+        self._events: List[Tuple[int, Event]] = []
+        self.first_seq = 0  # seq of _events[0]
+        self.next_seq = 0
+        self.size = 0
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.mirror_task: Optional[asyncio.Task] = None
+        self.remote_followers = False
+        self._wake = asyncio.Event()
+        self._grace: Optional[asyncio.TimerHandle] = None
+
+    # --- Writing (producer side) ---
+
+    def append(self, event: Event) -> int:
+        seq = self.next_seq
+        self._events.append((seq, event))
+        self.next_seq += 1
+        added = _event_size(event)
+        self.size += added
+        self._store._bytes += added
+        while self.size > STREAM_LOG_MAX_STREAM_BYTES and len(self._events) > 1:
+            _, dropped = self._events.pop(0)
+            removed = _event_size(dropped)
+            self.size -= removed
+            self._store._bytes -= removed
+            self.first_seq += 1
+        self._notify()
+        return seq
+
+    def _notify(self) -> None:
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    async def produce(self, events: AsyncIterator[Event]) -> None:
+        """Drains `events` into the log; errors must already arrive as {"error"} events."""
+        try:
+            async with aclosing(events):
+                async for event in events:
+                    self.append({k: v for k, v in event.items() if k != "request_id"})
+        except asyncio.CancelledError:
+            self.append({"error": "Generation cancelled"})
+            raise
+        except Exception as exc:
+            self.append({"error": str(exc)})
+        finally:
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._cancel_grace()
+            self._notify()
+
+    # --- Reading (consumer side) ---
+
+    def since(self, last_seq: int) -> List[Tuple[int, Event]]:
+        if last_seq + 1 < self.first_seq:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail=f"Stream {self.stream_id} no longer holds events before seq {self.first_seq}",
+            )
+        return self._events[max(0, last_seq + 1 - self.first_seq):]
+
+    async def follow(self, last_seq: int = -1) -> AsyncIterator[Tuple[int, Event]]:
+        """
+        Yields (seq, event) after `last_seq` until the turn ends: first the
+        retained backlog (coalesced), then live events as they are appended.
+        While at least one follower is attached the producer is never cancelled.
+        """
+        backlog = coalesce(self.since(last_seq))
+        self.subscribers += 1
+        self._cancel_grace()
+        try:
+            for item in backlog:
+                yield item
+            if backlog:
+                last_seq = backlog[-1][0]
+            while True:
+                for item in self.since(last_seq):
+                    last_seq = item[0]
+                    yield item
+                if last_seq + 1 < self.next_seq:
+                    continue  # appended while we were yielding
+                if self.done:
+                    return
+                await self._wake.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self._schedule_grace()
+
+    # --- Grace period ---
+
+    def _schedule_grace(self) -> None:
+        self._cancel_grace()
+        self._grace = asyncio.get_running_loop().call_later(STREAM_GRACE_SECONDS, self._grace_expired)
+
+    def _cancel_grace(self) -> None:
+        if self._grace is not None:
+            self._grace.cancel()
+            self._grace = None
+
+    def _grace_expired(self) -> None:
+        self._grace = None
+        if self.remote_followers and not self.done:
+            self._schedule_grace()
+            return
+        if self.subscribers == 0 and not self.done and self.task is not None:
+            logger.info("Stream %s: no client resumed within %ss, cancelling", self.stream_id, STREAM_GRACE_SECONDS)
+            self.task.cancel()
+
+    # --- Mirroring to other workers ---
+
+    async def mirror(self, state: SharedState, token: str) -> None:
+        """Publishes the log to `stream-events:<id>` until the turn ends (multi-worker only)."""
+        published = 0  # next seq to publish
+        checked = 0.0
+        while True:
+            done = self.done
+            if published < self.next_seq:
+                batch = [{"seq": seq, "event": event} for seq, event in self._events[max(0, published - self.first_seq):]]
+                await asyncio.to_thread(_publish_all, state, f"stream-events:{self.stream_id}", batch)
+                published = batch[-1]["seq"] + 1
+            if done:
+                await asyncio.to_thread(self._finish_shared, state, token)
+                return
+            if time.monotonic() - checked >= STREAM_SHARED_CHECK_SECONDS:
+                checked = time.monotonic()
+                cancelled, self.remote_followers = await asyncio.to_thread(self._check_shared, state, token)
+                if cancelled and self.task is not None:
+                    logger.info("Stream %s: cancelled from another worker", self.stream_id)
+                    self.task.cancel()
+            wake = self._wake
+            if published == self.next_seq and not self.done:
+                try:
+                    await asyncio.wait_for(wake.wait(), STREAM_SHARED_CHECK_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _check_shared(self, state: SharedState, token: str) -> Tuple[bool, bool]:
+        state.set(f"stream:{self.stream_id}", {"owner": token, "done": False}, STREAM_SHARED_MARK_TTL_SECONDS)
+        cancelled = state.get(f"stream-cancel:{self.stream_id}") is not None
+        return cancelled, state.get(f"stream-followers:{self.stream_id}") is not None
+
+    def _finish_shared(self, state: SharedState, token: str) -> None:
+        state.publish(f"stream-events:{self.stream_id}", {"end": True})
+        state.set(f"stream:{self.stream_id}", {"owner": token, "done": True}, STREAM_LOG_TTL_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "stream_id": self.stream_id,
+            "first_seq": self.first_seq,
+            "next_seq": self.next_seq,
+            "bytes": self.size,
+            "done": self.done,
+            "subscribers": self.subscribers,
+        }
+
+
+def _publish_all(state: SharedState, channel: str, messages: List[Dict[str, Any]]) -> None:
+    for message in messages:
+        state.publish(channel, message)
+
+
+class RemoteStreamLog(StreamLog):
+    """
+    A stream produced by another worker, read from its `stream-events:<id>`
+    channel. Following it renews `stream-followers:<id>`, so the producer
+    keeps generating while a client is attached here.
+    """
+
+    def __init__(self, stream_id: str, state: SharedState) -> None:
+        super().__init__(stream_id, store=None)
+        self._state = state
+        self._after_id = 0  # last channel event id read
+
+    def fetch(self) -> None:
+        """Reads newly published events (blocking; call in a thread)."""
+        channel = f"stream-events:{self.stream_id}"
+        while True:
+            batch = self._state.poll(channel, self._after_id, limit=_SHARED_POLL_BATCH)
+            for event_id, message in batch:
+                self._after_id = event_id
+                if message.get("end"):
+                    self.done = True
+                    continue
+                seq = message["seq"]
+                if seq != self.next_seq:  # the producer dropped events before publishing them
+                    self._events.clear()
+                    self.first_seq = seq
+                self._events.append((seq, message["event"]))
+                self.next_seq = seq + 1
+            if len(batch) < _SHARED_POLL_BATCH:
+                break
+        if not self.done and self._state.get(f"stream:{self.stream_id}") is None:
+            # The claim is renewed every STREAM_SHARED_CHECK_SECONDS while the producer lives
+            self._events.append((self.next_seq, {"error": "The worker generating this stream went away"}))
+            self.next_seq += 1
+            self.done = True
+
+    async def follow(self, last_seq: int = -1) -> AsyncIterator[Tuple[int, Event]]:
+        backlog = coalesce(self.since(last_seq))
+        for item in backlog:
+            yield item
+        if backlog:
+            last_seq = backlog[-1][0]
+        marked = 0.0
+        while True:
+            for item in self.since(last_seq):
+                last_seq = item[0]
+                yield item
+            if self.done:
+                return
+            if time.monotonic() - marked >= STREAM_SHARED_MARK_TTL_SECONDS / 3:
+                marked = time.monotonic()
+                await asyncio.to_thread(self._state.set, f"stream-followers:{self.stream_id}", True,
+                                        STREAM_SHARED_MARK_TTL_SECONDS)
+            await asyncio.sleep(STREAM_SHARED_POLL_SECONDS)
+            await asyncio.to_thread(self.fetch)
+
+
+# ---------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------
+
+class StreamStore:
+    """stream_id → StreamLog, with a TTL for finished logs and a global byte cap."""
+
+    def __init__(self, state: Optional[SharedState] = None) -> None:
+        self._streams: Dict[str, StreamLog] = {}
+        self._bytes = 0
+        self._state = state  # resolved on first use, once the server has chosen the backend
+
+    @property
+    def shared(self) -> Optional[SharedState]:
+        """The shared state when other workers can see it, else None."""
+        if self._state is None:
+            self._state = get_shared_state()
+        return self._state if self._state.cross_process else None
+
+    def _drop(self, stream_id: str) -> None:
+        log = self._streams.pop(stream_id)
+        self._bytes -= log.size
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        finished = sorted(
+            (log for log in self._streams.values() if log.done),
+            key=lambda log: log.finished_at,
+        )
+        for log in finished:
+            if now - log.finished_at > STREAM_LOG_TTL_SECONDS or self._bytes > STREAM_LOG_MAX_BYTES:
+                self._drop(log.stream_id)
+        if self._bytes > STREAM_LOG_MAX_BYTES:
+            logger.warning("Stream logs hold %d bytes across %d live streams (cap %d)",
+                           self._bytes, len(self._streams), STREAM_LOG_MAX_BYTES)
+
+    async def start(self, stream_id: str, events: AsyncIterator[Event]) -> StreamLog:
+        """Registers a new stream and starts draining `events` into it in the background."""
+        validate_stream_id(stream_id)
+        self._purge()
+        token = uuid.uuid4().hex
+        in_use = stream_id in self._streams
+        if not in_use and self.shared is not None:
+            claim = await asyncio.to_thread(
+                self.shared.update, f"stream:{stream_id}",
+                lambda current: current or {"owner": token, "done": False}, STREAM_SHARED_MARK_TTL_SECONDS,
+            )
+            in_use = claim["owner"] != token or stream_id in self._streams
+        if in_use:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail=f"Stream id already in use: {stream_id}")
+        log = StreamLog(stream_id, self)
+        self._streams[stream_id] = log
+        log.task = asyncio.create_task(log.produce(events))
+        if self.shared is not None:
+            log.mirror_task = asyncio.create_task(log.mirror(self.shared, token))
+        # Nobody may ever attach (e.g. the socket dropped right away); the grace timer still applies
+        log._schedule_grace()
+        return log
+
+    def get(self, stream_id: str) -> StreamLog:
+        """The log of a stream produced by this worker."""
+        self._purge()
+        log = self._streams.get(stream_id)
+        if log is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"Unknown or expired stream: {stream_id}")
+        return log
+
+    async def find(self, stream_id: str) -> StreamLog:
+        """The log of a stream produced by this worker or, with several workers, by another one."""
+        validate_stream_id(stream_id)
+        if stream_id in self._streams or self.shared is None:
+            return self.get(stream_id)
+        if await asyncio.to_thread(self.shared.get, f"stream:{stream_id}") is None:
+            return self.get(stream_id)  # 404
+        log = RemoteStreamLog(stream_id, self.shared)
+        await asyncio.to_thread(log.fetch)
+        return log
+
+    async def cancel(self, stream_id: str) -> None:
+        """Stops generation of a running stream; the log keeps what was produced."""
+        log = await self.find(stream_id)
+        if isinstance(log, RemoteStreamLog):
+            if not log.done:
+                await asyncio.to_thread(self.shared.set, f"stream-cancel:{stream_id}", True,
+                                        STREAM_SHARED_MARK_TTL_SECONDS)
+            return
+        if log.task is not None and not log.task.done():
+            log.task.cancel()
+            await asyncio.gather(log.task, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Cancels all producers (used on shutdown and by tests)."""
+        tasks = [log.task for log in self._streams.values() if log.task is not None and not log.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Mirrors finish on their own once their producer is done
+        await asyncio.gather(*(log.mirror_task for log in self._streams.values() if log.mirror_task is not None),
+                             return_exceptions=True)
+        self._streams.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"streams": len(self._streams), "bytes": self._bytes}
+
+
+stream_store = StreamStore()
@@ -0,0 +1,517 @@
+'''Streaming directory export and archive import for mounts.
+
+Export
+------
+`export_directory` walks a directory and yields a zip, tar or tar.gz archive
+as it is being built: zipfile/tarfile run in a producer thread and write into
+a bounded queue that the response drains, so memory stays at a few chunks
+and no temporary file is written. Zip entries for already-compressed types
+(images, media, archives, office documents) are STORED instead of deflated
+when `skip_compressed` is set, which saves CPU without costing size. tar.gz
+compresses the whole stream, so skipping does not apply there.
+
+Files whose real path leaves the mount (symlinks) are skipped.
+
+Import
+------
+`import_archive` extracts an uploaded archive into a directory on a
+readwrite mount. tar and tar.gz are extracted straight from the request
+stream; zip needs random access to its central directory, so it is spooled
+first (in memory up to IMPORT_SPOOL_MEMORY_BYTES, then to a temporary file).
+
+Every member path is checked with file_operations.resolve_path, so names
+with "..", absolute paths or anything resolving outside the mount are
+rejected. Only regular files and directories are extracted (no links or
+devices). Quotas on the upload size, total extracted bytes and file count
+are enforced on the bytes actually written, not on what headers claim.
+Members are extracted into a hidden staging directory next to the
+destination (for a mount's root, in the directory holding the mount), so it
+is on the same filesystem but never shows up in the destination, and moved
+into place only after the whole archive succeeded; any failure before that
+removes the staging directory and leaves the destination untouched. A new
+destination directory is the staging directory renamed, so it appears
+complete or not at all. Into an existing directory the files are moved one
+by one; if a move fails part-way the import answers 500 naming the files
+already committed. Existing files are only replaced with `overwrite`.
+'''
+
+import asyncio
+import logging
+import os
+import queue
+import shutil
+import stat
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from backend.services import file_operations
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+
+ARCHIVE_FORMATS = {
+    "zip": ("application/zip", ".zip"),
+    "tar": ("application/x-tar", ".tar"),
+    "tar.gz": ("application/gzip", ".tar.gz"),
+}
+
+STREAM_CHUNK_BYTES = 64 * 1024
+EXPORT_QUEUE_CHUNKS = 16  # bound on buffered output between producer and response
+
+IMPORT_MAX_UPLOAD_BYTES = int(os.getenv("GENESIS_IMPORT_MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+IMPORT_MAX_BYTES = int(os.getenv("GENESIS_IMPORT_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+IMPORT_MAX_FILES = int(os.getenv("GENESIS_IMPORT_MAX_FILES", "10000"))
+IMPORT_SPOOL_MEMORY_BYTES = 16 * 1024 * 1024
+IMPORT_COMMIT_REPORT_FILES = 20  # committed files named in the error of a partly failed import
+
+# Extensions whose content is already compressed; deflating them again wastes CPU
+COMPRESSED_EXTENSIONS = frozenset("""
+    .7z .aac .apk .avif .br .bz2 .docx .epub .flac .gif .gz .heic .jar .jpeg .jpg .lz4 .m4a .m4v .mkv
+    .mov .mp3 .mp4 .odp .ods .odt .ogg .opus .pdf .png .pptx .rar .tgz .webm .webp .whl .woff .woff2
+    .xlsx .xz .zip .zst
+""".split())
+
+
+def _too_large(what: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Archive exceeds the {what} quota")
+
+
+# ---------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------
+
+class _Cancelled(Exception):
+    pass
+
+
+class _QueueWriter:
+    """Write-only, unseekable file object that hands fixed-size chunks to a bounded queue."""
+
+    def __init__(self, out: "queue.Queue", cancelled: threading.Event) -> None:
+        self._out = out
+        self._cancelled = cancelled
+        self._buf = bytearray()
+        self._written = 0
+
+    def write(self, data) -> int:
+        self._buf += data
+        self._written += len(data)
+        if len(self._buf) >= STREAM_CHUNK_BYTES:
+            self._put(bytes(self._buf))
+            self._buf.clear()
+        return len(data)
+
+    def tell(self) -> int:  # zipfile records offsets even on unseekable streams
+        return self._written
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self._buf:
+            self._put(bytes(self._buf))
+            self._buf.clear()
+
+    def _put(self, chunk: bytes) -> None:
+        while True:
+            if self._cancelled.is_set():
+                raise _Cancelled()
+            try:
+                self._out.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+def _walk(abs_dir: str, mount_real: str) -> Iterator[Tuple[str, str, bool]]:
+    """Yields (abs_path, archive_name, is_dir) in sorted order, skipping anything outside the mount."""
+    for root, dirs, files in os.walk(abs_dir):
+        dirs.sort()
+        rel_root = os.path.relpath(root, abs_dir).replace("\\", "/")
+        prefix = "" if rel_root == "." else rel_root + "/"
+        if prefix:
+            yield root, prefix, True
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            real = os.path.realpath(path)
+            if os.path.commonpath([real, mount_real]) != mount_real or not os.path.isfile(real):
+                logger.warning("Export skipped %s (outside the mount or not a regular file)", path)
+                continue
+            yield path, prefix + name, False
+
+
+def _write_zip(fileobj, entries, skip_compressed: bool) -> None:
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for path, name, is_dir in entries:
+            info = zipfile.ZipInfo.from_file(path, name)
+            if is_dir:
+                zf.writestr(info, b"")
+                continue
+            stored = skip_compressed and os.path.splitext(name)[1].lower() in COMPRESSED_EXTENSIONS
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, zf.open(info, "w") as dst:
+                shutil.copyfileobj(src, dst, STREAM_CHUNK_BYTES)
+
+
+def _write_tar(fileobj, entries, gzip: bool) -> None:
+    with tarfile.open(fileobj=fileobj, mode="w|gz" if gzip else "w|", format=tarfile.PAX_FORMAT) as tf:
+        for path, name, _ in entries:
+            tf.add(path, arcname=name.rstrip("/"), recursive=False)
+
+
+def export_directory(mount_name: str, user_path: str, fmt: str, skip_compressed: bool = True) -> Tuple[AsyncIterator[bytes], str]:
+    """
+    Validates the directory and returns (async byte stream, download file name).
+
+    Validation errors are raised here, before any byte is sent. Closing the
+    stream early (client disconnect) stops the producer thread.
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown archive format: {fmt}. Valid formats are: {list(ARCHIVE_FORMATS)}")
+    abs_dir, mount_info = file_operations.resolve_path(mount_name, user_path)
+    file_operations.check_permissions(mount_info, 'read')
+    if not os.path.exists(abs_dir):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Directory not found: {user_path}")
+    if not os.path.isdir(abs_dir):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Path is not a directory: {user_path}")
+
+    mount_real = os.path.realpath(mount_info['path'])
+    base = os.path.basename(os.path.normpath(abs_dir)) or mount_name.strip("/") or "export"
+    filename = base + ARCHIVE_FORMATS[fmt][1]
+
+    async def stream() -> AsyncIterator[bytes]:
+        chunks: "queue.Queue" = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+        cancelled = threading.Event()
+        done = object()
+        started = time.perf_counter()
+
+        def produce():
+            writer = _QueueWriter(chunks, cancelled)
+            try:
+                entries = _walk(abs_dir, mount_real)
+                if fmt == "zip":
+                    _write_zip(writer, entries, skip_compressed)
+                else:
+                    _write_tar(writer, entries, gzip=fmt == "tar.gz")
+                writer.close()
+                writer._put(done)
+            except _Cancelled:
+                pass
+            except Exception as exc:
+                logger.error("Export of %s%s failed: %s", mount_name, user_path, exc)
+                try:
+                    writer._put(exc)
+                except _Cancelled:
+                    pass
+
+        def take():
+            # Polls so that a cancelled response never leaves a pool thread blocked on the queue
+            while True:
+                try:
+                    return chunks.get(timeout=0.1)
+                except queue.Empty:
+                    if cancelled.is_set() or not producer.is_alive() and chunks.empty():
+                        return done
+
+        producer = threading.Thread(target=produce, name="archive-export", daemon=True)
+        producer.start()
+        sent = 0
+        try:
+            while True:
+                item = await asyncio.to_thread(take)
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item  # headers are already out; the client sees a truncated archive
+                sent += len(item)
+                yield item
+            logger.info("Exported %s%s as %s: %d bytes in %.2fs", mount_name, user_path, fmt, sent,
+                        time.perf_counter() - started)
+        finally:
+            cancelled.set()
+            await asyncio.to_thread(producer.join)
+
+    return stream(), filename
+
+
+# ---------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------
+
+class _QueueReader:
+    """Read-only, unseekable file object fed with request-body chunks from the event loop."""
+
+    def __init__(self, chunks: "queue.Queue") -> None:
+        self._chunks = chunks
+        self._buf = b""
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buf) < size):
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buf += chunk
+        if size < 0:
+            data, self._buf = self._buf, b""
+        else:
+            data, self._buf = self._buf[:size], self._buf[size:]
+        return data
+
+
+class _Extractor:
+    """Writes members into a staging directory under quota and containment checks."""
+
+    def __init__(self, mount_name: str, dest_user: str, dest_abs: str, overwrite: bool) -> None:
+        self.mount_name = mount_name
+        self.dest_user = dest_user.rstrip("/")
+        self.dest_abs = dest_abs
+        self.overwrite = overwrite
+        self.new_dest = not os.path.exists(dest_abs)
+        parent = os.path.dirname(dest_abs)
+        self.created_parents = _missing_dirs(parent)
+        os.makedirs(parent, exist_ok=True)
+        self.staging = tempfile.mkdtemp(prefix=f".{os.path.basename(dest_abs)}.import-", dir=parent)
+        self.files: Dict[str, None] = {}  # staged files in archive order; a repeated member replaces the earlier one
+        self.directories = 0
+        self.bytes = 0
+
+    def _target(self, name: str) -> str:
+        """Relative path of a member after containment checks (raises 400/403); "." for the root."""
+        name = name.replace("\\", "/")
+        if name.startswith("/") or (len(name) > 1 and name[1] == ":"):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Absolute path in archive: {name}")
+        user_path = f"{self.dest_user}/{name}" if self.dest_user else name
+        abs_path, _ = file_operations.resolve_path(self.mount_name, user_path)
+        rel = os.path.relpath(abs_path, self.dest_abs)
+        if rel == ".." or rel.startswith(".." + os.sep):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Archive member escapes the destination: {name}")
+        return rel
+
+    def directory(self, name: str) -> None:
+        rel = self._target(name)
+        if rel != ".":  # "./" entries of `tar -C dir .` archives
+            os.makedirs(os.path.join(self.staging, rel), exist_ok=True)
+            self.directories += 1
+
+    def file(self, name: str, src) -> None:
+        rel = self._target(name)
+        if rel == ".":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid file name in archive: {name!r}")
+        if rel not in self.files and len(self.files) >= IMPORT_MAX_FILES:
+            raise _too_large(f"{IMPORT_MAX_FILES}-file")
+        final = os.path.join(self.dest_abs, rel)
+        if os.path.isdir(final) or (os.path.exists(final) and not self.overwrite):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail=f"File already exists: {rel.replace(os.sep, '/')} (use overwrite=true)")
+        staged = os.path.join(self.staging, rel)
+        os.makedirs(os.path.dirname(staged), exist_ok=True)
+        with open(staged, "wb") as out:
+            while True:
+                data = src.read(STREAM_CHUNK_BYTES)
+                if not data:
+                    break
+                self.bytes += len(data)
+                if self.bytes > IMPORT_MAX_BYTES:
+                    raise _too_large(f"{IMPORT_MAX_BYTES}-byte extracted size")
+                out.write(data)
+        self.files[rel] = None
+
+    def commit(self) -> None:
+        """Moves the staged tree into place: one rename for a new destination, file by file otherwise."""
+        if self.new_dest:
+            try:
+                os.rename(self.staging, self.dest_abs)
+            except OSError as exc:
+                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                    detail=f"Failed to move the import into place: {exc}")
+            return
+
+        committed: List[str] = []
+        try:
+            for root, _, _ in os.walk(self.staging):
+                rel_root = os.path.relpath(root, self.staging)
+                os.makedirs(os.path.normpath(os.path.join(self.dest_abs, rel_root)), exist_ok=True)
+            for rel in self.files:
+                os.replace(os.path.join(self.staging, rel), os.path.join(self.dest_abs, rel))
+                committed.append(rel.replace(os.sep, "/"))
+        except OSError as exc:
+            logger.error("Import into %s stopped after committing %d of %d files: %s; committed: %s",
+                         self.dest_abs, len(committed), len(self.files), exc, committed)
+            shown = ", ".join(committed[:IMPORT_COMMIT_REPORT_FILES]) or "none"
+            if len(committed) > IMPORT_COMMIT_REPORT_FILES:
+                shown += f" and {len(committed) - IMPORT_COMMIT_REPORT_FILES} more"
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                detail=f"Import stopped after committing {len(committed)} of {len(self.files)} "
+                                       f"files ({shown}): {exc}")
+        finally:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def rollback(self) -> None:
+        self.cleanup()
+        for path in self.created_parents:
+            try:
+                os.rmdir(path)
+            except OSError:
+                break
+
+
+def _missing_dirs(path: str) -> List[str]:
+    """The directories makedirs(path) would create, deepest first."""
+    missing = []
+    while not os.path.exists(path):
+        missing.append(path)
+        path = os.path.dirname(path)
+    return missing
+
+
+def _extract_tar(fileobj, extractor: _Extractor) -> None:
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tf:
+        for member in tf:
+            if member.isdir():
+                extractor.directory(member.name)
+            elif member.isfile():
+                extractor.file(member.name, tf.extractfile(member))
+            else:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f"Unsupported archive member (links and devices are not extracted): {member.name}")
+
+
+def _extract_zip(fileobj, extractor: _Extractor) -> None:
+    with zipfile.ZipFile(fileobj) as zf:
+        for info in zf.infolist():
+            mode = info.external_attr >> 16
+            if stat.S_ISLNK(mode):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f"Unsupported archive member (links are not extracted): {info.filename}")
+            if info.is_dir():
+                extractor.directory(info.filename)
+            else:
+                with zf.open(info) as src:
+                    extractor.file(info.filename, src)
+
+
+async def import_archive(
+    mount_name: str,
+    user_path: str,
+    chunks: AsyncIterator[bytes],
+    fmt: str = "auto",
+    overwrite: bool = False,
+) -> Dict[str, Any]:
+    """Extracts a streamed archive upload into a directory of a readwrite mount."""
+    if fmt != "auto" and fmt not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown archive format: {fmt}. Valid formats are: {['auto', *ARCHIVE_FORMATS]}")
+    if not user_path.endswith('/'):
+        user_path += '/'
+    dest_abs, mount_info = file_operations.resolve_path(mount_name, user_path)
+    file_operations.check_permissions(mount_info, 'write')
+    if os.path.exists(dest_abs) and not os.path.isdir(dest_abs):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Path is not a directory: {user_path}")
+
+    stream = chunks.__aiter__()
+    first = b""
+    async for chunk in stream:  # the first bytes decide zip vs tar when fmt is "auto"
+        first += chunk
+        if len(first) >= 4:
+            break
+    is_zip = fmt == "zip" or (fmt == "auto" and first[:4] == b"PK\x03\x04")
+    extractor = await asyncio.to_thread(_Extractor, mount_name, user_path.strip("/"), dest_abs.rstrip("/"), overwrite)
+    received = len(first)
+    started = time.perf_counter()
+
+    try:
+        if is_zip:
+            spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MEMORY_BYTES)
+            try:
+                spool.write(first)
+                async for chunk in stream:
+                    received += len(chunk)
+                    if received > IMPORT_MAX_UPLOAD_BYTES:
+                        raise _too_large(f"{IMPORT_MAX_UPLOAD_BYTES}-byte upload")
+                    await asyncio.to_thread(spool.write, chunk)
+                spool.seek(0)
+                await asyncio.to_thread(_extract_zip, spool, extractor)
+            finally:
+                spool.close()
+        else:
+            body: "queue.Queue" = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+            stopped = threading.Event()
+
+            def extract():
+                try:
+                    _extract_tar(_QueueReader(body), extractor)
+                finally:
+                    stopped.set()
+
+            worker = asyncio.create_task(asyncio.to_thread(extract))
+
+            def feed(chunk: Optional[bytes]) -> bool:
+                """Blocks until the worker takes the chunk; False once the worker has stopped."""
+                while not stopped.is_set():
+                    try:
+                        body.put(chunk, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
+
+            try:
+                if first:
+                    await asyncio.to_thread(feed, first)
+                async for chunk in stream:
+                    received += len(chunk)
+                    if received > IMPORT_MAX_UPLOAD_BYTES:
+                        raise _too_large(f"{IMPORT_MAX_UPLOAD_BYTES}-byte upload")
+                    if not await asyncio.to_thread(feed, chunk):
+                        break
+                await asyncio.to_thread(feed, None)
+                await worker
+            finally:
+                if not worker.done():
+                    # Unblock a worker waiting for data, then let it fail on the truncated stream
+                    while not stopped.is_set():
+                        try:
+                            body.put_nowait(None)
+                            break
+                        except queue.Full:
+                            try:
+                                body.get_nowait()
+                            except queue.Empty:
+                                pass
+                    try:
+                        await worker
+                    except Exception:
+                        pass
+        await asyncio.to_thread(extractor.commit)
+    except HTTPException:
+        await asyncio.to_thread(extractor.rollback)
+        raise
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError) as exc:
+        await asyncio.to_thread(extractor.rollback)
+        logger.warning("Import into %s%s failed: %s", mount_name, user_path, exc)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid or unreadable archive: {exc}")
+    except BaseException:
+        await asyncio.to_thread(extractor.rollback)
+        raise
+
+    logger.info("Imported %d files (%d bytes) into %s%s in %.2fs", len(extractor.files), extractor.bytes,
+                mount_name, user_path, time.perf_counter() - started)
+    return {
+        "message": f"Archive extracted into '{user_path}'.",
+        "files": len(extractor.files),
+        "directories": extractor.directories,
+        "bytes": extractor.bytes,
+    }
@@ -1,12 +1,22 @@
 '''Service layer for handling file system operations with validation.'''
 
+import asyncio
+import codecs
+import hashlib
 import os
 import shutil
 import logging
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from fastapi import HTTPException, status
-from typing import List, Dict, Literal, Tuple, Optional
+from typing import Any, BinaryIO, Iterator, List, Dict, Literal, Sequence, Tuple, Optional
+
+from backend.services import line_index, snapshots, text_patch
+from backend.services.shared_state import get_shared_state
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # --- Configuration: Mount Points ---
@@ -87,11 +97,8 @@ def resolve_path(mount_name: str, user_path: str) -> Tuple[str, Dict[str, str]]:
     abs_path = os.path.abspath(os.path.join(mount_info['path'], user_path)).replace('\\\\', '/')
     
     # Debug logging
-    logger.debug(f"Path resolution debug:")
-    logger.debug(f"  mount_name: {mount_name}")
-    logger.debug(f"  user_path: {user_path}")
-    logger.debug(f"  mount_info['path']: {mount_info['path']}")
-    logger.debug(f"  resolved abs_path: {abs_path}")
+    logger.debug("Path resolution: mount=%s user_path=%s mount_path=%s abs_path=%s",
+                 mount_name, user_path, mount_info['path'], abs_path)
     
     # Security check: ensure the resolved path starts with the mount path
     # Use os.path.normpath to handle potential differences like trailing slashes robustly
@@ -100,11 +107,9 @@ def resolve_path(mount_name: str, user_path: str) -> Tuple[str, Dict[str, str]]:
     if not norm_abs_path.startswith(norm_mount_path):
     # Original check (keeping for reference, but normpath is better):
     # if not abs_path.startswith(mount_info['path']):
-        logger.error(f"Path resolution failed security check:")
-        logger.error(f"  abs_path (norm): {norm_abs_path}")
-        logger.error(f"  mount_path (norm): {norm_mount_path}")
-        logger.error(f"  (Original abs_path: {abs_path})") # Log original for context
-        logger.error(f"  (Original mount_path: {mount_info['path']})") # Log original for context
+        logger.error("Path resolution failed security check: abs_path (norm)=%s mount_path (norm)=%s "
+                     "(original abs_path=%s, original mount_path=%s)",
+                     norm_abs_path, norm_mount_path, abs_path, mount_info['path'])
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid path: Access denied"
@@ -121,10 +126,11 @@ def check_permissions(mount_info: Dict[str, str], required_access: Literal['read
         HTTPException: If access is denied.
     """
     if required_access == 'write' and mount_info['access'] != 'readwrite':
-        logger.warning(f"Write access denied for path within readonly mount '{mount_info['name']}'")
+        logger.warning("Write access denied for path within readonly mount '%s'", mount_info['name'])
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Write access denied for mount '{mount_info['name']}'")
     # Read access is implicitly granted for both 'readonly' and 'readwrite'
-    logger.debug(f"Access check passed: Required '{required_access}', Mount '{mount_info['name']}' has '{mount_info['access']}'")
+    logger.debug("Access check passed: Required '%s', Mount '%s' has '%s'",
+                 required_access, mount_info['name'], mount_info['access'])
 
 # --- Service Functions ---
 
@@ -146,10 +152,10 @@ def perform_read_file(mount_name: str, user_path: str) -> str:
     try:
         with open(abs_path, 'r', encoding='utf-8') as f:
             content = f.read()
-        logger.info(f"Successfully read file: {abs_path}")
+        logger.info("Successfully read file: %s", abs_path)
         return content
     except Exception as e:
-        logger.error(f"Error reading file {abs_path} (user path: {user_path}): {e}")
+        logger.error("Error reading file %s (user path: %s): %s", abs_path, user_path, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to read file: {e}")
 
 def perform_write_file(mount_name: str, user_path: str, content: str) -> Dict[str, str]:
@@ -167,23 +173,28 @@ def perform_write_file(mount_name: str, user_path: str, content: str) -> Dict[st
                  raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot create parent directory across mount points.")
              check_permissions(parent_mount_info, 'write')
              os.makedirs(parent_dir, exist_ok=True)
-             logger.info(f"Created parent directory: {parent_dir}")
+             logger.info("Created parent directory: %s", parent_dir)
          except HTTPException as http_exc:
              raise http_exc # Propagate permission/validation errors
          except Exception as e:
-            logger.error(f"Error creating parent directory {parent_dir} for {abs_path}: {e}")
+            logger.error("Error creating parent directory %s for %s: %s", parent_dir, abs_path, e)
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create parent directory: {e}")
     elif not os.path.isdir(parent_dir):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid path: Parent is not a directory for {user_path}")
 
     try:
-        logger.info(f"Attempting to open file for writing: {abs_path}") # Log the path exactly as passed to open()
-        with open(abs_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        logger.info(f"Successfully wrote file: {abs_path}")
-        return {"message": f"File '{user_path}' written successfully."}
+        logger.info("Attempting to open file for writing: %s", abs_path) # Log the path exactly as passed to open()
+        data = _encode_text(content)
+        with _write_lock(abs_path):
+            _snapshot_before(mount_info, abs_path)
+            st = _atomic_write(abs_path, data)
+            etag = _remember_etag(abs_path, st, content_etag(data))
+            _snapshot_after(mount_info, abs_path, 'write', data, etag, st)
+        _remember_text(abs_path, etag, content)
+        logger.info("Successfully wrote file: %s", abs_path)
+        return {"message": f"File '{user_path}' written successfully.", "etag": etag}
     except Exception as e:
-        logger.error(f"Error writing file {abs_path} (user path: {user_path}): {e}")
+        logger.error("Error writing file %s (user path: %s): %s", abs_path, user_path, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to write file: {e}")
 
 def perform_delete_file(mount_name: str, user_path: str) -> Dict[str, str]:
@@ -197,11 +208,14 @@ def perform_delete_file(mount_name: str, user_path: str) -> Dict[str, str]:
          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Path is not a file: {user_path}")
 
     try:
-        os.remove(abs_path)
-        logger.info(f"Successfully deleted file: {abs_path}")
+        with _write_lock(abs_path):
+            _snapshot_before(mount_info, abs_path)
+            os.remove(abs_path)
+            _snapshot_after(mount_info, abs_path, 'delete')
+        logger.info("Successfully deleted file: %s", abs_path)
         return {"message": f"File '{user_path}' deleted successfully."}
     except Exception as e:
-        logger.error(f"Error deleting file {abs_path} (user path: {user_path}): {e}")
+        logger.error("Error deleting file %s (user path: %s): %s", abs_path, user_path, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to delete file: {e}")
 
 def perform_create_directory(mount_name: str, user_path: str) -> Dict[str, str]:
@@ -218,10 +232,10 @@ def perform_create_directory(mount_name: str, user_path: str) -> Dict[str, str]:
 
     try:
         os.makedirs(abs_path, exist_ok=True) # exist_ok=True makes it idempotent
-        logger.info(f"Successfully ensured directory exists: {abs_path}")
+        logger.info("Successfully ensured directory exists: %s", abs_path)
         return {"message": f"Directory '{user_path}' created/exists."}
     except Exception as e:
-        logger.error(f"Error creating directory {abs_path} (user path: {user_path}): {e}")
+        logger.error("Error creating directory %s (user path: %s): %s", abs_path, user_path, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create directory: {e}")
 
 def perform_list_directory(mount_name: str, user_path: str) -> List[Dict[str, str]]:
@@ -249,10 +263,10 @@ def perform_list_directory(mount_name: str, user_path: str) -> List[Dict[str, st
                 "path": item_user_path, # Return the user-resolvable path
                 "isDirectory": is_dir # Changed from "type": item_type
             })
-        logger.info(f"Successfully listed directory: {abs_path}")
+        logger.info("Successfully listed directory: %s", abs_path)
         return items
     except Exception as e:
-        logger.error(f"Error listing directory {abs_path} (user path: {user_path}): {e}")
+        logger.error("Error listing directory %s (user path: %s): %s", abs_path, user_path, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to list directory: {e}")
 
 def perform_delete_directory(mount_name: str, user_path: str) -> Dict[str, str]:
@@ -272,17 +286,432 @@ def perform_delete_directory(mount_name: str, user_path: str) -> Dict[str, str]:
     try:
         # Attempt to delete - os.rmdir fails if not empty
         os.rmdir(abs_path)
-        logger.info(f"Successfully deleted empty directory: {abs_path}")
+        logger.info("Successfully deleted empty directory: %s", abs_path)
         return {"message": f"Directory '{user_path}' deleted successfully."}
     except OSError as e:
          if "Directory not empty" in str(e) or (hasattr(e, 'errno') and e.errno == 39): # Check specific error
-              logger.warning(f"Attempt to delete non-empty directory {abs_path} (user path: {user_path})")
+              logger.warning("Attempt to delete non-empty directory %s (user path: %s)", abs_path, user_path)
               raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Directory not empty. Cannot delete non-empty directories.")
          else:
-              logger.error(f"OS error deleting directory {abs_path} (user path: {user_path}): {e}")
+              logger.error("OS error deleting directory %s (user path: %s): %s", abs_path, user_path, e)
               raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to delete directory: {e}")
     except Exception as e:
-        logger.error(f"Error deleting directory {abs_path} (user path: {user_path}): {e}")
+        logger.error("Error deleting directory %s (user path: %s): %s", abs_path, user_path, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to delete directory: {e}")
 
+def perform_stat(mount_name: str, user_path: str) -> Dict[str, Any]:
+    """Returns type, size and modification time of a file or directory."""
+    abs_path, mount_info = resolve_path(mount_name, user_path)
+    check_permissions(mount_info, 'read')
+
+    try:
+        st = os.stat(abs_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Path not found: {user_path}")
+    except Exception as e:
+        logger.error("Error stating %s (user path: %s): %s", abs_path, user_path, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to stat path: {e}")
+    rel = abs_path[len(mount_info['path']):] if abs_path.startswith(mount_info['path']) else ''
+    return {
+        "name": os.path.basename(abs_path.rstrip('/')),
+        "path": mount_info['name'] + rel,
+        "isDirectory": os.path.isdir(abs_path),
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+    }
+
+def open_file_for_streaming(mount_name: str, user_path: str) -> Tuple[BinaryIO, int]:
+    """Opens a readable file in binary mode for chunked reads; returns the file and its size."""
+    abs_path = resolve_readable_file(mount_name, user_path)
+    try:
+        f = open(abs_path, 'rb')
+    except Exception as e:
+        logger.error("Error opening file %s (user path: %s): %s", abs_path, user_path, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to read file: {e}")
+    return f, os.fstat(f.fileno()).st_size
+
+# --- Line-Oriented Reads (see line_index.py) ---
+
+FOLLOW_POLL_SECONDS = 0.25
+FOLLOW_MAX_WAIT_SECONDS = 30.0
+
+def resolve_readable_file(mount_name: str, user_path: str) -> str:
+    """Resolves a path that must be an existing file on a readable mount."""
+    abs_path, mount_info = resolve_path(mount_name, user_path)
+    check_permissions(mount_info, 'read')
+    if not os.path.exists(abs_path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {user_path}")
+    if not os.path.isfile(abs_path):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Path is not a file: {user_path}")
+    return abs_path
+
+def _indexed_read(abs_path: str, user_path: str, read, *args) -> Dict[str, Any]:
+    try:
+        return read(abs_path, *args)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {user_path}")
+    except Exception as e:
+        logger.error("Error reading lines from %s (user path: %s): %s", abs_path, user_path, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to read lines: {e}")
+
+def perform_read_lines(mount_name: str, user_path: str, start: int, count: int) -> Dict[str, Any]:
+    """Reads lines start..start+count-1 (0-based) of a file without loading the whole file."""
+    abs_path = resolve_readable_file(mount_name, user_path)
+    result = _indexed_read(abs_path, user_path, line_index.read_lines, start, count)
+    logger.debug("Read lines %d..%d of %s", result['start'], result['next_line'], abs_path)
+    return result
+
+def perform_tail_lines(mount_name: str, user_path: str, count: int) -> Dict[str, Any]:
+    """Reads the last `count` lines of a file."""
+    abs_path = resolve_readable_file(mount_name, user_path)
+    return _indexed_read(abs_path, user_path, line_index.tail_lines, count)
+
+async def perform_follow_lines(mount_name: str, user_path: str, from_line: int, wait: float) -> Dict[str, Any]:
+    """
+    Long-polls for complete lines appended at or after `from_line`.
+
+    Returns as soon as there is at least one new line, or with an empty
+    `lines` list after `wait` seconds. If the file shrank below `from_line`
+    (truncated or rotated) the result has `reset: True` and starts again from
+    line 0. Clients pass the returned `next_line` as the next `from_line`.
+    """
+    abs_path = resolve_readable_file(mount_name, user_path)
+    deadline = time.monotonic() + max(0.0, min(wait, FOLLOW_MAX_WAIT_SECONDS))
+    while True:
+        result = await asyncio.to_thread(
+            _indexed_read, abs_path, user_path, line_index.read_lines, from_line, line_index.MAX_LINES_PER_READ, True,
+        )
+        result['reset'] = False
+        if result['lines']:
+            return result
+        if result['complete_lines'] < from_line:
+            result = await asyncio.to_thread(
+                _indexed_read, abs_path, user_path, line_index.read_lines, 0, line_index.MAX_LINES_PER_READ, True,
+            )
+            result['reset'] = True
+            return result
+        if time.monotonic() >= deadline:
+            return result
+        await asyncio.sleep(FOLLOW_POLL_SECONDS)
+
+# --- Versions and Patch Writes (see text_patch.py) ---
+
+# An ETag is a hash of the file's bytes. Hashes are cached per path and
+# revalidated by (inode, mtime, size), so repeated reads and patches of an
+# unchanged file do not rehash it. Writes through this module hold a per-path
+# lock, and writes, patches and restores replace the file atomically, so
+# readers never see half a write. The decoded text of recently patched files is kept as well, so an
+# autosave sending one keystroke does not reread and decode the whole file.
+
+ETAG_CACHE_SIZE = 1024
+PATCH_TEXT_CACHE_BYTES = int(os.getenv("GENESIS_PATCH_TEXT_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+_etag_cache: "OrderedDict[str, Tuple[int, int, int, str]]" = OrderedDict()
+_text_cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()  # abs_path -> (etag, text)
+_text_cache_bytes = 0
+_etag_lock = threading.Lock()
+_write_locks: "weakref.WeakValueDictionary[str, _PathLock]" = weakref.WeakValueDictionary()
+
+def content_etag(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:32]
+
+def normalize_etag(value: str) -> str:
+    """Accepts an ETag as sent in headers ('W/"..."', '"..."') or bare."""
+    value = value.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    return value.strip('"')
+
+def _remember_etag(abs_path: str, st: os.stat_result, etag: str) -> str:
+    with _etag_lock:
+        _etag_cache[abs_path] = (st.st_ino, st.st_mtime_ns, st.st_size, etag)
+        _etag_cache.move_to_end(abs_path)
+        while len(_etag_cache) > ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+def _cached_etag(abs_path: str, st: os.stat_result) -> Optional[str]:
+    with _etag_lock:
+        entry = _etag_cache.get(abs_path)
+    if entry is not None and entry[:3] == (st.st_ino, st.st_mtime_ns, st.st_size):
+        return entry[3]
+    return None
+
+def _remember_text(abs_path: str, etag: str, text: Optional[str]) -> None:
+    """Caches (or, with text=None, drops) the decoded text of the version `etag`."""
+    global _text_cache_bytes
+    with _etag_lock:
+        old = _text_cache.pop(abs_path, None)
+        if old is not None:
+            _text_cache_bytes -= len(old[1])
+        if text is None or len(text) > PATCH_TEXT_CACHE_BYTES:
+            return
+        _text_cache[abs_path] = (etag, text)
+        _text_cache_bytes += len(text)
+        while _text_cache_bytes > PATCH_TEXT_CACHE_BYTES:
+            _, (_, evicted) = _text_cache.popitem(last=False)
+            _text_cache_bytes -= len(evicted)
+
+def _cached_text(abs_path: str, etag: str) -> Optional[str]:
+    with _etag_lock:
+        entry = _text_cache.get(abs_path)
+        if entry is None or entry[0] != etag:
+            return None
+        _text_cache.move_to_end(abs_path)
+        return entry[1]
+
+class _PathLock:
+    """
+    A per-path write lock. Held only by reference, so paths nobody is writing
+    drop out of _write_locks. With several workers it also takes the shared
+    state's lock on the path, so writes from other workers wait too.
+    """
+
+    __slots__ = ("_path", "_lock", "_shared", "__weakref__")
+
+    def __init__(self, abs_path: str) -> None:
+        self._path = abs_path
+        self._lock = threading.Lock()
+        self._shared = None
+
+    def __enter__(self) -> "_PathLock":
+        self._lock.acquire()
+        state = get_shared_state()
+        if state.cross_process:
+            try:
+                shared = state.lock(f"write:{self._path}")
+                shared.__enter__()
+            except BaseException:
+                self._lock.release()
+                raise
+            self._shared = shared
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        shared, self._shared = self._shared, None
+        try:
+            if shared is not None:
+                shared.__exit__(None, None, None)
+        finally:
+            self._lock.release()
+
+def _write_lock(abs_path: str) -> _PathLock:
+    with _etag_lock:
+        lock = _write_locks.get(abs_path)
+        if lock is None:
+            lock = _write_locks[abs_path] = _PathLock(abs_path)
+        return lock
+
+class TextDecoder:
+    """
+    Incremental bytes -> str exactly as perform_read_file's text mode would
+    (UTF-8, universal newlines), for files read in chunks. A chunk ending in
+    '\r' holds it back until the next chunk shows whether '\n' follows.
+    """
+
+    def __init__(self, user_path: str) -> None:
+        self.user_path = user_path
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._pending_cr = ''
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        try:
+            text = self._pending_cr + self._decoder.decode(data, final)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"File is not UTF-8 text: {self.user_path}")
+        self._pending_cr = ''
+        if not final and text.endswith('\r'):
+            text, self._pending_cr = text[:-1], '\r'
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+def _decode_text(data: bytes, user_path: str) -> str:
+    """bytes -> str exactly as perform_read_file's text mode would (UTF-8, universal newlines)."""
+    return TextDecoder(user_path).decode(data, final=True)
+
+def _encode_text(text: str) -> bytes:
+    """str -> bytes exactly as perform_write_file's text mode would (platform line endings)."""
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    return text.encode('utf-8')
+
+# Read once at import: os.umask can only be queried by setting it, which races with other threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _atomic_write(abs_path: str, data: bytes) -> os.stat_result:
+    """Writes to a temporary file next to the target and renames it over the target."""
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(abs_path)}.", suffix=".tmp", dir=os.path.dirname(abs_path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if os.path.exists(abs_path):
+            shutil.copymode(abs_path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_UMASK)  # what open() would have created, not mkstemp's 0600
+        os.replace(tmp_path, abs_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return os.stat(abs_path)
+
+def perform_read_file_versioned(mount_name: str, user_path: str) -> Tuple[str, str]:
+    """Reads a file like perform_read_file and also returns its ETag."""
+    abs_path = resolve_readable_file(mount_name, user_path)
+    try:
+        with _write_lock(abs_path):
+            with open(abs_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                data = f.read()
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {user_path}")
+    etag = _cached_etag(abs_path, st) or _remember_etag(abs_path, st, content_etag(data))
+    text = _decode_text(data, user_path)
+    _remember_text(abs_path, etag, text)  # the editor's first patch starts from this version
+    return text, etag
+
+def perform_patch_file(
+    mount_name: str,
+    user_path: str,
+    base_etag: str,
+    edits: Optional[Sequence[Tuple[int, int, str]]] = None,
+    diff: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Applies `edits` or a unified `diff` to the version of the file named by
+    `base_etag` and atomically replaces the file with the result.
+
+    Raises 409 (with the current ETag in the ETag header) when the file has
+    changed since that version; the client should reload and redo its edit.
+    """
+    if (edits is None) == (diff is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide exactly one of 'edits' or 'diff'")
+    abs_path, mount_info = resolve_path(mount_name, user_path)
+    check_permissions(mount_info, 'write')
+
+    with _write_lock(abs_path):
+        try:
+            st = os.stat(abs_path)
+            etag = _cached_etag(abs_path, st)
+            text = None if etag is None else _cached_text(abs_path, etag)
+            if text is None:
+                with open(abs_path, 'rb') as f:
+                    st = os.fstat(f.fileno())
+                    data = f.read()
+                etag = _cached_etag(abs_path, st) or _remember_etag(abs_path, st, content_etag(data))
+        except (FileNotFoundError, IsADirectoryError):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {user_path}")
+        if etag != normalize_etag(base_etag):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"File '{user_path}' has changed since version {normalize_etag(base_etag)}; reload it and reapply the edit",
+                headers={"ETag": f'"{etag}"'},
+            )
+
+        if text is None:
+            text = _decode_text(data, user_path)
+        if edits is not None:
+            text = text_patch.apply_edits(text, edits)
+        else:
+            text = text_patch.apply_unified_diff(text, diff)
+        new_data = _encode_text(text)
+        _snapshot_before(mount_info, abs_path)
+        try:
+            st = _atomic_write(abs_path, new_data)
+        except Exception as e:
+            logger.error("Error patching file %s (user path: %s): %s", abs_path, user_path, e)
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to write file: {e}")
+        new_etag = _remember_etag(abs_path, st, content_etag(new_data))
+        _remember_text(abs_path, new_etag, text)
+        _snapshot_after(mount_info, abs_path, 'patch', new_data, new_etag, st)
+
+    logger.info("Patched file %s (%d bytes)", abs_path, len(new_data))
+    return {"message": f"File '{user_path}' patched successfully.", "etag": new_etag, "size": len(new_data)}
+
+# --- Snapshots (see snapshots.py) ---
+
+# Writes, patches and deletes on snapshotted mounts record a version of the
+# file while holding its write lock. A failure to record is logged and does
+# not fail the write itself.
+
+def _snapshot_key(mount_info: Dict[str, str], abs_path: str) -> str:
+    return mount_info['name'] + os.path.relpath(abs_path, mount_info['path']).replace(os.sep, '/')
+
+def _snapshot_before(mount_info: Dict[str, str], abs_path: str) -> None:
+    """Captures the file as it is on disk if it was changed outside this module (or never recorded)."""
+    if not snapshots.enabled(mount_info['name']):
+        return
+    try:
+        with open(abs_path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            key = _snapshot_key(mount_info, abs_path)
+            if snapshots.needs_capture(key, st):
+                data = f.read()
+                snapshots.record(key, 'external', data, content_etag(data), st)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error("Failed to snapshot %s before a change: %s", abs_path, e)
+
+def _snapshot_after(
+    mount_info: Dict[str, str],
+    abs_path: str,
+    op: str,
+    data: Optional[bytes] = None,
+    etag: Optional[str] = None,
+    st: Optional[os.stat_result] = None,
+) -> Optional[int]:
+    if not snapshots.enabled(mount_info['name']):
+        return None
+    try:
+        return snapshots.record(_snapshot_key(mount_info, abs_path), op, data, etag, st)
+    except Exception as e:
+        logger.error("Failed to snapshot %s after %s: %s", abs_path, op, e)
+        return None
+
+def _snapshot_target(mount_name: str, user_path: str, access: Literal['read', 'write']) -> Tuple[str, Dict[str, str], str]:
+    abs_path, mount_info = resolve_path(mount_name, user_path)
+    check_permissions(mount_info, access)
+    if not snapshots.enabled(mount_info['name']):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Snapshots are not enabled for mount: {mount_info['name']}")
+    return abs_path, mount_info, _snapshot_key(mount_info, abs_path)
+
+def perform_list_versions(mount_name: str, user_path: str) -> List[Dict[str, Any]]:
+    """Recorded versions of a file (also of a deleted one), oldest first."""
+    _, _, key = _snapshot_target(mount_name, user_path, 'read')
+    return snapshots.list_versions(key)
+
+def open_version_for_streaming(mount_name: str, user_path: str, version: int) -> Tuple[Iterator[bytes], int]:
+    """Returns an iterator over the bytes of an old version and its size."""
+    _, _, key = _snapshot_target(mount_name, user_path, 'read')
+    return snapshots.open_version(key, version)
+
+def perform_restore_version(mount_name: str, user_path: str, version: int) -> Dict[str, Any]:
+    """Replaces the file with an old version (recreating it if deleted); the restore is itself a new version."""
+    abs_path, mount_info, key = _snapshot_target(mount_name, user_path, 'write')
+    data = snapshots.read_version(key, version)
+    if os.path.isdir(abs_path):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Path is a directory: {user_path}")
+    try:
+        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+        with _write_lock(abs_path):
+            _snapshot_before(mount_info, abs_path)
+            st = _atomic_write(abs_path, data)
+            etag = _remember_etag(abs_path, st, content_etag(data))
+            _remember_text(abs_path, etag, None)
+            new_version = _snapshot_after(mount_info, abs_path, 'restore', data, etag, st)
+    except Exception as e:
+        logger.error("Error restoring %s to version %d: %s", abs_path, version, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to restore file: {e}")
+    logger.info("Restored %s to version %d", abs_path, version)
+    return {"message": f"File '{user_path}' restored to version {version}.", "etag": etag, "version": new_version}
+
+def perform_snapshot_gc() -> Dict[str, int]:
+    """Applies the retention policy and deletes unreferenced snapshot objects."""
+    return snapshots.gc()
+
 # --- End of Service --- 
\ No newline at end of file
@@ -0,0 +1,82 @@
+'''File-system operations multiplexed over one WebSocket (/frontend/fs/ws).
+
+Every request frame names an operation and carries a client-chosen
+request_id, exactly like the chat socket:
+
+    {"request_id": 7, "op": "list",  "mount": "userdata/", "path": "notes/"}
+    {"request_id": 8, "op": "read",  "mount": "userdata/", "path": "notes/a.md"}
+    {"request_id": 9, "op": "write", "mount": "userdata/", "path": "b.md", "content": "..."}
+
+    ops: list, read, write, delete, mkdir, stat
+
+Each request ends with exactly one frame holding either "result" (whatever
+the matching HTTP route returns) or "error" plus the HTTP-equivalent
+"status". Reads return text decoded like HTTP /read (UTF-8, line endings
+normalised to "\n", 415 for anything else). Files larger than
+WS_READ_CHUNK_BYTES are streamed first as {"request_id", "chunk": text}
+frames, split on UTF-8 character boundaries, and finished by
+{"request_id", "result": {"size", "chunks"}}; clients concatenate the chunks.
+
+The blocking calls into file_operations run on the default thread pool via
+asyncio.to_thread, so slow disks never stall the socket and independent
+requests complete out of order. Frames are JSON, or tagged MessagePack when
+negotiated (see ws_codec.py).
+'''
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Literal, Optional
+
+from pydantic import BaseModel
+
+from backend.services import file_operations
+
+# Reads above this size are streamed as chunk frames of this size
+WS_READ_CHUNK_BYTES = int(os.getenv("GENESIS_FS_WS_CHUNK_BYTES", str(256 * 1024)))
+# Requests a single socket may have in flight before it stops reading new ones
+WS_MAX_IN_FLIGHT = int(os.getenv("GENESIS_FS_WS_MAX_IN_FLIGHT", "64"))
+
+Emit = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class FsRequest(BaseModel):
+    request_id: int
+    op: Literal["list", "read", "write", "delete", "mkdir", "stat"]
+    mount: str
+    path: str = ""
+    content: Optional[str] = None  # write only
+
+
+async def _stream_read(req: FsRequest, emit: Emit) -> Any:
+    f, size = await asyncio.to_thread(file_operations.open_file_for_streaming, req.mount, req.path)
+    try:
+        decoder = file_operations.TextDecoder(req.path)
+        if size <= WS_READ_CHUNK_BYTES:
+            data = await asyncio.to_thread(f.read)
+            return decoder.decode(data, final=True)
+        chunks = 0
+        while True:
+            data = await asyncio.to_thread(f.read, WS_READ_CHUNK_BYTES)
+            text = decoder.decode(data, final=not data)
+            if text:
+                await emit({"chunk": text})
+                chunks += 1
+            if not data:
+                return {"size": size, "chunks": chunks}
+    finally:
+        f.close()
+
+
+async def execute(req: FsRequest, emit: Emit) -> Any:
+    """Runs one operation, emitting chunk frames for large reads, and returns its result."""
+    if req.op == "read":
+        return await _stream_read(req, emit)
+    if req.op == "write":
+        return await asyncio.to_thread(file_operations.perform_write_file, req.mount, req.path, req.content or "")
+    call = {
+        "list": file_operations.perform_list_directory,
+        "delete": file_operations.perform_delete_file,
+        "mkdir": file_operations.perform_create_directory,
+        "stat": file_operations.perform_stat,
+    }[req.op]
+    return await asyncio.to_thread(call, req.mount, req.path)
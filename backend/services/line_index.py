@@ -0,0 +1,208 @@
+'''Sparse line-offset index for random access into large text files.
+
+Reading line N of a multi-GB log should not mean decoding everything before
+it. The index records, for every BLOCK_SIZE-byte boundary of the file, how
+many newlines precede it. That is one integer per 64 KiB (about 1.3 MB of
+index for a 10 GB file), built with C-speed `bytes.count` over an mmap of
+the file. Seeking to a line bisects the boundaries and scans at most one
+block.
+
+Indexes are built lazily on first access and cached per path, validated
+against (inode, mtime, size). When a file has only grown (same inode, the
+last indexed bytes unchanged) the index is extended from its last complete
+block instead of rebuilt, so tailing an actively written log stays cheap.
+Anything else (truncation, replacement, in-place edits) triggers a rebuild.
+
+Files are mapped per call and never kept open, so they can still be
+rotated, replaced or deleted while indexed (Windows refuses that for mapped
+files).
+'''
+
+import mmap
+import os
+import threading
+import weakref
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+BLOCK_SIZE = 64 * 1024
+SCAN_CHUNK = 64 * BLOCK_SIZE  # bytes copied out of the mapping per count pass
+TAIL_CHECK_BYTES = 4096  # bytes compared before extending a grown file
+MAX_CACHED_INDEXES = 32
+
+MAX_LINES_PER_READ = 5000
+MAX_READ_BYTES = 4 * 1024 * 1024
+MAX_LINE_BYTES = 1024 * 1024
+
+
+@dataclass
+class LineIndex:
+    ino: int
+    mtime_ns: int
+    size: int
+    newlines: int = 0
+    ends_with_newline: bool = False
+    tail_crc: int = 0
+    # block_lines[i] = newlines in [0, i * BLOCK_SIZE), for every boundary <= size
+    block_lines: array = field(default_factory=lambda: array("Q", [0]))
+
+    @property
+    def total_lines(self) -> int:
+        return self.newlines + (1 if self.size and not self.ends_with_newline else 0)
+
+
+_cache: "OrderedDict[str, LineIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+# Held only while an index is built or checked, so a path's entry goes away with its last user
+_path_locks: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+
+
+def _tail_crc(mm, size: int) -> int:
+    return zlib.crc32(mm[max(0, size - TAIL_CHECK_BYTES):size])
+
+
+def _scan(index: LineIndex, mm, size: int) -> None:
+    """Counts newlines from the last recorded block boundary up to `size`."""
+    bl = index.block_lines
+    pos = (len(bl) - 1) * BLOCK_SIZE
+    count = bl[-1]
+    while pos < size:
+        end = min(pos + SCAN_CHUNK, size)
+        chunk = mm[pos:end]
+        for off in range(0, len(chunk), BLOCK_SIZE):
+            count += chunk.count(b"\n", off, off + BLOCK_SIZE)
+            if pos + off + BLOCK_SIZE <= size:
+                bl.append(count)
+        pos = end
+    index.newlines = count
+    index.size = size
+    index.ends_with_newline = size > 0 and mm[size - 1:size] == b"\n"
+    index.tail_crc = _tail_crc(mm, size)
+
+
+def _lookup(abs_path: str, st: os.stat_result, mm) -> LineIndex:
+    """Returns an index valid for the file described by `st`, reusing or extending the cached one."""
+    with _cache_lock:
+        lock = _path_locks.setdefault(abs_path, threading.Lock())
+    with lock:
+        with _cache_lock:
+            index = _cache.get(abs_path)
+            if index is not None:
+                _cache.move_to_end(abs_path)
+        if index is not None and (index.ino, index.mtime_ns, index.size) == (st.st_ino, st.st_mtime_ns, st.st_size):
+            return index
+
+        grown = (
+            index is not None
+            and index.ino == st.st_ino
+            and st.st_size >= index.size
+            and _tail_crc(mm, index.size) == index.tail_crc
+        )
+        if grown:
+            # Copy so readers holding the previous snapshot keep a consistent view
+            index = LineIndex(index.ino, st.st_mtime_ns, index.size, index.newlines,
+                              index.ends_with_newline, index.tail_crc, array("Q", index.block_lines))
+        else:
+            index = LineIndex(st.st_ino, st.st_mtime_ns, 0)
+        _scan(index, mm, st.st_size)
+
+        with _cache_lock:
+            _cache[abs_path] = index
+            _cache.move_to_end(abs_path)
+            while len(_cache) > MAX_CACHED_INDEXES:
+                _cache.popitem(last=False)
+        return index
+
+
+def _line_start(index: LineIndex, mm, line: int) -> int:
+    """Byte offset where 0-based `line` starts (just after the line-th newline)."""
+    if line <= 0:
+        return 0
+    if line > index.newlines:
+        return index.size
+    block = bisect_left(index.block_lines, line) - 1
+    pos = block * BLOCK_SIZE
+    for _ in range(line - index.block_lines[block]):
+        pos = mm.find(b"\n", pos, index.size) + 1
+    return pos
+
+
+def _empty_result(index: Optional[LineIndex], start: int, st: os.stat_result) -> Dict[str, Any]:
+    total = index.total_lines if index else 0
+    return {
+        "start": start, "lines": [], "next_line": start, "total_lines": total,
+        "complete_lines": index.newlines if index else 0,
+        "size": st.st_size, "mtime": st.st_mtime, "eof": True, "truncated": False,
+    }
+
+
+def read_lines(abs_path: str, start: int, count: int, complete_only: bool = False) -> Dict[str, Any]:
+    """Reads up to `count` lines beginning at 0-based line `start`.
+
+    Lines are decoded as UTF-8 (invalid bytes replaced) without their line
+    terminator. `complete_only` leaves out a final line that has no newline
+    yet, which is what a follower of a file being written wants. Responses
+    are capped at MAX_LINES_PER_READ lines and MAX_READ_BYTES bytes; single
+    lines longer than MAX_LINE_BYTES are cut and flagged via `truncated`.
+    """
+    start = max(0, start)
+    count = max(0, min(count, MAX_LINES_PER_READ))
+    with open(abs_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            with _cache_lock:
+                _cache.pop(abs_path, None)
+            return _empty_result(None, start, st)
+        with mmap.mmap(f.fileno(), st.st_size, access=mmap.ACCESS_READ) as mm:
+            index = _lookup(abs_path, st, mm)
+            available = index.newlines if complete_only else index.total_lines
+            if start >= available or count == 0:
+                return _empty_result(index, start, st)
+
+            pos = _line_start(index, mm, start)
+            lines: List[str] = []
+            budget = MAX_READ_BYTES
+            truncated = False
+            while len(lines) < count and start + len(lines) < available:
+                nl = mm.find(b"\n", pos, index.size)
+                end = index.size if nl < 0 else nl
+                if lines and end - pos > budget:
+                    break
+                cut = min(end, pos + MAX_LINE_BYTES, pos + budget)
+                truncated |= cut < end
+                raw = mm[pos:cut]
+                if raw.endswith(b"\r"):
+                    raw = raw[:-1]
+                lines.append(raw.decode("utf-8", errors="replace"))
+                budget -= cut - pos
+                pos = end + 1
+
+            next_line = start + len(lines)
+            return {
+                "start": start, "lines": lines, "next_line": next_line, "total_lines": index.total_lines,
+                "complete_lines": index.newlines,
+                "size": st.st_size, "mtime": st.st_mtime, "eof": next_line >= index.total_lines,
+                "truncated": truncated,
+            }
+
+
+def tail_lines(abs_path: str, count: int) -> Dict[str, Any]:
+    """Reads the last `count` lines (a trailing newline does not start an extra empty line)."""
+    count = max(0, min(count, MAX_LINES_PER_READ))
+    with open(abs_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            return _empty_result(None, 0, st)
+        with mmap.mmap(f.fileno(), st.st_size, access=mmap.ACCESS_READ) as mm:
+            total = _lookup(abs_path, st, mm).total_lines
+    return read_lines(abs_path, max(0, total - count), count)
+
+
+def invalidate(abs_path: str) -> None:
+    """Drops the cached index for a path (optional; stale entries are detected anyway)."""
+    with _cache_lock:
+        _cache.pop(abs_path, None)
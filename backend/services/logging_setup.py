@@ -0,0 +1,376 @@
+'''Centralized, non-blocking logging for the backend.
+
+setup_logging() replaces the root handlers with one QueueHandler. Log calls
+on the event loop (or in worker threads) only enqueue the record; a single
+background writer thread drains the queue in batches, formats the records
+and writes each batch to stdout with one write/flush, so a slow terminal or
+pipe never blocks request handling. The queue holds at most
+GENESIS_LOG_QUEUE_SIZE records: when the writer falls that far behind, new
+records are dropped and the writer reports how many.
+
+It is called by the server's entry points (backend.server.main and each
+worker process), not on import, so importing the app leaves logging alone.
+
+Records are enriched with the current request id and route (set per request
+by RequestContextMiddleware) and written as one JSON object per line, or as
+plain text with GENESIS_LOG_FORMAT=text.
+
+Formatting is lazy: call sites pass %-style arguments, and the message is
+only rendered in the writer thread, after filtering. Arguments are therefore
+read later on another thread; pass immutable values (strings, numbers).
+
+Noisy lines are cut down before they are queued:
+  - Per-route sampling of INFO and below, e.g.
+        GENESIS_LOG_SAMPLE="/frontend/fs/=0.1,/frontend/echo/=0"
+    keeps 10% of records logged while serving /frontend/fs/... and none for
+    the echo route. The longest matching prefix wins; WARNING and above are
+    never sampled.
+  - A per-call-site rate limit for INFO and below (GENESIS_LOG_RATE_LIMIT
+    lines per second, 0 disables). The first record let through after a
+    suppression carries a `suppressed` count. WARNING and above always pass.
+
+Environment:
+    GENESIS_LOG_LEVEL        root level (default INFO)
+    GENESIS_LOG_FORMAT       json (default) or text
+    GENESIS_LOG_SAMPLE       per-route sample rates, see above
+    GENESIS_LOG_RATE_LIMIT   lines per second per call site (default 50)
+    GENESIS_LOG_QUEUE_SIZE   records waiting for the writer (default 10000)
+'''
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+# --- Request context ---
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+route_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("route", default=None)
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+# --- Configuration ---
+
+LOG_LEVEL = os.getenv("GENESIS_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("GENESIS_LOG_FORMAT", "json")
+LOG_SAMPLE = os.getenv("GENESIS_LOG_SAMPLE", "")
+LOG_RATE_LIMIT = float(os.getenv("GENESIS_LOG_RATE_LIMIT", "50"))
+LOG_QUEUE_SIZE = int(os.getenv("GENESIS_LOG_QUEUE_SIZE", "10000"))
+
+# Records formatted and written per write/flush by the writer thread
+WRITE_BATCH = 1024
+# After waking up the writer waits this long for more records to arrive, so
+# a busy server wakes it (and hands it the GIL) a few times per second rather
+# than once per record. It is also the longest a record waits to be written.
+WRITE_LINGER_SECONDS = 0.05
+
+_writer: Optional["QueueWriter"] = None
+_handler: Optional[logging.Handler] = None
+
+
+def parse_sample_rates(spec: str) -> List[Tuple[str, float]]:
+    """Parses "prefix=rate,prefix=rate" into (prefix, rate) pairs, longest prefix first."""
+    rates = []
+    for entry in spec.split(","):
+        prefix, sep, rate = entry.strip().partition("=")
+        if sep and prefix:
+            rates.append((prefix, max(0.0, min(1.0, float(rate)))))
+    return sorted(rates, key=lambda item: len(item[0]), reverse=True)
+
+
+# --- Filters (run on the calling thread, before the record is queued) ---
+
+class RouteSamplingFilter(logging.Filter):
+    """Keeps a fraction of INFO/DEBUG records per route prefix."""
+
+    def __init__(self, rates: List[Tuple[str, float]]) -> None:
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        route = route_var.get()
+        if route is None:
+            return True
+        for prefix, rate in self.rates:
+            if route.startswith(prefix):
+                return rate >= 1.0 or random.random() < rate
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site (logger, file, line): at most `rate` INFO/DEBUG records per second."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        # call site -> [tokens, last refill time, suppressed count]
+        self._buckets: Dict[Tuple[str, str, int], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1.0:
+                bucket[0] = tokens
+                bucket[2] += 1
+                return False
+            bucket[0] = tokens - 1.0
+            if bucket[2]:
+                record.suppressed = int(bucket[2])
+                bucket[2] = 0
+        return True
+
+
+# --- Handler and formatters ---
+
+class BoundedLogQueue(queue.Queue):
+    """The log queue: when full, put_nowait() (used by QueueHandler) drops the record and counts it."""
+
+    def __init__(self, maxsize: int) -> None:
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put_nowait(self, item) -> None:
+        try:
+            super().put_nowait(item)
+        except queue.Full:
+            with self.mutex:
+                self.dropped += 1
+
+    def take_dropped(self) -> int:
+        with self.mutex:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records without formatting them.
+
+    The stock QueueHandler renders the message on the calling thread; this
+    one only captures what cannot be read later (request context and the
+    traceback text) and leaves the %-formatting to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.request_id = request_id_var.get()
+        record.route = route_var.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+            entry["route"] = getattr(record, "route", None)
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        line = super().format(record)
+        suppressed = getattr(record, "suppressed", None)
+        return f"{line} (+{suppressed} suppressed)" if suppressed else line
+
+
+class QueueWriter:
+    """
+    Background thread that drains the log queue.
+
+    Unlike logging.handlers.QueueListener, which handles records one at a
+    time, it takes everything already queued (up to WRITE_BATCH), formats
+    it and writes it with a single call, so a burst of records costs one
+    thread wake-up and one flush.
+    """
+
+    _STOP = object()
+
+    def __init__(self, log_queue: BoundedLogQueue, formatter: logging.Formatter, stream) -> None:
+        self.queue = log_queue
+        self.formatter = formatter
+        self.stream = stream
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            if batch[0] is not self._STOP:
+                time.sleep(WRITE_LINGER_SECONDS)
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for record in batch:
+                if record is self._STOP:
+                    stopping = True
+                    continue
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception:
+                    lines.append(f"<unformattable log record from {record.name}:{record.lineno}: {record.msg!r}>")
+            dropped = self.queue.take_dropped()
+            if dropped:
+                lines.append(self.formatter.format(logging.LogRecord(
+                    __name__, logging.WARNING, __file__, 0,
+                    "%d log records dropped: the writer fell behind", (dropped,), None,
+                )))
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except Exception:
+                    pass  # nowhere left to report a broken log stream
+
+
+# --- Setup ---
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    sample: str = LOG_SAMPLE,
+    rate_limit: float = LOG_RATE_LIMIT,
+    stream=None,
+    queue_size: int = LOG_QUEUE_SIZE,
+) -> None:
+    """Installs the queue pipeline on the root logger; calling it again reconfigures it."""
+    global _writer, _handler
+    shutdown_logging()
+
+    log_queue = BoundedLogQueue(queue_size)
+    handler = ContextQueueHandler(log_queue)
+    handler.addFilter(RouteSamplingFilter(parse_sample_rates(sample)))
+    handler.addFilter(RateLimitFilter(rate_limit))
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        if old.__class__ is logging.StreamHandler:  # left by an earlier basicConfig()
+            root.removeHandler(old)
+    root.addHandler(handler)
+    _handler = handler
+    root.setLevel(level.upper())
+
+    # uvicorn's loggers go through the same queue instead of their own stderr handlers
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uv_logger = logging.getLogger(name)
+        uv_logger.handlers.clear()
+        uv_logger.propagate = True
+
+    formatter = TextFormatter() if fmt == "text" else JsonFormatter()
+    _writer = QueueWriter(log_queue, formatter, stream or sys.stdout)
+    _writer.start()
+
+
+def ensure_logging() -> None:
+    """Sets up logging with the defaults unless this process already has it."""
+    if _handler is None:
+        setup_logging()
+
+
+def shutdown_logging() -> None:
+    """Detaches the queue handler and stops the writer thread after draining the queue."""
+    global _writer, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+
+atexit.register(shutdown_logging)
+
+
+# --- ASGI middleware ---
+
+class RequestContextMiddleware:
+    """
+    Assigns a request id to every HTTP request and WebSocket connection.
+
+    An incoming X-Request-ID header is reused (so ids can be traced across
+    services); otherwise one is generated. The id is echoed back in the
+    response headers. Written as plain ASGI middleware so it adds no
+    per-request task or body buffering.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        id_token = request_id_var.set(request_id)
+        route_token = route_var.set(scope.get("path"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), (REQUEST_ID_HEADER, request_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id if scope["type"] == "http" else send)
+        finally:
+            request_id_var.reset(id_token)
+            route_var.reset(route_token)
@@ -0,0 +1,384 @@
+'''Shared state backends for cross-worker concerns.
+
+Anything that lives in a plain module-level dict is private to one uvicorn
+worker. State that must be consistent across workers goes through
+``get_shared_state()`` instead, which returns the backend selected by
+``GENESIS_STATE_BACKEND``:
+
+    memory  - in-process dicts; the default, only correct with one worker
+    sqlite  - a WAL-mode SQLite file shared by every worker on the machine
+
+Subsystems keep their fast in-process structures and mirror into the shared
+state only when the backend is ``cross_process`` (so a single worker pays
+nothing): chat sessions and their turn locks (services/ai/sessions.py),
+resumable streams (services/ai/streams.py), provider balancer metrics
+(routers/ai_router.py) and per-path file write locks
+(services/file_operations.py).
+
+Usage
+-----
+    from backend.services.shared_state import get_shared_state
+
+    state = get_shared_state()
+    if state.incr(f"rl:{client}", ttl=60) > 100:
+        ...  # over the limit for this minute
+    state.update("owner", lambda current: current or my_id, ttl=30)  # claim unless taken
+'''
+
+from __future__ import annotations
+
+import abc
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple, Type
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Configuration ---
+STATE_BACKEND_ENV = "GENESIS_STATE_BACKEND"
+STATE_PATH_ENV = "GENESIS_STATE_PATH"
+DEFAULT_STATE_PATH = os.path.join(tempfile.gettempdir(), "genesis_state.sqlite3")
+
+# Published events are kept this long so slow pollers can catch up
+EVENT_RETENTION_SECONDS = 300.0
+# lock() hashes names onto this many locks
+LOCK_STRIPES = 256
+
+
+def _stripe(name: str) -> int:
+    return zlib.crc32(name.encode("utf-8")) % LOCK_STRIPES
+
+
+class SharedState(abc.ABC):
+    """
+    Interface every backend implements.
+
+    • get/set/delete  → key-value cache with optional TTL (seconds)
+    • incr            → atomic counter; the TTL is applied when the key is created,
+                        which gives fixed-window rate limiting for free
+    • update          → atomic read-modify-write of one key
+    • publish/poll    → append-only channels for fan-out; pollers remember the
+                        last event id they saw
+    • lock            → exclusive lock shared by every worker (blocking)
+    Values must be JSON-serialisable.
+    """
+
+    name: str = ""
+    # True when every worker process sees the same data
+    cross_process: bool = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Any:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        ...
+
+    @abc.abstractmethod
+    def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        """
+        Replaces the value of `key` with fn(current value, or None) as one
+        atomic step and returns the new value; None deletes the key. When fn
+        returns the current value nothing is written, so the TTL is renewed
+        only by an actual change. `fn` may run while other workers wait, so
+        keep it short.
+        """
+
+    @abc.abstractmethod
+    def publish(self, channel: str, message: Any) -> int:
+        ...
+
+    @abc.abstractmethod
+    def lock(self, name: str) -> ContextManager[None]:
+        """
+        An exclusive lock on `name` for every worker sharing this state. It
+        blocks, so take it in a worker thread. Names are hashed onto
+        LOCK_STRIPES locks, so unrelated names may wait for each other, and
+        it is not re-entrant.
+        """
+
+    @abc.abstractmethod
+    def poll(self, channel: str, after_id: int = 0, limit: int = 100) -> List[Tuple[int, Any]]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryState(SharedState):
+    """In-process backend. Fast, but each worker sees its own copy."""
+
+    name = "memory"
+
+    def __init__(self, **_: Any) -> None:
+        self._lock = threading.Lock()
+        self._kv: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._events: Dict[str, List[Tuple[int, float, Any]]] = {}
+        self._next_event_id = 1
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _live(self, key: str, now: float) -> bool:
+        entry = self._kv.get(key)
+        if entry is None:
+            return False
+        if entry[1] is not None and entry[1] <= now:
+            del self._kv[key]
+            return False
+        return True
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._kv[key][0] if self._live(key, time.time()) else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._kv[key] = (value, expires)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._kv.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        with self._lock:
+            if self._live(key, now):
+                value, expires = self._kv[key]
+                value = int(value) + amount
+            else:
+                value, expires = amount, (now + ttl if ttl else None)
+            self._kv[key] = (value, expires)
+            return value
+
+    def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        now = time.time()
+        with self._lock:
+            current, expires = self._kv[key] if self._live(key, now) else (None, None)
+            value = fn(current)
+            if value == current:
+                return value
+            if value is None:
+                self._kv.pop(key, None)
+            else:
+                self._kv[key] = (value, now + ttl if ttl else expires)
+            return value
+
+    def publish(self, channel: str, message: Any) -> int:
+        now = time.time()
+        with self._lock:
+            event_id = self._next_event_id
+            self._next_event_id += 1
+            events = self._events.setdefault(channel, [])
+            events.append((event_id, now, message))
+            # Drop expired events from the front of the channel
+            cutoff = now - EVENT_RETENTION_SECONDS
+            drop = 0
+            while drop < len(events) and events[drop][1] < cutoff:
+                drop += 1
+            if drop:
+                del events[:drop]
+            return event_id
+
+    def poll(self, channel: str, after_id: int = 0, limit: int = 100) -> List[Tuple[int, Any]]:
+        with self._lock:
+            events = self._events.get(channel, [])
+            return [(eid, msg) for eid, _, msg in events if eid > after_id][:limit]
+
+    def lock(self, name: str) -> ContextManager[None]:
+        return self._locks[_stripe(name)]
+
+
+class SQLiteState(SharedState):
+    """
+    Backend stored in a single SQLite file in WAL mode.
+
+    Every worker process opens the same file, so counters and channels are
+    shared machine-wide without any external service. Connections are kept
+    per thread because sqlite3 connections can't be shared across threads.
+    Locks are file locks on <path>.locks/<stripe>.
+    """
+
+    name = "sqlite"
+    cross_process = True
+
+    def __init__(self, path: Optional[str] = None, **_: Any) -> None:
+        self.path = path or os.getenv(STATE_PATH_ENV) or DEFAULT_STATE_PATH
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS kv (
+                    key     TEXT PRIMARY KEY,
+                    value   TEXT NOT NULL,
+                    expires REAL
+                );
+                CREATE TABLE IF NOT EXISTS events (
+                    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS events_channel ON events (channel, id);
+                """
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Any:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires = time.time() + ttl if ttl else None
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires),
+        )
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front so concurrent workers serialise here
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value, expires FROM kv WHERE key = ?", (key,)
+            ).fetchone()
+            if row and (row[1] is None or row[1] > now):
+                value, expires = int(json.loads(row[0])) + amount, row[1]
+            else:
+                value, expires = amount, (now + ttl if ttl else None)
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires),
+            )
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+            live = row is not None and (row[1] is None or row[1] > now)
+            current = json.loads(row[0]) if live else None
+            value = fn(current)
+            if value is None:
+                conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            elif value != current:
+                conn.execute(
+                    "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now + ttl if ttl else (row[1] if live else None)),
+                )
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def publish(self, channel: str, message: Any) -> int:
+        now = time.time()
+        conn = self._conn()
+        cur = conn.execute(
+            "INSERT INTO events (channel, payload, created) VALUES (?, ?, ?)",
+            (channel, json.dumps(message), now),
+        )
+        event_id = cur.lastrowid
+        # Amortised cleanup instead of a background sweeper
+        if event_id % 256 == 0:
+            conn.execute("DELETE FROM events WHERE created < ?", (now - EVENT_RETENTION_SECONDS,))
+            conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (now,))
+        return event_id
+
+    def poll(self, channel: str, after_id: int = 0, limit: int = 100) -> List[Tuple[int, Any]]:
+        rows = self._conn().execute(
+            "SELECT id, payload FROM events WHERE channel = ? AND id > ? ORDER BY id LIMIT ?",
+            (channel, after_id, limit),
+        ).fetchall()
+        return [(eid, json.loads(payload)) for eid, payload in rows]
+
+    @contextmanager
+    def lock(self, name: str) -> Iterator[None]:
+        lock_dir = f"{self.path}.locks"
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, str(_stripe(name))), "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            yield  # closing the file releases the lock
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# --- Backend registry ---
+
+_BACKENDS: Dict[str, Type[SharedState]] = {
+    MemoryState.name: MemoryState,
+    SQLiteState.name: SQLiteState,
+}
+_instance: Optional[SharedState] = None
+_instance_lock = threading.Lock()
+
+
+def register_backend(name: str, backend: Type[SharedState]) -> None:
+    """Makes an additional backend selectable through GENESIS_STATE_BACKEND."""
+    _BACKENDS[name] = backend
+
+
+def get_shared_state() -> SharedState:
+    """Returns the process-wide backend, creating it on first use."""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                backend_name = os.getenv(STATE_BACKEND_ENV, MemoryState.name)
+                try:
+                    backend = _BACKENDS[backend_name]
+                except KeyError:
+                    raise KeyError(
+                        f"Unknown shared state backend {backend_name!r}. Valid backends are: {list(_BACKENDS)}"
+                    ) from None
+                _instance = backend()
+    return _instance
@@ -0,0 +1,614 @@
+'''Content-addressed version history for files on snapshotted mounts.
+
+Enabled when GENESIS_SNAPSHOT_ROOT names a directory (off when unset, like
+session persistence). Every write, patch, restore and delete of a file on a
+mount listed in GENESIS_SNAPSHOT_MOUNTS (default "userdata/") goes through
+file_operations, which records a version here:
+
+    <root>/objects/ab/cdef...              one zlib-compressed chunk, named by the
+                                           sha256 of its uncompressed bytes
+    <root>/manifests/12/3456....jsonl      the versions of one path: a header line
+                                           {"mount", "path"}, then one line per version
+    <root>/reading/<id>.json               the objects an in-flight read still needs
+
+Files are split into content-defined chunks that end on line boundaries: a
+line ends a chunk when a checksum of the line, taken modulo CHUNK_AVG_BYTES,
+is smaller than the line's length (chunks stay between CHUNK_MIN_BYTES and
+CHUNK_MAX_BYTES). An edit therefore changes only the chunk(s) around it,
+and every other chunk is shared with earlier versions and with other files.
+A version line lists its chunks as a splice of the previous version's list,
+{"base": 4, "splice": [start, removed, [new hashes]]}, so both the objects
+and the manifest grow with the changed bytes, not the file size.
+
+Each version also records the file's ETag (the same one GET /read returns)
+and its (mtime, size) on disk. A file changed outside this API is captured
+as an "external" version just before the next write or delete replaces it.
+
+Retention (applied when a manifest grows and by gc()):
+  - in bursts of saves less than SNAPSHOT_BURST_SECONDS apart, only the last save
+    of each SNAPSHOT_BURST_SECONDS window is kept, so a long session of autosaves
+    still leaves one version per window
+  - versions older than SNAPSHOT_KEEP_DAYS are dropped
+  - at most SNAPSHOT_KEEP_VERSIONS versions are kept per path
+  - the newest version of a path is always kept, unless it is a deletion older
+    than SNAPSHOT_KEEP_DAYS, in which case the path's history is dropped
+gc() applies retention to every manifest and then deletes unreferenced objects.
+
+Manifests are read and written under an exclusive lock on <root>/lock, so
+several processes can share one root: the cached newest version of a path is
+checked against its manifest's stat before use, and gc() never sweeps objects
+that another process is about to reference. A version is streamed lazily, so
+open_version() first checks that all its objects exist (a missing one fails
+the request before anything is sent) and pins them in <root>/reading until
+the stream is done; gc() keeps pinned objects. Pins older than
+SNAPSHOT_READ_PIN_SECONDS were left by readers that died and are removed.
+'''
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import accumulate
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+
+SNAPSHOT_ROOT = os.getenv("GENESIS_SNAPSHOT_ROOT") or None  # snapshots off when unset
+SNAPSHOT_MOUNTS = {m.strip() for m in os.getenv("GENESIS_SNAPSHOT_MOUNTS", "userdata/").split(",") if m.strip()}
+SNAPSHOT_KEEP_VERSIONS = int(os.getenv("GENESIS_SNAPSHOT_KEEP_VERSIONS", "100"))
+SNAPSHOT_KEEP_DAYS = float(os.getenv("GENESIS_SNAPSHOT_KEEP_DAYS", "30"))
+SNAPSHOT_BURST_SECONDS = float(os.getenv("GENESIS_SNAPSHOT_BURST_SECONDS", "60"))
+
+CHUNK_MIN_BYTES = 2 * 1024
+CHUNK_AVG_BYTES = 8 * 1024
+CHUNK_MAX_BYTES = 64 * 1024
+COMPRESS_LEVEL = 6
+# Retention runs on record once a manifest holds this many lines beyond the limit
+_PRUNE_SLACK = 16
+# Content of the newest version of recently written paths, so the next save rechunks only around its edit
+SNAPSHOT_CACHE_BYTES = int(os.getenv("GENESIS_SNAPSHOT_CACHE_BYTES", str(32 * 1024 * 1024)))
+SNAPSHOT_CACHE_PATHS = 1024
+SNAPSHOT_READ_PIN_SECONDS = float(os.getenv("GENESIS_SNAPSHOT_READ_PIN_SECONDS", "3600"))
+
+_EDIT_OPS = ("write", "patch", "restore", "external")
+
+_lock = threading.RLock()  # manifests, the cache and gc; object files are written idempotently
+_lock_file: Optional[IO[bytes]] = None  # <root>/lock while this process holds it
+_lock_depth = 0
+# key -> (newest version, number of versions, its content or None, its chunk spans or None, manifest stat)
+_recent: "OrderedDict[str, Tuple[Dict[str, Any], int, Optional[bytes], Optional[List[Tuple[int, int]]], Optional[Tuple[int, int, int]]]]" = OrderedDict()
+_recent_bytes = 0
+
+
+def enabled(mount_name: str) -> bool:
+    return SNAPSHOT_ROOT is not None and mount_name in SNAPSHOT_MOUNTS
+
+
+@contextmanager
+def _locked() -> Iterator[None]:
+    """Holds _lock and, across processes, an exclusive lock on <root>/lock (re-entrant within this process)."""
+    global _lock_file, _lock_depth
+    with _lock:
+        if _lock_depth == 0:
+            os.makedirs(SNAPSHOT_ROOT, exist_ok=True)
+            lock_file = open(os.path.join(SNAPSHOT_ROOT, "lock"), 'a+b')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            except BaseException:
+                lock_file.close()
+                raise
+            _lock_file = lock_file
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+            if _lock_depth == 0:
+                _lock_file.close()  # releases the lock
+                _lock_file = None
+
+
+# --- Chunking ---
+
+def chunk_spans(data: bytes) -> List[Tuple[int, int]]:
+    """Content-defined (start, end) spans of `data`, cut after lines (see module docstring)."""
+    n = len(data)
+    lines = data.split(b"\n")
+    ends = accumulate(len(line) + 1 for line in lines)
+    # Candidate cut points; the checksums run in C, only the few candidates are visited below
+    cuts = [end for end, line, crc in zip(ends, lines, map(zlib.crc32, lines)) if crc % CHUNK_AVG_BYTES <= len(line)]
+    cuts.append(n)
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    for end in cuts:
+        end = min(end, n)
+        if end - start < CHUNK_MIN_BYTES and end != n:
+            continue
+        while end - start > CHUNK_MAX_BYTES:  # long stretches without a cut (or without newlines)
+            spans.append((start, start + CHUNK_MAX_BYTES))
+            start += CHUNK_MAX_BYTES
+        if end > start:
+            spans.append((start, end))
+            start = end
+    return spans
+
+
+_COMPARE_BLOCK = 64 * 1024
+
+
+def _common_prefix(a: bytes, b: bytes) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i:i + _COMPARE_BLOCK] == b[i:i + _COMPARE_BLOCK]:
+        i += _COMPARE_BLOCK
+    if i >= n:
+        return n
+    lo, hi = i, min(i + _COMPARE_BLOCK, n)  # a[:lo] == b[:lo], a[:hi] != b[:hi]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _common_suffix(a: bytes, b: bytes) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[len(a) - min(n, i + _COMPARE_BLOCK):len(a) - i] == b[len(b) - min(n, i + _COMPARE_BLOCK):len(b) - i]:
+        i += _COMPARE_BLOCK
+    if i >= n:
+        return n
+    lo, hi = i, min(i + _COMPARE_BLOCK, n)  # the last lo bytes match, the last hi do not
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def rechunk(
+    data: bytes, old: bytes, old_spans: List[Tuple[int, int]], old_digests: List[str]
+) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Chunks `data`, a new version of `old`, reusing the chunks of `old` before
+    and after the changed region: (start, end, digest), where digest is None
+    for the chunks that were cut afresh.
+    """
+    n, delta = len(data), len(data) - len(old)
+    prefix = _common_prefix(data, old)
+    suffix = _common_suffix(data, old)
+    pieces: List[Tuple[int, int, Optional[str]]] = []
+    i = 0
+    # The last old chunk ends where the old data did, not at a content cut, so it is never reused here
+    while i < len(old_spans) - 1 and old_spans[i][1] <= prefix:
+        pieces.append((*old_spans[i], old_digests[i]))
+        i += 1
+    # Old cuts inside the common suffix, at their offsets in the new data
+    resync = {end + delta: j for j, (_, end) in enumerate(old_spans[:-1]) if j >= i and end + delta >= n - suffix}
+    start = pieces[-1][1] if pieces else 0
+    while start < n:
+        window_end = min(n, start + 4 * CHUNK_MAX_BYTES)
+        spans = chunk_spans(data[start:window_end])
+        if window_end < n:
+            spans.pop()  # cut by the window, not by content
+        for span_start, span_end in spans:
+            pieces.append((start + span_start, start + span_end, None))
+            j = resync.get(start + span_end)
+            if j is not None:
+                pieces.extend((s + delta, e + delta, d) for (s, e), d in zip(old_spans[j + 1:], old_digests[j + 1:]))
+                return pieces
+        start = pieces[-1][1]
+    return pieces
+
+
+# --- Object store ---
+
+def _object_path(digest: str) -> str:
+    return os.path.join(SNAPSHOT_ROOT, "objects", digest[:2], digest[2:])
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def store_chunks(data: bytes, pieces: List[Tuple[int, int, Optional[str]]]) -> Tuple[List[str], int]:
+    """
+    Stores the chunks of `data` given as (start, end, digest or None) that are
+    not stored yet; returns all their digests and the new bytes written.
+    Chunks with a known digest are taken to be stored already.
+    """
+    digests: List[str] = []
+    written = 0
+    view = memoryview(data)
+    for start, end, digest in pieces:
+        if digest is None:
+            chunk = view[start:end]
+            digest = hashlib.sha256(chunk).hexdigest()
+            path = _object_path(digest)
+            if not os.path.exists(path):
+                packed = zlib.compress(chunk, COMPRESS_LEVEL)
+                _write_atomic(path, packed)
+                written += len(packed)
+        digests.append(digest)
+    return digests, written
+
+
+def _load_chunk(digest: str) -> bytes:
+    try:
+        with open(_object_path(digest), "rb") as f:
+            chunk = zlib.decompress(f.read())
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"Snapshot object missing: {digest}")
+    if hashlib.sha256(chunk).hexdigest() != digest:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"Snapshot object corrupted: {digest}")
+    return chunk
+
+
+# --- Manifests ---
+
+def _manifest_path(key: str) -> str:
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return os.path.join(SNAPSHOT_ROOT, "manifests", name[:2], name[2:] + ".jsonl")
+
+
+def _load(key: str) -> List[Dict[str, Any]]:
+    """Versions of `key`, oldest first, each with its full "chunks" list (None for deletions)."""
+    try:
+        with open(_manifest_path(key), "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    versions: List[Dict[str, Any]] = []
+    for line in lines[1:]:  # first line is the header
+        if not line:
+            continue
+        entry = json.loads(line)
+        splice = entry.pop("splice", None)
+        if splice is not None:
+            start, removed, added = splice
+            base = versions[-1]["chunks"]
+            entry["chunks"] = base[:start] + added + base[start + removed:]
+            entry.pop("base", None)
+        versions.append(entry)
+    return versions
+
+
+def _encode(entry: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> str:
+    """One manifest line; the chunk list as a splice of the previous version's when that is shorter."""
+    chunks = entry.get("chunks")
+    base = previous.get("chunks") if previous else None
+    if chunks is None or not base:
+        return json.dumps(entry, separators=(",", ":"))
+    limit = min(len(base), len(chunks))
+    head = 0
+    while head < limit and base[head] == chunks[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and base[-1 - tail] == chunks[-1 - tail]:
+        tail += 1
+    added = chunks[head:len(chunks) - tail]
+    if len(added) >= len(chunks):
+        return json.dumps(entry, separators=(",", ":"))
+    line = {k: v for k, v in entry.items() if k != "chunks"}
+    line["base"] = previous["v"]
+    line["splice"] = [head, len(base) - head - tail, added]
+    return json.dumps(line, separators=(",", ":"))
+
+
+def _rewrite(key: str, versions: List[Dict[str, Any]]) -> None:
+    _forget(key)
+    path = _manifest_path(key)
+    if not versions:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    mount, _, rel = key.partition("/")
+    lines = [json.dumps({"mount": mount + "/", "path": rel})]
+    for i, entry in enumerate(versions):
+        lines.append(_encode(entry, versions[i - 1] if i else None))
+    _write_atomic(path, ("\n".join(lines) + "\n").encode("utf-8"))
+
+
+def _retain(versions: List[Dict[str, Any]], now: float) -> List[Dict[str, Any]]:
+    if not versions:
+        return versions
+    newest = versions[-1]
+    if newest["op"] == "delete" and now - newest["time"] > SNAPSHOT_KEEP_DAYS * 86400:
+        return []
+    kept: List[Dict[str, Any]] = []
+    for i, entry in enumerate(versions[:-1]):
+        following = versions[i + 1]
+        in_burst = (entry["op"] in _EDIT_OPS and following["op"] in _EDIT_OPS
+                    and following["time"] - entry["time"] < SNAPSHOT_BURST_SECONDS)
+        # A burst is thinned, not collapsed: the last save of each burst window survives
+        if in_burst and following["time"] // SNAPSHOT_BURST_SECONDS == entry["time"] // SNAPSHOT_BURST_SECONDS:
+            continue
+        if now - entry["time"] <= SNAPSHOT_KEEP_DAYS * 86400:
+            kept.append(entry)
+    kept.append(newest)
+    return kept[-SNAPSHOT_KEEP_VERSIONS:]
+
+
+def _public(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: entry.get(k) for k in ("v", "time", "op", "size", "etag")}
+
+
+# --- Recording ---
+
+def _forget(key: str) -> None:
+    global _recent_bytes
+    cached = _recent.pop(key, None)
+    if cached is not None and cached[2] is not None:
+        _recent_bytes -= len(cached[2])
+
+
+def _manifest_stat(key: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(_manifest_path(key))
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _remember(key: str, newest: Dict[str, Any], count: int, data: Optional[bytes] = None,
+              spans: Optional[List[Tuple[int, int]]] = None) -> None:
+    global _recent_bytes
+    _forget(key)
+    if data is not None and len(data) > SNAPSHOT_CACHE_BYTES:
+        data = spans = None
+    _recent[key] = (newest, count, data, spans, _manifest_stat(key))
+    _recent_bytes += len(data) if data is not None else 0
+    while _recent_bytes > SNAPSHOT_CACHE_BYTES or len(_recent) > SNAPSHOT_CACHE_PATHS:
+        _forget(next(iter(_recent)))
+
+
+def _recall(key: str) -> Tuple[Optional[Dict[str, Any]], int, Optional[bytes], Optional[List[Tuple[int, int]]]]:
+    """The newest version of `key`, the number of versions and, if cached, the newest content and its spans."""
+    cached = _recent.get(key)
+    if cached is not None and cached[4] != _manifest_stat(key):
+        _forget(key)  # another process recorded a version since
+        cached = None
+    if cached is None:
+        versions = _load(key)
+        if not versions:
+            return None, 0, None, None
+        _remember(key, versions[-1], len(versions))
+        cached = _recent[key]
+    _recent.move_to_end(key)
+    return cached[:4]
+
+
+def needs_capture(key: str, st: os.stat_result) -> bool:
+    """True if the file on disk (stat `st`) is not the newest recorded version of `key`."""
+    with _locked():
+        newest = _recall(key)[0]
+    if newest is None or newest["op"] == "delete":
+        return True
+    return (newest.get("mtime_ns"), newest.get("size")) != (st.st_mtime_ns, st.st_size)
+
+
+def record(
+    key: str,
+    op: str,
+    data: Optional[bytes] = None,
+    etag: Optional[str] = None,
+    st: Optional[os.stat_result] = None,
+) -> Optional[int]:
+    """
+    Records a version of `key` ("mount/rel/path"): the content `data` for
+    write/patch/restore/external, or a deletion when data is None. Returns the
+    new version number, or None when `data` equals the newest version.
+    """
+    with _locked():
+        previous, count, old_data, old_spans = _recall(key)
+        if data is not None and previous is not None and previous.get("etag") == etag and previous["op"] != "delete":
+            if st is not None and previous.get("mtime_ns") != st.st_mtime_ns:
+                versions = _load(key)  # rewritten unchanged; remember it is not an external edit
+                versions[-1]["mtime_ns"] = st.st_mtime_ns
+                _rewrite(key, versions)
+            return None
+        entry: Dict[str, Any] = {"v": previous["v"] + 1 if previous else 1, "time": time.time(), "op": op}
+        written = 0
+        spans = None
+        if data is not None:
+            if old_data is not None and previous.get("chunks"):
+                pieces = rechunk(data, old_data, old_spans, previous["chunks"])
+            else:
+                pieces = [(start, end, None) for start, end in chunk_spans(data)]
+            entry["chunks"], written = store_chunks(data, pieces)
+            entry.update(size=len(data), etag=etag, mtime_ns=st.st_mtime_ns if st else None)
+            spans = [(start, end) for start, end, _ in pieces]
+
+        if count + 1 > SNAPSHOT_KEEP_VERSIONS + _PRUNE_SLACK:
+            versions = _retain(_load(key) + [entry], entry["time"])
+            _rewrite(key, versions)
+            count = len(versions)
+        elif previous is None:
+            _rewrite(key, [entry])
+            count = 1
+        else:
+            with open(_manifest_path(key), "a", encoding="utf-8") as f:
+                f.write(_encode(entry, previous) + "\n")
+            count += 1
+        _remember(key, entry, count, data, spans)
+    logger.debug("Snapshot %s v%d (%s): %d new object bytes", key, entry["v"], op, written)
+    return entry["v"]
+
+
+# --- Reading ---
+
+def _find(key: str, version: int) -> Dict[str, Any]:
+    with _locked():
+        versions = _load(key)
+    for entry in versions:
+        if entry["v"] == version:
+            if entry.get("chunks") is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f"Version {version} of {key} is a deletion and has no content")
+            return entry
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No version {version} of {key}")
+
+
+def list_versions(key: str) -> List[Dict[str, Any]]:
+    """Versions of `key`, oldest first: {v, time, op, size, etag}."""
+    with _locked():
+        return [_public(entry) for entry in _load(key)]
+
+
+def _pins_dir() -> str:
+    return os.path.join(SNAPSHOT_ROOT, "reading")
+
+
+class _PinnedChunks:
+    """Iterator over a version's chunks (verified on the fly) that unpins its objects when done or closed."""
+
+    def __init__(self, digests: List[str], pin_path: str) -> None:
+        self._digests = iter(digests)
+        self._pin_path: Optional[str] = pin_path
+
+    def __iter__(self) -> "_PinnedChunks":
+        return self
+
+    def __next__(self) -> bytes:
+        try:
+            return _load_chunk(next(self._digests))
+        except BaseException:  # StopIteration included
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._pin_path is not None:
+            try:
+                os.remove(self._pin_path)
+            except FileNotFoundError:
+                pass
+            self._pin_path = None
+
+    def __del__(self) -> None:
+        self.close()
+
+
+def open_version(key: str, version: int) -> Tuple[Iterator[bytes], int]:
+    """Returns an iterator over the chunks of a version and its size; its objects stay pinned against gc() meanwhile."""
+    with _locked():
+        entry = _find(key, version)
+        for digest in set(entry["chunks"]):
+            if not os.path.exists(_object_path(digest)):
+                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                    detail=f"Snapshot object missing: {digest}")
+        pin_path = os.path.join(_pins_dir(), f"{uuid.uuid4().hex}.json")
+        _write_atomic(pin_path, json.dumps(sorted(set(entry["chunks"]))).encode("utf-8"))
+    return _PinnedChunks(entry["chunks"], pin_path), entry["size"]
+
+
+def read_version(key: str, version: int) -> bytes:
+    chunks, _ = open_version(key, version)
+    try:
+        return b"".join(chunks)
+    finally:
+        chunks.close()
+
+
+# --- Garbage collection ---
+
+def _manifest_files() -> Iterator[str]:
+    for dirpath, _, filenames in os.walk(os.path.join(SNAPSHOT_ROOT, "manifests")):
+        for name in filenames:
+            if name.endswith(".jsonl"):
+                yield os.path.join(dirpath, name)
+
+
+def _pinned(now: float) -> Set[str]:
+    """Objects pinned by in-flight reads; removes pins too old to belong to a live reader."""
+    pinned: Set[str] = set()
+    try:
+        with os.scandir(_pins_dir()) as it:
+            entries = list(it)
+    except FileNotFoundError:
+        return pinned
+    for entry in entries:
+        try:
+            if now - entry.stat().st_mtime > SNAPSHOT_READ_PIN_SECONDS:
+                os.remove(entry.path)
+                continue
+            with open(entry.path, "r", encoding="utf-8") as f:
+                pinned.update(json.load(f))
+        except (FileNotFoundError, ValueError):
+            continue  # finished meanwhile, or a .tmp- file mid-write
+    return pinned
+
+
+def gc(now: Optional[float] = None) -> Dict[str, int]:
+    """Applies retention to every manifest, then deletes objects no version or in-flight read references."""
+    if SNAPSHOT_ROOT is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snapshots are not enabled")
+    now = time.time() if now is None else now
+    stats = {"paths": 0, "versions": 0, "versions_removed": 0, "objects": 0, "objects_removed": 0, "bytes_freed": 0}
+    live: Set[str] = set()
+    with _locked():
+        for manifest in list(_manifest_files()):
+            with open(manifest, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+            key = header["mount"] + header["path"]
+            versions = _load(key)
+            kept = _retain(versions, now)
+            if len(kept) != len(versions):
+                _rewrite(key, kept)
+            stats["versions_removed"] += len(versions) - len(kept)
+            stats["versions"] += len(kept)
+            stats["paths"] += bool(kept)
+            for entry in kept:
+                live.update(entry.get("chunks") or ())
+        live |= _pinned(time.time())
+
+        for dirpath, _, filenames in os.walk(os.path.join(SNAPSHOT_ROOT, "objects")):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if os.path.basename(dirpath) + name in live:
+                    stats["objects"] += 1
+                    continue
+                stats["bytes_freed"] += os.path.getsize(path)
+                stats["objects_removed"] += 1
+                os.remove(path)  # also sweeps .tmp- leftovers of interrupted writes
+    logger.info("Snapshot gc: %s", stats)
+    return stats
@@ -0,0 +1,117 @@
+'''Applying text edits and unified diffs to a document (used by patch writes).
+
+A patch is made against one exact version of a file, named by its ETag (see
+file_operations.perform_patch_file), so both forms below are applied
+strictly, without fuzz or offset search:
+
+  edits   [{"start": 120, "end": 125, "text": "hello"}, ...]
+          Replace base[start:end] with text. Offsets count Unicode code
+          points in the base text (end exclusive); edits must be sorted and
+          must not overlap. An insert is start == end, a deletion has "".
+  diff    A unified diff of one file (`diff -u`, `git diff`). File headers
+          are optional; every context and removed line must match the base
+          at the position its hunk header gives.
+
+Both work on the text as the read API returns it, i.e. with "\\n" line
+endings. Malformed or non-matching patches raise 400.
+'''
+
+import re
+from typing import List, Sequence, Tuple
+
+from fastapi import HTTPException, status
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# Lines that may precede the first hunk
+_HEADER_PREFIXES = ("diff ", "index ", "--- ", "+++ ", "new file mode", "deleted file mode", "similarity ", "rename ")
+
+
+def _bad_patch(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Cannot apply patch: {detail}")
+
+
+def _split_lines(text: str) -> List[str]:
+    """Like splitlines(keepends=True), but only "\\n" ends a line."""
+    lines = [line + "\n" for line in text.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def apply_edits(text: str, edits: Sequence[Tuple[int, int, str]]) -> str:
+    parts: List[str] = []
+    pos = 0
+    for start, end, new in edits:
+        if not pos <= start <= end <= len(text):
+            raise _bad_patch(
+                f"edit [{start}, {end}) is out of order, overlapping or beyond the end ({len(text)} characters)"
+            )
+        parts.append(text[pos:start])
+        parts.append(new)
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def _parse_hunk(diff_lines: List[str], i: int) -> Tuple[List[Tuple[str, str]], int]:
+    """Collects (tag, line) pairs up to the next hunk header, folding in "\\ No newline" markers."""
+    ops: List[Tuple[str, str]] = []
+    while i < len(diff_lines) and not diff_lines[i].startswith("@@"):
+        line = diff_lines[i]
+        tag, body = line[:1], line[1:]
+        if tag == "\\":
+            if not ops or not ops[-1][1].endswith("\n"):
+                raise _bad_patch(f"stray '{line.rstrip()}' marker")
+            ops[-1] = (ops[-1][0], ops[-1][1][:-1])
+        elif tag in (" ", "-", "+"):
+            ops.append((tag, body))
+        elif line == "\n":  # some tools drop the space of empty context lines
+            ops.append((" ", "\n"))
+        elif line.startswith(_HEADER_PREFIXES):
+            raise _bad_patch("diffs of more than one file are not supported")
+        else:
+            raise _bad_patch(f"unexpected line in hunk: {line.rstrip()[:80]!r}")
+        i += 1
+    return ops, i
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    lines = _split_lines(text)
+    diff_lines = _split_lines(diff)
+    i = 0
+    while i < len(diff_lines) and not diff_lines[i].startswith("@@"):
+        if not diff_lines[i].startswith(_HEADER_PREFIXES):
+            raise _bad_patch(f"expected a hunk header, got {diff_lines[i].rstrip()[:80]!r}")
+        i += 1
+    if i == len(diff_lines):
+        raise _bad_patch("the diff contains no hunks")
+
+    out: List[str] = []
+    pos = 0  # next base line to copy
+    while i < len(diff_lines):
+        header = _HUNK_RE.match(diff_lines[i])
+        if header is None:
+            raise _bad_patch(f"malformed hunk header {diff_lines[i].rstrip()!r}")
+        old_start = int(header[1])
+        old_len = 1 if header[2] is None else int(header[2])
+        new_len = 1 if header[4] is None else int(header[4])
+        ops, i = _parse_hunk(diff_lines, i + 1)
+        if (sum(tag != "+" for tag, _ in ops), sum(tag != "-" for tag, _ in ops)) != (old_len, new_len):
+            raise _bad_patch(f"hunk {header[0]} line counts do not match its body")
+
+        # An empty old range names the line *after* which the new lines go
+        start = old_start - 1 if old_len else old_start
+        if start < pos or start + old_len > len(lines):
+            raise _bad_patch(f"hunk {header[0]} is out of order or beyond the end of the file")
+        out.extend(lines[pos:start])
+        pos = start
+        for tag, body in ops:
+            if tag != "+":
+                if lines[pos] != body:
+                    raise _bad_patch(f"line {pos + 1} does not match the diff")
+                pos += 1
+            if tag != "-":
+                out.append(body)
+    out.extend(lines[pos:])
+    return "".join(out)
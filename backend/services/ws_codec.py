@@ -0,0 +1,282 @@
+'''WebSocket frame codecs for the chat sockets.
+
+JSON text frames stay the default. A client that offers the
+`genesis.msgpack.v1` subprotocol gets binary MessagePack frames instead,
+with the event key replaced by a small integer tag:
+
+    [tag, request_id, value]
+
+    tag 0  text       value is the token string
+    tag 1  thinking   value is the reasoning token string
+    tag 2  meta       value is the meta map
+    tag 3  error      value is the error string
+    tag 4  message    value is a map of all other keys (requests from the
+                      client, non-stream replies carrying text and meta)
+
+request_id is nil for frames that belong to no interaction. A token frame
+like {"request_id": 3, "text": "hel"} is 7 bytes instead of 29.
+
+Events of resumable streams carry a sequence number (see
+services/ai/streams.py); it travels as an optional fourth element,
+[tag, request_id, value, seq], so token frames keep their compact tags.
+
+The `msgpack` package is used when it is installed; otherwise a small
+pure-Python encoder/decoder covering the types JSON has (nil, bool, int,
+float, str, array, map) plus bin is used. Both produce standard MessagePack.
+
+permessage-deflate is negotiated by uvicorn, independently of the codec
+(see --ws-deflate in backend/server.py).
+'''
+
+import json
+import struct
+from typing import Any, Dict, List, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+try:  # C-accelerated MessagePack when available
+    import msgpack as _msgpack
+except ImportError:
+    _msgpack = None
+
+MSGPACK_SUBPROTOCOL = "genesis.msgpack.v1"
+
+TAG_TEXT = 0
+TAG_THINKING = 1
+TAG_META = 2
+TAG_ERROR = 3
+TAG_MESSAGE = 4
+
+_EVENT_TAGS: Dict[str, int] = {"text": TAG_TEXT, "thinking": TAG_THINKING, "meta": TAG_META, "error": TAG_ERROR}
+_TAG_EVENTS: Dict[int, str] = {tag: key for key, tag in _EVENT_TAGS.items()}
+
+
+# --- Pure-Python MessagePack (subset) ---
+
+_pack_u16 = struct.Struct(">H").pack
+_pack_u32 = struct.Struct(">I").pack
+_pack_f64 = struct.Struct(">d").pack
+# (exclusive upper / inclusive lower bound, type byte, payload size)
+_UINTS = ((1 << 8, 0xCC, 1), (1 << 16, 0xCD, 2), (1 << 32, 0xCE, 4), (1 << 64, 0xCF, 8))
+_INTS = ((-(1 << 7), 0xD0, 1), (-(1 << 15), 0xD1, 2), (-(1 << 31), 0xD2, 4), (-(1 << 63), 0xD3, 8))
+
+
+def _pack_into(obj: Any, out: bytearray) -> None:
+    if obj is None:
+        out.append(0xC0)
+    elif obj is True:
+        out.append(0xC3)
+    elif obj is False:
+        out.append(0xC2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xFF)
+        else:
+            for limit, marker, size in (_UINTS if obj >= 0 else _INTS):
+                if (obj < limit) if obj >= 0 else (obj >= limit):
+                    out.append(marker)
+                    out += obj.to_bytes(size, "big", signed=obj < 0)
+                    break
+            else:
+                raise OverflowError(f"Integer out of MessagePack range: {obj}")
+    elif isinstance(obj, float):
+        out += b"\xcb" + _pack_f64(obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        n = len(data)
+        if n < 32:
+            out.append(0xA0 | n)
+        elif n < 0x100:
+            out += bytes((0xD9, n))
+        elif n < 0x10000:
+            out += b"\xda" + _pack_u16(n)
+        else:
+            out += b"\xdb" + _pack_u32(n)
+        out += data
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        n = len(obj)
+        if n < 0x100:
+            out += bytes((0xC4, n))
+        elif n < 0x10000:
+            out += b"\xc5" + _pack_u16(n)
+        else:
+            out += b"\xc6" + _pack_u32(n)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:
+            out.append(0x90 | n)
+        elif n < 0x10000:
+            out += b"\xdc" + _pack_u16(n)
+        else:
+            out += b"\xdd" + _pack_u32(n)
+        for item in obj:
+            _pack_into(item, out)
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:
+            out.append(0x80 | n)
+        elif n < 0x10000:
+            out += b"\xde" + _pack_u16(n)
+        else:
+            out += b"\xdf" + _pack_u32(n)
+        for key, value in obj.items():
+            _pack_into(key, out)
+            _pack_into(value, out)
+    else:
+        raise TypeError(f"Cannot MessagePack-encode {type(obj).__name__}")
+
+
+# Fixed-width headers: first byte -> (struct format, size)
+_FIXED = {
+    0xCA: (">f", 4), 0xCB: (">d", 8),
+    0xCC: (">B", 1), 0xCD: (">H", 2), 0xCE: (">I", 4), 0xCF: (">Q", 8),
+    0xD0: (">b", 1), 0xD1: (">h", 2), 0xD2: (">i", 4), 0xD3: (">q", 8),
+}
+_LENGTHS = {  # first byte -> (kind, length-prefix size)
+    0xD9: ("str", 1), 0xDA: ("str", 2), 0xDB: ("str", 4),
+    0xC4: ("bin", 1), 0xC5: ("bin", 2), 0xC6: ("bin", 4),
+    0xDC: ("array", 2), 0xDD: ("array", 4),
+    0xDE: ("map", 2), 0xDF: ("map", 4),
+}
+
+
+def _unpack_from(data: bytes, pos: int):
+    byte = data[pos]
+    pos += 1
+    if byte < 0x80:
+        return byte, pos
+    if byte >= 0xE0:
+        return byte - 0x100, pos
+    if 0xA0 <= byte <= 0xBF:
+        end = pos + (byte & 0x1F)
+        return data[pos:end].decode("utf-8"), end
+    if 0x90 <= byte <= 0x9F:
+        kind, n = "array", byte & 0x0F
+    elif 0x80 <= byte <= 0x8F:
+        kind, n = "map", byte & 0x0F
+    elif byte == 0xC0:
+        return None, pos
+    elif byte == 0xC2:
+        return False, pos
+    elif byte == 0xC3:
+        return True, pos
+    elif byte in _FIXED:
+        fmt, size = _FIXED[byte]
+        return struct.unpack_from(fmt, data, pos)[0], pos + size
+    elif byte in _LENGTHS:
+        kind, size = _LENGTHS[byte]
+        n = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    else:
+        raise ValueError(f"Unsupported MessagePack type byte 0x{byte:02x}")
+
+    if kind == "str":
+        return data[pos:pos + n].decode("utf-8"), pos + n
+    if kind == "bin":
+        return bytes(data[pos:pos + n]), pos + n
+    if kind == "array":
+        items = []
+        for _ in range(n):
+            item, pos = _unpack_from(data, pos)
+            items.append(item)
+        return items, pos
+    mapping = {}
+    for _ in range(n):
+        key, pos = _unpack_from(data, pos)
+        mapping[key], pos = _unpack_from(data, pos)
+    return mapping, pos
+
+
+def packb(obj: Any) -> bytes:
+    if _msgpack is not None:
+        return _msgpack.packb(obj, use_bin_type=True)
+    out = bytearray()
+    _pack_into(obj, out)
+    return bytes(out)
+
+
+def unpackb(data: bytes) -> Any:
+    if _msgpack is not None:
+        return _msgpack.unpackb(data, raw=False, strict_map_key=False)
+    try:
+        obj, end = _unpack_from(data, 0)
+    except (IndexError, struct.error, UnicodeDecodeError) as exc:
+        raise ValueError(f"Malformed MessagePack frame: {exc}") from exc
+    if end != len(data):
+        raise ValueError("Trailing bytes after MessagePack frame")
+    return obj
+
+
+# --- Tagged frames ---
+
+def to_frame(event: Dict[str, Any]) -> List[Any]:
+    """{"request_id": 3, "text": "hi"} -> [0, 3, "hi"]; anything else -> [4, rid, {...}]. A "seq" is appended."""
+    request_id = event.get("request_id")
+    seq = event.get("seq")
+    tail = [] if seq is None else [seq]
+    if len(event) - ("request_id" in event) - ("seq" in event) == 1:
+        for key, value in event.items():
+            tag = _EVENT_TAGS.get(key)
+            if tag is not None:
+                return [tag, request_id, value, *tail]
+    return [TAG_MESSAGE, request_id, {k: v for k, v in event.items() if k not in ("request_id", "seq")}, *tail]
+
+
+def from_frame(frame: Any) -> Dict[str, Any]:
+    if not isinstance(frame, list) or len(frame) < 3:
+        raise ValueError("Expected a [tag, request_id, value] frame")
+    tag, request_id, value = frame[0], frame[1], frame[2]
+    event: Dict[str, Any] = {} if request_id is None else {"request_id": request_id}
+    if len(frame) > 3:
+        event["seq"] = frame[3]
+    if tag == TAG_MESSAGE:
+        if not isinstance(value, dict):
+            raise ValueError("Message frame value must be a map")
+        event.update(value)
+    elif tag in _TAG_EVENTS:
+        event[_TAG_EVENTS[tag]] = value
+    else:
+        raise ValueError(f"Unknown frame tag: {tag}")
+    return event
+
+
+# --- Codecs ---
+
+class JsonCodec:
+    """Text frames holding one JSON object (the default)."""
+
+    subprotocol: Optional[str] = None
+
+    async def send(self, ws: WebSocket, event: Dict[str, Any]) -> None:
+        await ws.send_json(event)
+
+    async def receive(self, ws: WebSocket) -> Dict[str, Any]:
+        return await ws.receive_json()
+
+
+class MsgpackCodec:
+    """Binary frames holding one tagged MessagePack array."""
+
+    subprotocol: Optional[str] = MSGPACK_SUBPROTOCOL
+
+    async def send(self, ws: WebSocket, event: Dict[str, Any]) -> None:
+        await ws.send_bytes(packb(to_frame(event)))
+
+    async def receive(self, ws: WebSocket) -> Dict[str, Any]:
+        message = await ws.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        data = message.get("bytes")
+        if data is None:  # tolerate JSON text frames (handy when debugging by hand)
+            return json.loads(message["text"])
+        return from_frame(unpackb(data))
+
+
+def negotiate(ws: WebSocket):
+    """Picks the codec for a connection from the subprotocols the client offered."""
+    if MSGPACK_SUBPROTOCOL in (ws.scope.get("subprotocols") or ()):
+        return MsgpackCodec()
+    return JsonCodec()
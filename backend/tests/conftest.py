@@ -0,0 +1,25 @@
+# backend/tests/conftest.py
+#
+# Shared fixtures: the userdata/ mount redirected to a temporary directory, and a client for the
+# file-system router on top of it.
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.routers import http_frontend_fs
+from backend.services import file_operations
+
+
+@pytest.fixture
+def userdata(tmp_path, monkeypatch):
+    mount = next(mp for mp in file_operations.MOUNT_POINTS if mp["name"] == "userdata/")
+    monkeypatch.setitem(mount, "path", str(tmp_path).replace("\\", "/") + "/")
+    return tmp_path
+
+
+@pytest.fixture
+def client(userdata):
+    app = FastAPI()
+    app.include_router(http_frontend_fs.router, prefix="/frontend/fs")
+    return TestClient(app)
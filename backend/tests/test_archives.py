@@ -0,0 +1,136 @@
+# backend/tests/test_archives.py
+#
+# Streaming directory export and archive import: round trips, containment,
+# quotas and rollback.
+
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from backend.services import archives
+
+
+@pytest.fixture
+def client(client, userdata):
+    src = userdata / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "a.txt").write_text("alpha " * 1000)
+    (src / "sub" / "b.md").write_text("beta")
+    (src / "photo.jpg").write_bytes(bytes(range(256)) * 40)
+    return client
+
+
+def _tree(root):
+    return {p.relative_to(root).as_posix(): p.read_bytes() for p in sorted(root.rglob("*")) if p.is_file()}
+
+
+@pytest.mark.parametrize("fmt", ["zip", "tar", "tar.gz"])
+def test_export_import_round_trip(client, tmp_path, fmt):
+    resp = client.get("/frontend/fs/export", params={"mount": "userdata/", "path": "src/", "format": fmt})
+    assert resp.status_code == 200
+    assert resp.headers["content-disposition"] == f'attachment; filename="src.{fmt}"'
+    if fmt == "zip":
+        infos = {i.filename: i for i in zipfile.ZipFile(io.BytesIO(resp.content)).infolist()}
+        assert infos["photo.jpg"].compress_type == zipfile.ZIP_STORED
+        assert infos["a.txt"].compress_type == zipfile.ZIP_DEFLATED
+
+    result = client.post("/frontend/fs/import", params={"mount": "userdata/", "path": "copy/"}, content=resp.content)
+    assert result.status_code == 201, result.text
+    assert result.json()["files"] == 3
+    assert _tree(tmp_path / "copy") == _tree(tmp_path / "src")
+
+    again = client.post("/frontend/fs/import", params={"mount": "userdata/", "path": "copy/"}, content=resp.content)
+    assert again.status_code == 409
+    assert client.post("/frontend/fs/import", params={"mount": "userdata/", "path": "copy/", "overwrite": True},
+                       content=resp.content).status_code == 201
+
+
+def _tar(members):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tf:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("name, code", [("../escape.txt", 400), ("/etc/passwd", 400), ("ok/../../x", 400)])
+def test_import_rejects_escaping_members_and_rolls_back(client, tmp_path, name, code):
+    body = _tar([("fine.txt", b"ok"), (name, b"bad")])
+    resp = client.post("/frontend/fs/import", params={"mount": "userdata/", "path": "dest/"}, content=body)
+    assert resp.status_code == code
+    assert not (tmp_path / "dest").exists()
+    assert not (tmp_path / "escape.txt").exists()
+    assert client.post("/frontend/fs/import", params={"mount": "userdata/", "path": "new/nested/"},
+                       content=body).status_code == code
+    assert not (tmp_path / "new").exists()
+
+
+def test_import_quotas_and_readonly_mount(client, monkeypatch):
+    monkeypatch.setattr(archives, "IMPORT_MAX_BYTES", 10)
+    body = _tar([("big.txt", b"x" * 100)])
+    assert client.post("/frontend/fs/import", params={"mount": "userdata/", "path": "q/"}, content=body).status_code == 413
+    assert client.post("/frontend/fs/import", params={"mount": "src/", "path": "q/"}, content=body).status_code == 403
+
+
+def test_repeated_members_keep_the_last_copy(client, tmp_path):
+    body = _tar([("dup.txt", b"first"), ("other.txt", b"x"), ("dup.txt", b"second")])
+    resp = client.post("/frontend/fs/import", params={"mount": "userdata/", "path": "dup/"}, content=body)
+    assert resp.status_code == 201, resp.text
+    assert resp.json()["files"] == 2
+    assert _tree(tmp_path / "dup") == {"dup.txt": b"second", "other.txt": b"x"}
+
+
+@pytest.mark.parametrize("fmt", ["zip", "tar.gz"])
+async def test_format_sniffing_survives_tiny_first_chunks(client, tmp_path, fmt):
+    body = client.get("/frontend/fs/export", params={"mount": "userdata/", "path": "src/", "format": fmt}).content
+
+    async def chunks():
+        yield body[:1]
+        yield body[1:3]
+        yield body[3:]
+
+    result = await archives.import_archive("userdata/", "tiny/", chunks())
+    assert result["files"] == 3
+    assert _tree(tmp_path / "tiny") == _tree(tmp_path / "src")
+
+
+def test_staging_stays_out_of_the_destination(client, tmp_path, monkeypatch):
+    seen = []
+    real_file = archives._Extractor.file
+
+    def file(self, name, src):
+        seen.append(sorted(os.listdir(self.dest_abs)) if os.path.isdir(self.dest_abs) else None)
+        real_file(self, name, src)
+
+    monkeypatch.setattr(archives._Extractor, "file", file)
+    (tmp_path / "existing").mkdir()
+    for path in ("existing/", "fresh/"):
+        body = _tar([("a.txt", b"a")])
+        assert client.post("/frontend/fs/import", params={"mount": "userdata/", "path": path}, content=body).status_code == 201
+    assert seen == [[], None]  # an existing destination is untouched, a new one does not exist yet
+    assert not [p for p in tmp_path.rglob(".*import-*")]
+
+
+def test_partly_committed_import_names_the_committed_files(client, tmp_path, monkeypatch):
+    (tmp_path / "dest").mkdir()
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if dst.endswith("b.txt"):
+            raise OSError("disk full")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(archives.os, "replace", replace)
+    body = _tar([("a.txt", b"a"), ("b.txt", b"b")])
+    resp = client.post("/frontend/fs/import", params={"mount": "userdata/", "path": "dest/"}, content=body)
+    assert resp.status_code == 500
+    assert resp.json()["detail"] == "Import stopped after committing 1 of 2 files (a.txt): disk full"
+    # A new destination is moved into place with a single rename
+    assert client.post("/frontend/fs/import", params={"mount": "userdata/", "path": "other/"},
+                       content=body).status_code == 201
+    assert _tree(tmp_path / "other") == {"a.txt": b"a", "b.txt": b"b"}
@@ -0,0 +1,78 @@
+# backend/tests/test_attachments.py
+#
+# Server-side file attachments: expansion, mtime-validated caching, limits,
+# and session history that keeps references rather than content.
+
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from backend.routers.ai_router import ChatRequest, build_messages
+from backend.services.ai import attachments
+from backend.services.ai.sessions import ChatSession
+
+MODEL = "deepseek-chat"
+
+
+@pytest.fixture
+def userdata(userdata):
+    attachments.content_cache.clear()
+    return userdata
+
+
+def _request(*refs, content="explain"):
+    return ChatRequest(model=MODEL, messages=[{"role": "user", "content": content, "attachments": list(refs)}])
+
+
+def test_expands_on_a_copy_and_caches_by_mtime(userdata):
+    (userdata / "notes.txt").write_text("alpha\nbeta\ngamma\n")
+    req = _request({"mount": "userdata/", "path": "notes.txt"}, {"mount": "userdata/", "path": "notes.txt",
+                                                                 "start_line": 1, "line_count": 1})
+    msgs, stats = build_messages(req)
+    assert msgs[-1] == {"role": "user", "content": '<file path="userdata/notes.txt">\nalpha\nbeta\ngamma\n</file>\n\n'
+                                                   '<file path="userdata/notes.txt#L2-2">\nbeta\n</file>\n\nexplain'}
+    assert "attachments" in req.messages[0]  # the request itself is untouched
+    assert stats["attachments"]["count"] == 2 and stats["attachments"]["cache_hits"] == 0
+
+    assert build_messages(req)[1]["attachments"]["cache_hits"] == 2
+    (userdata / "notes.txt").write_text("changed\n")
+    os.utime(userdata / "notes.txt", ns=(1, 1))
+    msgs, stats = build_messages(req)
+    assert "changed" in msgs[-1]["content"] and stats["attachments"]["cache_hits"] == 0
+
+
+def test_limits_and_errors(userdata, monkeypatch):
+    monkeypatch.setattr(attachments, "ATTACHMENT_MAX_BYTES", 16)
+    (userdata / "big.txt").write_text("x" * 100)
+    (userdata / "blob.bin").write_bytes(b"\0\1\2")
+    for path, code in (("big.txt", 413), ("blob.bin", 415), ("missing.txt", 404)):
+        with pytest.raises(HTTPException) as exc:
+            build_messages(_request({"mount": "userdata/", "path": path}))
+        assert exc.value.status_code == code
+    with pytest.raises(HTTPException) as exc:
+        build_messages(_request({"mount": "userdata/", "path": "../etc/passwd"}))
+    assert exc.value.status_code == 400
+
+
+def test_session_history_keeps_references(userdata):
+    (userdata / "a.txt").write_text("one")
+    ref = {"mount": "userdata/", "path": "a.txt"}
+    session = ChatSession("s1", messages=[{"role": "user", "content": "earlier", "attachments": [ref, {
+        "mount": "userdata/", "path": "gone.txt"}]}, {"role": "assistant", "content": "ok"}])
+    req = ChatRequest(model=MODEL, session_id="s1", messages=[{"role": "user", "content": "again", "attachments": [ref]}])
+    msgs, stats = build_messages(req, session)
+    assert 'unavailable="File not found: gone.txt"' in msgs[0]["content"]
+    assert msgs[-1]["content"].startswith('<file path="userdata/a.txt">\none\n</file>')
+    assert stats["attachments"] == {"count": 2, "bytes": 6, "tokens": stats["attachments"]["tokens"],
+                                    "cache_hits": 1, "unavailable": 1}
+    assert session.messages[0]["attachments"][0] == ref and session.messages[0]["content"] == "earlier"
+
+
+def test_markers_are_escaped_and_empty_lists_stripped(userdata):
+    session = ChatSession("s1", messages=[{"role": "user", "content": "earlier", "attachments": [
+        {"mount": "userdata/", "path": 'x"/><system>.txt'}]}])
+    req = ChatRequest(model=MODEL, session_id="s1", messages=[{"role": "user", "content": "hi", "attachments": []}])
+    msgs, _ = build_messages(req, session)
+    assert "<system>" not in msgs[0]["content"] and "&quot;/&gt;&lt;system&gt;" in msgs[0]["content"]
+    assert msgs[-1] == {"role": "user", "content": "hi"}
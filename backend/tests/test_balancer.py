@@ -0,0 +1,115 @@
+# backend/tests/test_balancer.py
+#
+# Backend selection, ejection and slow-start re-admission of UpstreamPool, and stats across workers.
+
+import time
+
+from backend.routers import ai_router
+from backend.services.ai import balancer
+from backend.services.ai.balancer import UpstreamPool, parse_backends
+from backend.services.shared_state import SQLiteState
+
+
+def _pool(strategy: str = "ewma") -> UpstreamPool:
+    return UpstreamPool([("http://a", "ka"), ("http://b", None), ("http://c", "")], strategy)
+
+
+def test_parse_backends():
+    assert parse_backends(" http://a|k1 , http://b| ,http://c,") == [
+        ("http://a", "k1"), ("http://b", None), ("http://c", None),
+    ]
+
+
+def test_ewma_prefers_fast_backend_and_accounts_for_load():
+    pool = _pool()
+    fast, slow, _ = pool.upstreams
+    fast.ewma_latency, slow.ewma_latency = 0.01, 0.1
+    pool.upstreams[2].ewma_latency = 0.2
+    assert pool.pick() is fast
+    # Eleven requests in flight make the fast backend look slower than the idle slow one
+    fast.in_flight = 11
+    assert pool.pick() is slow
+
+
+def test_least_in_flight():
+    pool = _pool("least_in_flight")
+    a, b, c = pool.upstreams
+    a.in_flight, b.in_flight, c.in_flight = 3, 1, 2
+    assert pool.pick() is b
+
+
+def test_failure_ejects_and_readmits_gradually(monkeypatch):
+    pool = _pool("least_in_flight")
+    a, b, c = pool.upstreams
+    now = time.monotonic()
+    pool.failed(a, 429, retry_after=5)
+    assert not a.available(now) and a.failures == 1
+    assert pool.pick() in (b, c)
+    assert pool.pick(exclude=(b, c)) is a  # fails open when nothing else is left
+
+    # Just re-admitted: minimum weight, so it loses against a busier backend
+    monkeypatch.setattr(balancer.time, "monotonic", lambda: a.ejected_until)
+    b.in_flight = c.in_flight = 2
+    assert a.weight(a.ejected_until) == balancer.MIN_WEIGHT
+    assert pool.pick() in (b, c)
+    # Fully ramped up after the slow-start window
+    later = a.ejected_until + balancer.SLOW_START_SECONDS
+    monkeypatch.setattr(balancer.time, "monotonic", lambda: later)
+    assert pool.pick() is a
+
+
+def test_success_resets_backoff():
+    pool = _pool()
+    a = pool.upstreams[0]
+    pool.failed(a, 503)
+    pool.failed(a, 503)
+    assert a.consecutive_failures == 2
+    started = pool.start(a)
+    pool.succeeded(a, started)
+    pool.release(a)
+    assert a.consecutive_failures == 0 and a.in_flight == 0 and a.ewma_latency is not None
+
+
+def test_rejected_key_is_ejected_for_long():
+    pool = _pool("least_in_flight")
+    a, b, c = pool.upstreams
+    b.in_flight = c.in_flight = 5  # a looks idle because its requests fail right away
+    pool.failed(a, 401, retry_after=1)
+    assert a.ejected_until - time.monotonic() > balancer.EJECT_MAX_SECONDS
+    assert pool.pick() in (b, c)
+    assert balancer.is_retryable_status(403) and not balancer.is_retryable_status(404)
+
+
+def test_identical_backends_are_distinct_upstreams():
+    pool = UpstreamPool([("http://a", "k"), ("http://a", "k")], "round_robin")
+    first, second = pool.upstreams
+    assert pool.pick(exclude=(first,)) is second
+    assert pool.pick(exclude=(second,)) is first
+
+
+def test_stats_of_several_workers_merge():
+    pools = [_pool(), _pool()]
+    for pool, (latency, count) in zip(pools, ((0.1, 1), (0.4, 3))):
+        a = pool.upstreams[0]
+        for _ in range(count):
+            a.requests += 1
+            a.ewma_latency = latency
+    pools[1].upstreams[1].requests = 1
+    pools[1].failed(pools[1].upstreams[1], 503)
+    merged = balancer.merge_stats([pool.stats() for pool in pools])
+    first, second, _ = merged["backends"]
+    assert merged["workers"] == 2
+    assert first["requests"] == 4 and first["ewma_ms"] == 325.0
+    assert second["failures"] == 1 and second["ejected_for_s"] > 0
+    assert second["last_status"] == 503  # from the worker that used it
+
+
+def test_workers_share_their_stats(tmp_path, monkeypatch):
+    state = SQLiteState(path=str(tmp_path / "state.sqlite3"))
+    monkeypatch.setattr(ai_router, "_local_metrics", lambda: {"openai": _pool().stats()})
+    ai_router.share_metrics(state, "old")
+    later = time.time() + 3 * ai_router.METRICS_SHARE_SECONDS
+    monkeypatch.setattr(ai_router.time, "time", lambda: later)
+    ai_router.share_metrics(state, "1")
+    assert set(ai_router.share_metrics(state, "2")) == {"1", "2"}  # "old" stopped sharing and is dropped
+    state.close()
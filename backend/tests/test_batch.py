@@ -0,0 +1,126 @@
+# backend/tests/test_batch.py
+#
+# Batch jobs: submit, cancel and resume, and the per-job lease that keeps two runners off one job.
+
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from backend.routers.batch_router import _prepare
+from backend.services.ai import batch, registry
+
+
+class _CountingProvider:
+    name = "deepseek"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    async def chat(self, messages, *, stream=False, **opts):
+        self.calls.append(messages[-1]["content"])
+        await asyncio.sleep(self.delay)
+        return messages[-1]["content"].upper(), {"latency": self.delay}
+
+
+@pytest.fixture
+def provider(userdata, monkeypatch):
+    monkeypatch.setattr(batch, "PROGRESS_FLUSH_SECONDS", 0.02)
+    provider = _CountingProvider()
+    monkeypatch.setitem(registry._PROVIDERS, "deepseek", provider)
+    return provider
+
+
+def _jsonl(count):
+    lines = [{"request_id": i, "model": "deepseek-chat", "messages": [{"role": "user", "content": f"q{i}"}]}
+             for i in range(count)]
+    return "".join(json.dumps(line) + "\n" for line in lines).encode()
+
+
+async def _chunks(data, size=7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def _wait_for(predicate, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+
+def _results(manager, job_id):
+    with open(manager.results_path(job_id), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+async def test_upload_runs_to_completion_and_is_capped(provider, monkeypatch):
+    manager = batch.BatchManager(_prepare)
+    job = await manager.submit_upload(_chunks(_jsonl(3)))
+    assert job["status"] == "queued" and job["total"] == 3
+    await _wait_for(lambda: manager.get_job(job["job_id"])["status"] == "completed")
+    results = sorted(_results(manager, job["job_id"]), key=lambda r: r["index"])
+    assert [r["text"] for r in results] == ["Q0", "Q1", "Q2"]
+
+    monkeypatch.setattr(batch, "BATCH_MAX_UPLOAD_BYTES", 100)
+    with pytest.raises(HTTPException) as exc:
+        await manager.submit_upload(_chunks(_jsonl(3)))
+    assert exc.value.status_code == 413
+    assert [job["job_id"] for job in manager.list_jobs()] == [job["job_id"]]  # nothing left behind
+
+
+async def test_cancel_then_resume_runs_every_line_once(provider):
+    provider.delay = 0.05
+    manager = batch.BatchManager(_prepare, concurrency=1)
+    job_id = (await manager.submit_upload(_chunks(_jsonl(8))))["job_id"]
+    await _wait_for(lambda: len(provider.calls) >= 2)
+    job = await manager.cancel(job_id)
+    assert job["status"] == "cancelled" and job["done"] < 8
+
+    await manager.resume(job_id)
+    await _wait_for(lambda: manager.get_job(job_id)["status"] == "completed")
+    assert sorted(r["index"] for r in _results(manager, job_id)) == list(range(8))
+    assert manager.get_job(job_id)["done"] == 8
+
+
+async def test_interrupted_job_runs_once_across_runners(provider):
+    provider.delay = 0.02
+    first, second = batch.BatchManager(_prepare, concurrency=1), batch.BatchManager(_prepare, concurrency=1)
+    job = await asyncio.to_thread(first._create_job, "interrupted1", "test", lambda dest: open(dest, "wb").write(_jsonl(6)))
+    job["status"] = "running"  # as left behind by a crash
+    first._save_job(job)
+
+    first.resume_interrupted()
+    second.resume_interrupted()  # like a second worker starting up
+    await _wait_for(lambda: first.get_job("interrupted1")["status"] == "completed")
+    await asyncio.sleep(0.05)
+    assert sorted(provider.calls) == [f"q{i}" for i in range(6)]
+    assert sorted(r["index"] for r in _results(first, "interrupted1")) == list(range(6))
+
+    # A cancel from a process that does not run the job reaches the runner through the marker file
+    provider.delay = 0.2
+    job_id = (await first.submit_upload(_chunks(_jsonl(20))))["job_id"]
+    await _wait_for(lambda: len(provider.calls) > 6)
+    await second.cancel(job_id)
+    await _wait_for(lambda: first.get_job(job_id)["status"] == "cancelled")
+    assert not os.path.exists(os.path.join(batch._job_dir(job_id), "cancel"))
+
+
+async def test_a_saturated_provider_does_not_hold_up_the_others(provider, monkeypatch):
+    provider.delay = 0.5
+    fast = _CountingProvider()
+    fast.name = "openai"
+    monkeypatch.setitem(registry._PROVIDERS, "openai", fast)
+    lines = [{"request_id": i, "model": "deepseek-chat" if i < 3 else "gpt-4o",
+              "messages": [{"role": "user", "content": f"q{i}"}]} for i in range(6)]
+    data = "".join(json.dumps(line) + "\n" for line in lines).encode()
+
+    manager = batch.BatchManager(_prepare, concurrency=1)
+    job_id = (await manager.submit_upload(_chunks(data)))["job_id"]
+    await _wait_for(lambda: len(fast.calls) == 3, timeout=0.4)  # while deepseek is still on its first line
+    assert len(provider.calls) == 1
+    await manager.cancel(job_id)
@@ -0,0 +1,74 @@
+# backend/tests/test_context.py
+#
+# Context compaction and local token counting (no network).
+
+import pytest
+from fastapi import HTTPException
+
+from backend.services.ai import context
+from backend.services.ai.context import ContextPolicy, compact_messages, count_tokens, token_budget
+
+MODEL = "deepseek-chat"
+
+
+def _history(turns: int, size: int) -> list[dict[str, str]]:
+    msgs = [{"role": "system", "content": "You are terse."}]
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        msgs.append({"role": role, "content": f"turn {i} " + "word " * size})
+    return msgs
+
+
+def test_count_tokens_scales_with_text():
+    short = count_tokens("hello world", MODEL)
+    long = count_tokens("hello world " * 100, MODEL)
+    assert 0 < short < long
+    assert count_tokens("", MODEL) == 0
+
+
+def test_none_policy_passes_through():
+    msgs = _history(10, 50)
+    out, stats = compact_messages(msgs, MODEL, ContextPolicy(policy="none"))
+    assert out == msgs
+    assert stats["tokens_before"] == stats["tokens_after"]
+
+
+def test_truncate_keeps_system_and_latest_within_budget():
+    msgs = _history(200, 200)
+    out, stats = compact_messages(msgs, MODEL, ContextPolicy(policy="truncate", max_tokens=2_000))
+    assert out[0] == msgs[0]
+    assert out[-1] == msgs[-1]
+    assert stats["tokens_after"] <= stats["budget"] == 2_000
+    assert stats["messages_after"] < stats["messages_before"] == len(msgs)
+
+
+def test_window_limits_message_count():
+    msgs = _history(20, 5)
+    out, stats = compact_messages(msgs, MODEL, ContextPolicy(policy="window", max_messages=4))
+    assert [m["role"] for m in out] == ["system"] + [m["role"] for m in msgs[-4:]]
+    assert stats["messages_after"] == 5
+
+
+def test_oversize_last_message_is_trimmed_to_tail():
+    msgs = [{"role": "user", "content": "start " + "x" * 50_000 + " end"}]
+    out, stats = compact_messages(msgs, MODEL, ContextPolicy(policy="truncate", max_tokens=500))
+    assert out[0]["content"].endswith(" end")
+    assert stats["tokens_after"] <= 500
+
+
+def test_system_prompt_over_the_budget_is_rejected():
+    msgs = [{"role": "system", "content": "rule " * 2_000}, {"role": "user", "content": "hi"}]
+    with pytest.raises(HTTPException) as exc:
+        compact_messages(msgs, MODEL, ContextPolicy(policy="truncate", max_tokens=500))
+    assert exc.value.status_code == 413
+
+
+def test_budget_reserves_output_tokens():
+    assert token_budget(MODEL) == 65_536 - 8_192
+    assert token_budget("unknown-model", max_tokens=100) == 100
+
+
+def test_count_memo_keeps_digests_not_texts():
+    text = "attachment body " * 100_000
+    assert count_tokens(text, MODEL) == count_tokens(text, MODEL)
+    assert all(len(digest) == 16 for digest, _ in context._count_cache)
@@ -0,0 +1,62 @@
+# backend/tests/test_fs_socket.py
+#
+# Multiplexed file-system operations over /frontend/fs/ws.
+
+from backend.services import fs_rpc
+
+
+def _collect(ws, count):
+    results, chunks = {}, {}
+    while len(results) < count:
+        msg = ws.receive_json()
+        if "chunk" in msg:
+            chunks.setdefault(msg["request_id"], []).append(msg["chunk"])
+        else:
+            results[msg["request_id"]] = msg
+    return results, chunks
+
+
+def test_operations_are_multiplexed(client):
+    with client.websocket_connect("/frontend/fs/ws") as ws:
+        ws.send_json({"request_id": 1, "op": "write", "mount": "userdata/", "path": "a/b.txt", "content": "hi"})
+        assert ws.receive_json()["result"]["message"].startswith("File 'a/b.txt'")
+        requests = [
+            {"request_id": 2, "op": "read", "mount": "userdata/", "path": "a/b.txt"},
+            {"request_id": 3, "op": "list", "mount": "userdata/", "path": "a/"},
+            {"request_id": 4, "op": "stat", "mount": "userdata/", "path": "a/b.txt"},
+            {"request_id": 5, "op": "read", "mount": "userdata/", "path": "missing.txt"},
+            {"request_id": 6, "op": "mkdir", "mount": "src/", "path": "x/"},
+            {"request_id": 7, "op": "chmod", "mount": "userdata/"},
+        ]
+        for req in requests:
+            ws.send_json(req)
+        results, _ = _collect(ws, len(requests))
+    assert results[2]["result"] == "hi"
+    assert results[3]["result"] == [{"name": "b.txt", "path": "userdata/a/b.txt", "isDirectory": False}]
+    assert results[4]["result"]["size"] == 2 and results[4]["result"]["isDirectory"] is False
+    assert [results[i]["status"] for i in (5, 6, 7)] == [404, 403, 422]
+
+
+def test_large_reads_stream_as_chunks(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(fs_rpc, "WS_READ_CHUNK_BYTES", 1000)
+    content = "ünïcødé line\n" * 400  # multi-byte characters straddle chunk boundaries
+    (tmp_path / "big.txt").write_text(content, encoding="utf-8")
+    with client.websocket_connect("/frontend/fs/ws") as ws:
+        ws.send_json({"request_id": 9, "op": "read", "mount": "userdata/", "path": "big.txt"})
+        results, chunks = _collect(ws, 1)
+    assert "".join(chunks[9]) == content
+    assert results[9]["result"] == {"size": len(content.encode("utf-8")), "chunks": len(chunks[9])}
+
+
+def test_reads_match_http_decoding(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(fs_rpc, "WS_READ_CHUNK_BYTES", 4)
+    (tmp_path / "crlf.txt").write_bytes(b"one\r\ntwo\rthree\r\n")
+    (tmp_path / "small.txt").write_bytes(b"a\r\n")
+    (tmp_path / "latin1.txt").write_bytes(b"caf\xe9 au lait")
+    with client.websocket_connect("/frontend/fs/ws") as ws:
+        for i, name in enumerate(("crlf.txt", "small.txt", "latin1.txt")):
+            ws.send_json({"request_id": i, "op": "read", "mount": "userdata/", "path": name})
+        results, chunks = _collect(ws, 3)
+    assert "".join(chunks[0]) == client.get("/frontend/fs/read?mount=userdata/&path=crlf.txt").json() == "one\ntwo\nthree\n"
+    assert results[1]["result"] == "a\n"
+    assert results[2]["status"] == 415
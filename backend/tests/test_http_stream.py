@@ -0,0 +1,127 @@
+# backend/tests/test_http_stream.py
+#
+# Streamed POST /frontend/ai/chat: SSE and NDJSON framing, heartbeats during upstream silence,
+# and closing the upstream when the client goes away.
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.routers import ai_router
+from backend.server import app
+from backend.services.ai import registry, streams
+
+
+class _Provider:
+    name = "deepseek"
+
+    def __init__(self):
+        self.first_delay = 0.0
+        self.delay = 0.0
+        self.tokens = 3
+        self.closed = False
+
+    async def chat(self, messages, *, stream=False, **opts):
+        async def gen():
+            try:
+                await asyncio.sleep(self.first_delay)
+                for i in range(self.tokens):
+                    yield {"text": str(i)}
+                    await asyncio.sleep(self.delay)
+                yield {"meta": {"latency": 0.0}}
+            finally:
+                self.closed = True
+        return gen()
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = _Provider()
+    monkeypatch.setitem(registry._PROVIDERS, "deepseek", provider)
+    return provider
+
+
+@pytest.fixture
+def client(provider):
+    with TestClient(app) as client:
+        yield client
+        client.portal.call(streams.stream_store.close)
+
+
+def _request(**extra):
+    return {"request_id": 7, "model": "deepseek-chat", "stream": True,
+            "messages": [{"role": "user", "content": "hi"}], **extra}
+
+
+def _sse_events(body):
+    frames = [frame for frame in body.split("\n\n") if frame]
+    return [(frame.split("\n")[0] if frame.startswith("id: ") else None, json.loads(frame.split("data: ", 1)[1]))
+            for frame in frames if "data: " in frame]
+
+
+def test_sse_frames_carry_seq_as_event_id(client):
+    resp = client.post("/frontend/ai/chat", json=_request(stream_id="http-sse-1"))
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(resp.text)
+    assert [event_id for event_id, _ in events] == ["id: 0", "id: 1", "id: 2", "id: 3"]
+    assert [ev.get("text") for _, ev in events[:3]] == ["0", "1", "2"]
+    assert all(ev["request_id"] == 7 for _, ev in events) and "meta" in events[-1][1]
+
+    # Resuming with Last-Event-ID replays only what came after it
+    resp = client.get("/frontend/ai/streams/http-sse-1", headers={"Last-Event-ID": "1"})
+    assert [event_id for event_id, _ in _sse_events(resp.text)] == ["id: 2", "id: 3"]
+
+    # Without a stream_id there is no seq and no id line
+    assert [event_id for event_id, _ in _sse_events(client.post("/frontend/ai/chat", json=_request()).text)] == [None] * 4
+
+
+def test_ndjson_is_selected_by_accept(client):
+    resp = client.post("/frontend/ai/chat", json=_request(), headers={"Accept": "application/x-ndjson"})
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in resp.text.splitlines()]
+    assert "".join(ev.get("text", "") for ev in events) == "012" and "meta" in events[-1]
+
+
+def test_heartbeats_fill_upstream_silence(client, provider, monkeypatch):
+    monkeypatch.setattr(ai_router, "STREAM_HEARTBEAT_SECONDS", 0.05)
+    provider.first_delay = 0.3
+    body = client.post("/frontend/ai/chat", json=_request()).text
+    assert body.startswith(": keep-alive\n\n") and body.count(": keep-alive") >= 2
+    assert len(_sse_events(body)) == 4
+
+    ndjson = client.post("/frontend/ai/chat", json=_request(), headers={"Accept": "application/x-ndjson"}).text
+    assert ndjson.startswith("\n") and [json.loads(line) for line in ndjson.splitlines() if line][0]["text"] == "0"
+
+
+async def test_client_disconnect_closes_the_upstream(provider):
+    # TestClient buffers whole responses, so drive the ASGI app directly and disconnect after the first event
+    provider.tokens, provider.delay = 1000, 0.01
+    sent = []
+    first_chunk = asyncio.Event()
+    body = json.dumps(_request()).encode()
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await first_chunk.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_chunk.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/frontend/ai/chat", "raw_path": b"/frontend/ai/chat",
+        "root_path": "", "query_string": b"", "server": ("test", 80), "client": ("test", 1234),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=5)
+    await asyncio.sleep(0.05)
+
+    chunks = [m for m in sent if m["type"] == "http.response.body" and m.get("body")]
+    assert provider.closed and len(chunks) < 100
@@ -0,0 +1,75 @@
+# backend/tests/test_line_index.py
+#
+# Line-range reads through the sparse index, incremental extension and rebuilds.
+
+import os
+
+import pytest
+
+from backend.services import line_index
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Tiny blocks so a few hundred lines span many index boundaries
+    monkeypatch.setattr(line_index, "BLOCK_SIZE", 64)
+    monkeypatch.setattr(line_index, "SCAN_CHUNK", 256)
+    line_index._cache.clear()
+
+
+def _write(path, lines, mode="w"):
+    with open(path, mode, newline="") as f:
+        f.write("".join(f"{line}\n" for line in lines))
+
+
+def test_ranges_match_splitlines(tmp_path, small_blocks):
+    path = str(tmp_path / "log.txt")
+    lines = [f"line {i} " + "x" * (i % 37) for i in range(500)]
+    _write(path, lines)
+    for start, count in ((0, 10), (123, 7), (490, 50), (499, 1), (500, 5)):
+        result = line_index.read_lines(path, start, count)
+        assert result["lines"] == lines[start:start + count]
+        assert result["total_lines"] == 500
+        assert result["next_line"] == min(start + count, 500)
+    assert line_index.tail_lines(path, 3)["lines"] == lines[-3:]
+
+
+def test_append_extends_and_rewrite_rebuilds(tmp_path, small_blocks):
+    path = str(tmp_path / "log.txt")
+    _write(path, [f"a{i}" for i in range(100)])
+    first = line_index.read_lines(path, 0, 1)
+    blocks = len(line_index._cache[path].block_lines)
+
+    with open(path, "a", newline="") as f:
+        f.write("partial")  # no newline yet
+    result = line_index.read_lines(path, 99, 5)
+    assert result["lines"] == ["a99", "partial"]
+    assert result["complete_lines"] == 100
+    assert line_index.read_lines(path, 100, 5, complete_only=True)["lines"] == []
+    assert len(line_index._cache[path].block_lines) >= blocks
+
+    _write(path, ["b0", "b1"])  # truncated and rewritten
+    os.utime(path, ns=(int(first["mtime"] * 1e9) + 10**9,) * 2)
+    result = line_index.read_lines(path, 0, 10)
+    assert result["lines"] == ["b0", "b1"] and result["total_lines"] == 2
+
+
+def test_crlf_and_overlong_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(line_index, "MAX_LINE_BYTES", 8)
+    path = str(tmp_path / "crlf.txt")
+    with open(path, "wb") as f:
+        f.write(b"one\r\n" + b"y" * 20 + b"\r\nthree")
+    result = line_index.read_lines(path, 0, 10)
+    assert result["lines"] == ["one", "y" * 8, "three"]
+    assert result["truncated"] is True
+
+
+def test_path_locks_do_not_outlive_reads(tmp_path):
+    paths = [str(tmp_path / f"{i}.txt") for i in range(5)]
+    for path in paths:
+        _write(path, ["x"])
+        line_index.read_lines(path, 0, 1)
+        line_index.invalidate(path)
+    _write(paths[0], [])
+    line_index.read_lines(paths[0], 0, 1)
+    assert not any(path in line_index._path_locks for path in paths)
@@ -0,0 +1,91 @@
+# backend/tests/test_logging_setup.py
+#
+# Request ids, JSON output, sampling and rate limiting of the logging pipeline.
+
+import io
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.services import logging_setup
+from backend.services.logging_setup import RateLimitFilter, RouteSamplingFilter, parse_sample_rates
+
+
+def _record(msg: str = "hello %s", lineno: int = 1) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.INFO, __file__, lineno, msg, ("world",), None)
+
+
+def test_request_id_reaches_json_lines():
+    stream = io.StringIO()
+    logging_setup.setup_logging(level="INFO", fmt="json", rate_limit=0, stream=stream)
+    app = FastAPI()
+    app.add_middleware(logging_setup.RequestContextMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        logging.getLogger("test.ping").info("pong for %s", "client")
+        return {}
+
+    try:
+        resp = TestClient(app).get("/ping", headers={"X-Request-ID": "abc123"})
+        assert resp.headers["x-request-id"] == "abc123"
+        generated = TestClient(app).get("/ping").headers["x-request-id"]
+    finally:
+        logging_setup.shutdown_logging()  # drains the writer thread
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    pings = [line for line in lines if line["logger"] == "test.ping"]
+    assert [p["request_id"] for p in pings] == ["abc123", generated]
+    assert pings[0]["msg"] == "pong for client" and pings[0]["route"] == "/ping"
+
+
+def test_route_sampling():
+    sampler = RouteSamplingFilter(parse_sample_rates("/frontend/=1,/frontend/echo/=0"))
+    token = logging_setup.route_var.set("/frontend/echo/")
+    try:
+        assert not sampler.filter(_record())
+        warning = _record()
+        warning.levelno = logging.WARNING
+        assert sampler.filter(warning)
+    finally:
+        logging_setup.route_var.reset(token)
+    token = logging_setup.route_var.set("/frontend/fs/read")
+    try:
+        assert sampler.filter(_record())
+    finally:
+        logging_setup.route_var.reset(token)
+
+
+def test_rate_limit_per_call_site_reports_suppressed():
+    limiter = RateLimitFilter(rate=2)
+    passed = [limiter.filter(_record(lineno=10)) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert limiter.filter(_record(lineno=11))  # other call sites have their own budget
+    bucket = limiter._buckets[("test", __file__, 10)]
+    bucket[0] = 1.0  # refill
+    record = _record(lineno=10)
+    assert limiter.filter(record) and record.suppressed == 3
+
+
+def test_warnings_are_never_rate_limited():
+    limiter = RateLimitFilter(rate=1)
+    warnings = [_record(lineno=20) for _ in range(3)]
+    for record in warnings:
+        record.levelno = logging.WARNING
+    assert all(limiter.filter(record) for record in warnings)
+
+
+def test_full_queue_drops_and_reports():
+    log_queue = logging_setup.BoundedLogQueue(2)
+    for i in range(5):
+        log_queue.put_nowait(_record(lineno=i))
+    assert log_queue.qsize() == 2 and log_queue.dropped == 3
+
+    stream = io.StringIO()
+    writer = logging_setup.QueueWriter(log_queue, logging.Formatter("%(message)s"), stream)
+    writer.start()
+    writer.stop()
+    assert stream.getvalue().splitlines() == ["hello world", "hello world", "3 log records dropped: the writer fell behind"]
+    assert log_queue.take_dropped() == 0
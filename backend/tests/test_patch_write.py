@@ -0,0 +1,106 @@
+# backend/tests/test_patch_write.py
+#
+# Patch writes: range edits and unified diffs against an ETag, with optimistic concurrency.
+
+import difflib
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from backend.services import file_operations, shared_state, text_patch
+
+
+def _read(client, path):
+    resp = client.get("/frontend/fs/read", params={"mount": "userdata/", "path": path})
+    assert resp.status_code == 200
+    return resp.json(), resp.headers["etag"]
+
+
+def test_edits_apply_against_the_etag_and_stale_bases_conflict(client, tmp_path):
+    (tmp_path / "doc.md").write_text("hello world\nsecond line\n")
+    _, etag = _read(client, "doc.md")
+
+    edit = {"mount": "userdata/", "path": "doc.md", "base_etag": etag,
+            "edits": [{"start": 0, "end": 5, "text": "HELLO"}, {"start": 12, "end": 12, "text": "🙂 "}]}
+    resp = client.post("/frontend/fs/patch", json=edit)
+    assert resp.status_code == 200
+    new_etag = resp.json()["etag"]
+    assert resp.headers["etag"] == f'"{new_etag}"'
+    assert (tmp_path / "doc.md").read_text(encoding="utf-8") == "HELLO world\n🙂 second line\n"
+    assert _read(client, "doc.md")[1] == f'"{new_etag}"'
+
+    # The same patch again is against an outdated version
+    resp = client.post("/frontend/fs/patch", json=edit)
+    assert resp.status_code == 409
+    assert resp.headers["etag"] == f'"{new_etag}"'
+    assert (tmp_path / "doc.md").read_text(encoding="utf-8") == "HELLO world\n🙂 second line\n"
+
+    assert client.post("/frontend/fs/patch", json={**edit, "base_etag": None}).status_code == 428
+    overlapping = {**edit, "base_etag": new_etag, "edits": [{"start": 3, "end": 6, "text": ""}, {"start": 4, "end": 4}]}
+    assert client.post("/frontend/fs/patch", json=overlapping).status_code == 400
+
+
+def test_unified_diff_with_if_match(client, tmp_path):
+    old = "".join(f"line {i}\n" for i in range(50))
+    new = old.replace("line 10\n", "line ten\n").replace("line 40\n", "") + "tail without newline"
+    (tmp_path / "big.txt").write_text(old)
+    _, etag = _read(client, "big.txt")
+    diff = "".join(difflib.unified_diff(old.splitlines(True), new.splitlines(True), "a/big.txt", "b/big.txt"))
+    if not diff.endswith("\n"):
+        diff += "\n\\ No newline at end of file\n"
+
+    resp = client.post("/frontend/fs/patch", json={"mount": "userdata/", "path": "big.txt", "diff": diff},
+                       headers={"If-Match": etag})
+    assert resp.status_code == 200, resp.text
+    assert (tmp_path / "big.txt").read_text() == new
+
+
+def test_unified_diff_must_match_the_base():
+    with pytest.raises(HTTPException) as exc:
+        text_patch.apply_unified_diff("a\nb\n", "@@ -1,2 +1,2 @@\n a\n-x\n+y\n")
+    assert exc.value.status_code == 400 and "line 2" in exc.value.detail
+    assert text_patch.apply_unified_diff("", "@@ -0,0 +1 @@\n+new\n") == "new\n"
+    assert text_patch.apply_edits("abc", [(1, 2, "XY")]) == "aXYc"
+
+
+def test_write_locks_are_shared_while_held_and_then_dropped(client):
+    for i in range(50):
+        assert client.post("/frontend/fs/write", json={"mount": "userdata/", "path": f"f{i}.txt", "content": "x"}).status_code == 201
+    assert len(file_operations._write_locks) == 0
+
+    with file_operations._write_lock("/some/file") as held:
+        assert file_operations._write_lock("/some/file") is held
+    del held
+    assert "/some/file" not in file_operations._write_locks
+
+
+def test_writes_replace_the_file_atomically(client, tmp_path):
+    path = tmp_path / "w.txt"
+    assert client.post("/frontend/fs/write", json={"mount": "userdata/", "path": "w.txt", "content": "one"}).status_code == 201
+    assert path.stat().st_mode & 0o777 == 0o666 & ~file_operations._UMASK
+    with open(path, "rb") as reader:  # a reader that opened the old version keeps reading all of it
+        assert client.post("/frontend/fs/write", json={"mount": "userdata/", "path": "w.txt", "content": "two"}).status_code == 201
+        assert reader.read() == b"one"
+    assert path.read_text() == "two"
+    assert [p.name for p in tmp_path.iterdir()] == ["w.txt"]
+
+
+def test_writes_wait_for_other_workers_holding_the_path(client, tmp_path, monkeypatch):
+    db = str(tmp_path / "state.sqlite3")
+    monkeypatch.setattr(shared_state, "_instance", shared_state.SQLiteState(path=db))
+    other = shared_state.SQLiteState(path=db)  # another worker on the same state file
+    done = threading.Event()
+
+    def write():
+        file_operations.perform_write_file("userdata/", "locked.txt", "mine")
+        done.set()
+
+    with other.lock(f"write:{file_operations.resolve_path('userdata/', 'locked.txt')[0]}"):
+        writer = threading.Thread(target=write)
+        writer.start()
+        assert not done.wait(0.2)
+    writer.join(5)
+    assert done.is_set() and (tmp_path / "locked.txt").read_text() == "mine"
+    other.close()
+    shared_state._instance.close()
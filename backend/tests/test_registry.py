@@ -0,0 +1,13 @@
+# backend/tests/test_registry.py
+#
+# Provider discovery: modules that declare PROVIDER are registered, helper modules are not.
+
+from backend.services.ai import deepseek, gemini, openai, registry
+
+
+def test_only_modules_with_a_provider_marker_are_registered():
+    providers = registry.list_providers()
+    assert {name: type(prov) for name, prov in providers.items()} == {
+        "deepseek": deepseek.DeepSeek, "openai": openai.OpenAI, "gemini": gemini.Gemini,
+    }
+    assert registry.get_provider("gpt-4o") is providers["openai"]
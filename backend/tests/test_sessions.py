@@ -0,0 +1,122 @@
+# backend/tests/test_sessions.py
+#
+# Server-side chat sessions: LRU eviction under caps, per-session locking, disk persistence and
+# sharing between workers.
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from backend.services.ai.sessions import SessionStore
+from backend.services.shared_state import SQLiteState
+
+
+def _turn(text):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": text.upper()}]
+
+
+async def test_evicted_session_without_persistence_is_gone():
+    store = SessionStore(max_bytes=1000, max_sessions=2, mount=None)
+    for session_id in ("a", "b", "c"):
+        await store.append(await store.open(session_id), _turn(session_id * 10))
+    assert store.stats()["sessions"] == 2
+
+    for call in (store.open, store.get):
+        with pytest.raises(HTTPException) as exc:
+            await call("a")
+        assert exc.value.status_code == 410
+    assert (await store.get("c")).messages == _turn("c" * 10)
+
+    await store.append(await store.open("d"), _turn("x" * 2000))  # over the byte cap: others go
+    assert store.stats()["sessions"] == 1 and store.stats()["bytes"] == 4000
+
+    assert await store.delete("a")  # forgets the evicted id, which can then start over
+    assert (await store.open("a")).messages == []
+
+
+async def test_sessions_mid_turn_are_not_evicted():
+    store = SessionStore(max_bytes=10_000, max_sessions=1, mount=None)
+    busy = await store.open("busy")
+    async with busy.lock:
+        await store.open("other")
+        assert await store.get("busy") is busy
+    await store.open("third")  # the lock is free again
+    with pytest.raises(HTTPException):
+        await store.get("busy")
+
+
+async def test_sessions_are_persisted_and_reloaded(userdata):
+    store = SessionStore(max_bytes=10_000, max_sessions=1, mount="userdata/")
+    session = await store.open("kept")
+    session.system_prompt = "Be brief."
+    await store.append(session, _turn("first"))
+    await store.open("other")  # evicts "kept" from memory
+    assert (userdata / ".sessions" / "kept.json").is_file()
+
+    reloaded = await store.open("kept")
+    assert reloaded is not session and reloaded.messages == _turn("first")
+    assert (await SessionStore(mount="userdata/").get("kept")).system_prompt == "Be brief."
+
+    assert await store.delete("kept")
+    assert not (userdata / ".sessions" / "kept.json").exists()
+    assert await store.get("kept") is None and not await store.delete("kept")
+
+
+async def test_a_turn_waiting_for_the_lock_keeps_its_session():
+    store = SessionStore(max_bytes=10_000, max_sessions=1, mount=None)
+
+    async def second_turn():
+        async with store.hold("s") as session:
+            await store.append(session, _turn("second"))
+
+    async with store.hold("s") as session:
+        waiter = asyncio.create_task(second_turn())
+        await asyncio.sleep(0.01)  # queued on the lock
+        await store.append(session, _turn("first"))
+    await store.open("other")  # the lock is free but the waiter has not resumed yet
+    await waiter
+    assert (await store.get("s")).messages == _turn("first") + _turn("second")
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two session stores over one SQLite file, as two worker processes would have."""
+    states = [SQLiteState(path=str(tmp_path / "state.sqlite3")) for _ in range(2)]
+    yield [SessionStore(mount=None, state=state) for state in states]
+    for state in states:
+        state.close()
+
+
+async def test_sessions_are_shared_between_workers(workers):
+    a, b = workers
+    async with a.hold("s") as session:
+        session.system_prompt = "Be brief."
+        await a.append(session, _turn("first"))
+    async with b.hold("s") as session:  # b has never seen "s"
+        assert session.messages == _turn("first") and session.system_prompt == "Be brief."
+        await b.append(session, _turn("second"))
+    async with a.hold("s") as session:  # a's cached copy is caught up
+        assert session.messages == _turn("first") + _turn("second")
+
+    assert await b.delete("s")
+    assert await a.get("s") is None
+    async with a.hold("s") as session:  # starts over rather than resurrecting a's cached history
+        assert session.messages == []
+
+
+async def test_turns_are_serialised_across_workers(workers):
+    a, b = workers
+    order = []
+
+    async def turn(store, text):
+        async with store.hold("s") as session:
+            order.append(f"{text} start")
+            await asyncio.sleep(0.05)
+            await store.append(session, _turn(text))
+            order.append(f"{text} end")
+
+    await asyncio.gather(turn(a, "one"), turn(b, "two"))
+    assert order in (["one start", "one end", "two start", "two end"],
+                     ["two start", "two end", "one start", "one end"])
+    assert len((await a.get("s")).messages) == 4
@@ -0,0 +1,104 @@
+# backend/tests/test_shared_state.py
+#
+# Shared state backends: counters, TTLs and pub/sub, in memory and in SQLite (also across processes).
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from backend.services import shared_state
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        backend = shared_state.MemoryState()
+    else:
+        backend = shared_state.SQLiteState(path=str(tmp_path / "state.sqlite3"))
+    yield backend
+    backend.close()
+
+
+def test_incr_and_ttl(state):
+    assert [state.incr("hits", ttl=0.2) for _ in range(3)] == [1, 2, 3]
+    assert state.incr("hits", amount=5) == 8
+    state.set("config", {"a": [1, 2]})
+    assert state.get("config") == {"a": [1, 2]}
+
+    time.sleep(0.3)
+    assert state.get("hits") is None
+    assert state.incr("hits", ttl=0.2) == 1  # a new window starts
+    assert state.get("config") == {"a": [1, 2]}  # no TTL
+    state.delete("config")
+    assert state.get("config") is None
+
+
+def test_update_is_compare_and_set(state):
+    assert state.update("owner", lambda current: current or "a", ttl=0.2) == "a"
+    assert state.update("owner", lambda current: current or "b", ttl=60) == "a"  # taken; TTL not renewed
+    state.update("list", lambda current: (current or []) + [1])
+    assert state.update("list", lambda current: current + [2]) == [1, 2]
+    assert state.update("list", lambda current: None) is None and state.get("list") is None
+
+    time.sleep(0.3)
+    assert state.update("owner", lambda current: current or "b") == "b"
+
+
+def test_publish_and_poll(state):
+    first = state.publish("fs", {"path": "a.txt"})
+    state.publish("other", "ignored")
+    second = state.publish("fs", {"path": "b.txt"})
+    assert state.poll("fs") == [(first, {"path": "a.txt"}), (second, {"path": "b.txt"})]
+    assert state.poll("fs", after_id=first) == [(second, {"path": "b.txt"})]
+    assert state.poll("fs", after_id=second) == []
+    assert len(state.poll("fs", limit=1)) == 1
+
+
+def test_lock_excludes_other_workers(state, tmp_path):
+    # A second SQLiteState on the same file stands in for another worker
+    other = shared_state.SQLiteState(path=state.path) if state.cross_process else state
+    entered = threading.Event()
+
+    def take():
+        with other.lock("write:/a"):
+            entered.set()
+
+    with state.lock("write:/a"):
+        waiter = threading.Thread(target=take)
+        waiter.start()
+        assert not entered.wait(0.2)
+    waiter.join(5)
+    assert entered.is_set()
+    if other is not state:
+        other.close()
+
+
+def test_backends_implement_the_whole_interface():
+    class Partial(shared_state.SharedState):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def _incr_many(path, count):
+    backend = shared_state.SQLiteState(path=path)
+    for _ in range(count):
+        backend.incr("shared")
+    backend.close()
+
+
+def test_sqlite_incr_is_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    shared_state.SQLiteState(path=path).close()  # create the schema once
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_incr_many, args=(path, 50)) for _ in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(60)
+        assert proc.exitcode == 0
+    assert shared_state.SQLiteState(path=path).get("shared") == 200
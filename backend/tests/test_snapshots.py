@@ -0,0 +1,152 @@
+# backend/tests/test_snapshots.py
+#
+# Snapshots: deduplicated version history of userdata/ files, streamed reads, restore and garbage collection.
+
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.services import file_operations, snapshots
+
+
+@pytest.fixture
+def store(userdata, tmp_path_factory, monkeypatch):
+    root = tmp_path_factory.mktemp("snapshots")
+    monkeypatch.setattr(snapshots, "SNAPSHOT_ROOT", str(root))
+    monkeypatch.setattr(snapshots, "SNAPSHOT_BURST_SECONDS", 0)
+    return root
+
+
+def _object_bytes(root):
+    return sum(f.stat().st_size for f in (root / "objects").rglob("*") if f.is_file())
+
+
+def _document(lines):
+    return "".join(f"{i:06d} some words that make up a line of an ordinary text document\n" for i in range(lines))
+
+
+def test_storage_grows_with_changed_bytes(store):
+    text = _document(20000)  # ~1.5 MB
+    file_operations.perform_write_file("userdata/", "big.md", text)
+    first = _object_bytes(store)
+    manifest = next((store / "manifests").rglob("*.jsonl"))
+    manifest_size = manifest.stat().st_size
+
+    for i in range(5):
+        text = text.replace(f"{i * 3000:06d} some", f"{i * 3000:06d} edited", 1)
+        file_operations.perform_write_file("userdata/", "big.md", text)
+    file_operations.perform_write_file("userdata/", "copy.md", text)  # another file with the same content
+
+    assert len(file_operations.perform_list_versions("userdata/", "big.md")) == 6
+    assert _object_bytes(store) - first < 5 * 16 * 1024  # a few chunks per edit, nothing for the copy
+    assert manifest.stat().st_size - manifest_size < 5 * 1024
+    assert snapshots.read_version("userdata/big.md", 1) == _document(20000).encode()
+
+    # Rechunking after an edit reuses the chunks around it and still covers the new data exactly
+    old = _document(20000).encode()
+    new = old[:700000] + b"inserted line\n" + old[700000:]
+    spans = snapshots.chunk_spans(old)
+    pieces = snapshots.rechunk(new, old, spans, [str(i) for i in range(len(spans))])
+    assert [start for start, _, _ in pieces[1:]] == [end for _, end, _ in pieces[:-1]] and pieces[-1][1] == len(new)
+    assert sum(digest is None for _, _, digest in pieces) <= 2
+
+    spans = snapshots.chunk_spans(b"x" * 200000)  # no newlines at all
+    assert max(end - start for start, end in spans) == snapshots.CHUNK_MAX_BYTES and spans[-1][1] == 200000
+
+
+def test_versions_read_restore_and_delete(client, store, userdata):
+    (userdata / "doc.md").write_text("v1\n")  # written outside the API, captured before the first write
+    assert client.post("/frontend/fs/write", json={"mount": "userdata/", "path": "doc.md", "content": "v2\n"}).status_code == 201
+    assert client.delete("/frontend/fs/delete", params={"mount": "userdata/", "path": "doc.md"}).status_code == 200
+
+    versions = client.get("/frontend/fs/versions", params={"mount": "userdata/", "path": "doc.md"}).json()
+    assert [(v["v"], v["op"]) for v in versions] == [(1, "external"), (2, "write"), (3, "delete")]
+    resp = client.get("/frontend/fs/version", params={"mount": "userdata/", "path": "doc.md", "version": 1})
+    assert resp.content == b"v1\n"
+    assert client.get("/frontend/fs/version", params={"mount": "userdata/", "path": "doc.md", "version": 3}).status_code == 400
+    assert client.get("/frontend/fs/version", params={"mount": "userdata/", "path": "doc.md", "version": 9}).status_code == 404
+
+    resp = client.post("/frontend/fs/restore", json={"mount": "userdata/", "path": "doc.md", "version": 2})
+    assert resp.status_code == 200 and resp.json()["version"] == 4
+    assert (userdata / "doc.md").read_text() == "v2\n"
+    assert resp.headers["etag"] == client.get("/frontend/fs/read", params={"mount": "userdata/", "path": "doc.md"}).headers["etag"]
+
+
+def test_gc_applies_retention_and_sweeps_unreferenced_chunks(client, store, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_KEEP_VERSIONS", 2)
+    for i in range(4):
+        file_operations.perform_write_file("userdata/", "a.md", _document(500 * (i + 1)))
+    file_operations.perform_write_file("userdata/", "gone.md", "temporary\n")
+    file_operations.perform_delete_file("userdata/", "gone.md")
+
+    stats = client.post("/frontend/fs/snapshots/gc").json()
+    assert stats["versions_removed"] == 2 and stats["objects_removed"] > 0
+    assert [v["v"] for v in file_operations.perform_list_versions("userdata/", "a.md")] == [3, 4]
+    assert snapshots.read_version("userdata/a.md", 3) == _document(1500).encode()
+
+    # A deletion older than the age limit drops the path's history
+    stats = snapshots.gc(now=time.time() + snapshots.SNAPSHOT_KEEP_DAYS * 86400 + 60)
+    assert file_operations.perform_list_versions("userdata/", "gone.md") == []
+    assert [v["v"] for v in file_operations.perform_list_versions("userdata/", "a.md")] == [4]
+    assert stats["paths"] == 1 and len(list((store / "manifests").rglob("*.jsonl"))) == 1
+
+
+def test_autosave_bursts_keep_one_version_per_window(store, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_BURST_SECONDS", 60.0)  # the default
+    clock = [1_700_000_000.0]
+    monkeypatch.setattr(snapshots, "time", SimpleNamespace(time=lambda: clock[0]))
+    for i in range(117):  # an hour of autosaves every 30 s; the 117th save triggers retention
+        file_operations.perform_write_file("userdata/", "draft.md", f"draft {i}\n")
+        clock[0] += 30
+
+    kept = [v["time"] for v in file_operations.perform_list_versions("userdata/", "draft.md")]
+    assert len(kept) >= 58 and kept[-1] == clock[0] - 30
+    assert max(b - a for a, b in zip(kept, kept[1:])) <= 60
+    assert snapshots.gc(now=clock[0])["versions_removed"] == 0  # retention is stable
+
+
+def test_versions_recorded_by_another_process_are_seen(store):
+    key = "userdata/shared.md"
+    assert snapshots.record(key, "write", b"one\n", "e1") == 1
+    script = ("import sys; from backend.services import snapshots; "
+              "print(snapshots.record(sys.argv[1], 'write', b'two\\n', 'e2'))")
+    env = {**os.environ, "GENESIS_SNAPSHOT_ROOT": str(store)}
+    out = subprocess.run([sys.executable, "-c", script, key], env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "2"
+
+    assert snapshots.record(key, "write", b"three\n", "e3") == 3
+    assert [snapshots.read_version(key, v) for v in (1, 2, 3)] == [b"one\n", b"two\n", b"three\n"]
+
+
+def test_in_flight_reads_are_pinned_against_gc(store, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_KEEP_VERSIONS", 1)
+    first = _document(2000)
+    file_operations.perform_write_file("userdata/", "r.md", first)
+    chunks, size = snapshots.open_version("userdata/r.md", 1)
+    head = next(chunks)
+    file_operations.perform_write_file("userdata/", "r.md", "replaced\n")
+    assert snapshots.gc()["versions_removed"] == 1
+    assert head + b"".join(chunks) == first.encode() and size == len(first)
+
+    assert snapshots.gc()["objects_removed"] > 0  # unpinned once the read finished
+    assert list((store / "reading").iterdir()) == []
+
+
+def test_missing_objects_fail_before_streaming(store):
+    file_operations.perform_write_file("userdata/", "m.md", _document(2000))
+    victim = next(f for f in (store / "objects").rglob("*") if f.is_file())
+    victim.unlink()
+    with pytest.raises(file_operations.HTTPException) as exc:
+        snapshots.open_version("userdata/m.md", 1)
+    assert exc.value.status_code == 500 and "missing" in exc.value.detail
+
+    (store / "reading").mkdir()
+    old = store / "reading" / "stale.json"
+    old.write_text('["' + "0" * 64 + '"]')
+    os.utime(old, (0, 0))
+    snapshots.gc()
+    assert not old.exists()
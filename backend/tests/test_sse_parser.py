@@ -0,0 +1,40 @@
+# backend/tests/test_sse_parser.py
+#
+# Incremental SSE framing must not depend on where the socket splits chunks.
+
+import pytest
+
+from backend.services.ai.openai_compat import SSEParser
+
+STREAM = (
+    ": keep-alive\r\n\r\n"
+    'data: {"choices": [{"delta": {"content": "héllo"}}]}\r\n\r\n'
+    "event: note\ndata: line one\ndata:line two\n\n\n\n"
+    "data: [DONE]\n\n"
+).encode()
+
+EXPECTED = [
+    '{"choices": [{"delta": {"content": "héllo"}}]}',
+    "line one\nline two",
+    "[DONE]",
+]
+
+
+def _parse(body: bytes, chunk_size: int) -> list[str]:
+    parser = SSEParser()
+    events = []
+    for i in range(0, len(body), chunk_size):
+        events += parser.feed(body[i:i + chunk_size])
+    return events + parser.flush()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, len(STREAM)])
+def test_events_independent_of_chunking(chunk_size):
+    assert _parse(STREAM, chunk_size) == EXPECTED
+
+
+def test_flush_returns_unterminated_event():
+    parser = SSEParser()
+    assert parser.feed(b"data: partial") == []
+    assert parser.flush() == ["partial"]
+    assert parser.flush() == []
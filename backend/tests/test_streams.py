@@ -0,0 +1,159 @@
+# backend/tests/test_streams.py
+# Resumable chat streams: sequencing, replay after a reconnect, grace-period cancellation, byte caps
+# and resuming on another worker.
+
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from backend.server import app
+from backend.services.ai import registry, streams
+from backend.services.shared_state import SQLiteState
+
+
+class _SlowProvider:
+    name = "deepseek"
+
+    async def chat(self, messages, *, stream=False, **opts):
+        async def gen():
+            for i in range(10):
+                await asyncio.sleep(0.05)
+                yield {"text": str(i)}
+            yield {"meta": {"latency": 0.5}}
+        return gen()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(registry._PROVIDERS, "deepseek", _SlowProvider())
+    with TestClient(app) as client:  # one event loop for all connections, like a real server
+        yield client
+        client.portal.call(streams.stream_store.close)
+
+
+def _request(stream_id):
+    return {"request_id": 0, "model": "deepseek-chat", "stream": True, "stream_id": stream_id,
+            "messages": [{"role": "user", "content": "hi"}]}
+
+
+def _receive_until_done(ws):
+    events = []
+    while not events or not ({"meta", "error"} & events[-1].keys()):
+        events.append(ws.receive_json())
+    return events
+
+
+def test_resume_after_reconnect_replays_only_missed_events(client):
+    with client.websocket_connect("/frontend/ws/chat") as ws:
+        ws.send_json(_request("resume-1"))
+        first = [ws.receive_json() for _ in range(3)]
+    assert [e["seq"] for e in first] == [0, 1, 2]
+
+    time.sleep(0.3)  # generation continues while nobody is connected
+    with client.websocket_connect("/frontend/ws/chat") as ws:
+        ws.send_json({"request_id": 5, "stream_id": "resume-1", "last_seq": 2})
+        rest = _receive_until_done(ws)
+
+    assert all(e["request_id"] == 5 for e in rest)
+    assert "".join(e["text"] for e in first + rest if "text" in e) == "0123456789"
+    assert rest[0]["seq"] > 3  # the backlog arrives coalesced
+    assert rest[-1]["seq"] == 10 and "meta" in rest[-1]
+
+    # A finished stream can still be read over HTTP, with the seq as the SSE event id
+    body = client.get("/frontend/ai/streams/resume-1", headers={"Last-Event-ID": "9"}).text
+    assert body.startswith("id: 10\n") and '"meta"' in body
+
+
+def test_unknown_stream_and_duplicate_id(client):
+    with client.websocket_connect("/frontend/ws/chat") as ws:
+        ws.send_json({"request_id": 1, "stream_id": "missing-1", "last_seq": 0})
+        assert ws.receive_json() == {"request_id": 1, "error": "Unknown or expired stream: missing-1", "status": 404}
+        ws.send_json(_request("dup-id-1"))
+        ws.receive_json()
+        ws.send_json({**_request("dup-id-1"), "request_id": 2})
+        reply = ws.receive_json()
+        while reply["request_id"] != 2:
+            reply = ws.receive_json()
+        assert "already in use" in reply["error"]
+
+
+def test_producer_is_cancelled_when_nobody_resumes(client, monkeypatch):
+    monkeypatch.setattr(streams, "STREAM_GRACE_SECONDS", 0.05)
+    with client.websocket_connect("/frontend/ws/chat") as ws:
+        ws.send_json(_request("grace-1"))
+        ws.receive_json()
+    time.sleep(0.3)
+    log = streams.stream_store.get("grace-1")
+    assert log.done and log.next_seq < 11
+    with client.websocket_connect("/frontend/ws/chat") as ws:
+        ws.send_json({"request_id": 0, "stream_id": "grace-1", "last_seq": 0})
+        assert _receive_until_done(ws)[-1]["error"] == "Generation cancelled"
+
+
+async def test_log_drops_oldest_events_over_the_stream_cap(monkeypatch):
+    monkeypatch.setattr(streams, "STREAM_LOG_MAX_STREAM_BYTES", 1000)
+    store = streams.StreamStore()
+    log = streams.StreamLog("cap-test-1", store)
+    for _ in range(20):
+        log.append({"text": "x" * 100})
+    assert log.size <= 1000 and log.first_seq > 0 and store.stats()["bytes"] == log.size
+    with pytest.raises(HTTPException) as exc:
+        log.since(0)
+    assert exc.value.status_code == 410
+    assert [seq for seq, _ in log.since(log.first_seq - 1)][0] == log.first_seq
+
+
+def test_coalesce_merges_token_runs_only():
+    events = [(0, {"thinking": "a"}), (1, {"thinking": "b"}), (2, {"text": "c"}), (3, {"text": "d"}),
+              (4, {"meta": {}})]
+    assert streams.coalesce(events) == [(1, {"thinking": "ab"}), (3, {"text": "cd"}), (4, {"meta": {}})]
+
+
+@pytest.fixture
+async def workers(tmp_path, monkeypatch):
+    """Two stream stores over one SQLite file, as two worker processes would have."""
+    monkeypatch.setattr(streams, "STREAM_SHARED_CHECK_SECONDS", 0.02)
+    monkeypatch.setattr(streams, "STREAM_SHARED_POLL_SECONDS", 0.01)
+    states = [SQLiteState(path=str(tmp_path / "state.sqlite3")) for _ in range(2)]
+    stores = [streams.StreamStore(state=state) for state in states]
+    yield stores
+    for store in stores:
+        await store.close()
+    for state in states:
+        state.close()
+
+
+async def _tokens(count, delay=0.02):
+    for i in range(count):
+        await asyncio.sleep(delay)
+        yield {"text": str(i)}
+    yield {"meta": {}}
+
+
+async def test_streams_resume_and_cancel_on_another_worker(workers, monkeypatch):
+    a, b = workers
+    monkeypatch.setattr(streams, "STREAM_GRACE_SECONDS", 0.1)
+    await a.start("remote-1", _tokens(10))
+    with pytest.raises(HTTPException) as exc:
+        await b.start("remote-1", _tokens(1))
+    assert exc.value.status_code == 409
+
+    # Followed from b for longer than the grace period: a keeps generating
+    log = await b.find("remote-1")
+    events = [item async for item in log.follow(-1)]
+    assert "".join(e.get("text", "") for _, e in events) == "0123456789" and "meta" in events[-1][1]
+    assert [seq for seq, _ in events][-1] == 10
+
+    await a.start("remote-2", _tokens(100))
+    await asyncio.sleep(0.05)
+    await b.cancel("remote-2")
+    await asyncio.sleep(0.2)
+    assert a.get("remote-2").done
+    assert [e async for _, e in (await b.find("remote-2")).follow(-1)][-1] == {"error": "Generation cancelled"}
+
+    with pytest.raises(HTTPException) as exc:
+        await b.find("remote-3")
+    assert exc.value.status_code == 404
@@ -0,0 +1,62 @@
+# backend/tests/test_ws_codec.py
+#
+# Tagged MessagePack frames and subprotocol negotiation on the chat socket.
+
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from backend.services import ws_codec
+
+
+def _pure_roundtrip(obj):
+    out = bytearray()
+    ws_codec._pack_into(obj, out)
+    value, end = ws_codec._unpack_from(bytes(out), 0)
+    assert end == len(out)
+    return bytes(out), value
+
+
+@pytest.mark.parametrize("value", [
+    None, True, False, 0, 127, 128, 65536, 2**40, -1, -33, -2**40, 1.25, "", "héllo", "x" * 300,
+    b"\x00\xff", [1, [2, {"a": None}]], {str(i): i for i in range(20)},
+])
+def test_pure_python_codec_roundtrip(value):
+    packed, decoded = _pure_roundtrip(value)
+    assert decoded == value
+    if ws_codec._msgpack is not None:
+        assert packed == ws_codec._msgpack.packb(value, use_bin_type=True)
+
+
+def test_event_frames():
+    assert ws_codec.to_frame({"request_id": 3, "text": "hel"}) == [ws_codec.TAG_TEXT, 3, "hel"]
+    assert ws_codec.to_frame({"error": "boom"}) == [ws_codec.TAG_ERROR, None, "boom"]
+    reply = {"request_id": 1, "text": "hi", "meta": {"latency": 0.1}}
+    assert ws_codec.to_frame(reply)[0] == ws_codec.TAG_MESSAGE
+    sequenced = {"request_id": 3, "text": "hel", "seq": 41}
+    assert ws_codec.to_frame(sequenced) == [ws_codec.TAG_TEXT, 3, "hel", 41]
+    for event in ({"request_id": 3, "text": "hel"}, {"error": "boom"}, reply, sequenced, {**reply, "seq": 7}):
+        assert ws_codec.from_frame(ws_codec.unpackb(ws_codec.packb(ws_codec.to_frame(event)))) == event
+    with pytest.raises(ValueError):
+        ws_codec.from_frame([99, 1, "x"])
+
+
+def test_negotiation_falls_back_to_json():
+    app = FastAPI()
+
+    @app.websocket("/echo")
+    async def echo(ws: WebSocket):
+        codec = ws_codec.negotiate(ws)
+        await ws.accept(subprotocol=codec.subprotocol)
+        await codec.send(ws, await codec.receive(ws))
+        await ws.close()
+
+    client = TestClient(app)
+    with client.websocket_connect("/echo", subprotocols=[ws_codec.MSGPACK_SUBPROTOCOL]) as ws:
+        assert ws.accepted_subprotocol == ws_codec.MSGPACK_SUBPROTOCOL
+        ws.send_bytes(ws_codec.packb([ws_codec.TAG_MESSAGE, 5, {"model": "m"}]))
+        assert ws_codec.unpackb(ws.receive_bytes()) == [ws_codec.TAG_MESSAGE, 5, {"model": "m"}]
+    with client.websocket_connect("/echo") as ws:
+        assert ws.accepted_subprotocol is None
+        ws.send_json({"request_id": 5, "text": "hi"})
+        assert ws.receive_json() == {"request_id": 5, "text": "hi"}
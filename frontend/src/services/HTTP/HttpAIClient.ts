@@ -1,4 +1,5 @@
 import { get, post } from './HttpClient';
+import type { ChatAttachment } from '../WS/WsAiClient';
 
 // Define the base path for AI operations
 const AI_PATH = '/frontend/ai';
@@ -10,6 +11,7 @@ export interface Message {
   role: string; // 'user' or 'assistant'
   content: string;
   thinkingLog?: string; // Optional field for saved thinking process
+  attachments?: ChatAttachment[]; // Files the server injects into this message
 }
 
 // Request structure for generate_response (now targeting /chat)
@@ -205,6 +205,14 @@ export const put = async (path: string, body: any, options?: Omit<RequestInit, '
   return request(path, requestOptions);
 };
 
+// Sends a non-JSON body (Blob, File, ArrayBuffer, stream) as-is
+export const postRaw = async (path: string, body: BodyInit, contentType: string = 'application/octet-stream', options?: Omit<RequestInit, 'method' | 'body'>): Promise<Response> => {
+  return request(path, { ...options, method: 'POST', body, headers: { ...options?.headers, 'Content-Type': contentType } });
+};
+
+// Absolute URL for a backend path, for links the browser fetches itself (e.g. downloads)
+export const buildUrl = (path: string): string => `${BASE_URL}${path}`;
+
 export const del = async (path: string, options?: Omit<RequestInit, 'method'>): Promise<Response> => {
   return request(path, { ...options, method: 'DELETE' });
 };
\ No newline at end of file
@@ -1,4 +1,4 @@
-import { get, post, put, del } from './HttpClient';
+import { get, post, postRaw, put, del, buildUrl } from './HttpClient';
 
 // Define the base path for file system operations
 const FS_PATH = '/frontend/fs';
@@ -163,4 +163,311 @@ export const getMounts = async (): Promise<MountInfo[]> => {
     console.error('FileClient: Error getting mounts:', err);
     throw new Error(err.message || 'Failed to get mounts. Is the backend server running?');
   }
-}; 
\ No newline at end of file
+}; 
+// --- Line-Oriented Reads (for files too large to load whole) ---
+
+export interface LinesResult {
+  start: number;
+  lines: string[];
+  next_line: number; // Line to request next; pass as fromLine when following
+  total_lines: number;
+  complete_lines: number; // Lines terminated by a newline
+  size: number;
+  mtime: number;
+  eof: boolean;
+  truncated: boolean; // An overlong line was cut
+  reset?: boolean | null; // followLines only: file shrank, reading restarted at line 0
+}
+
+const fetchLines = async (endpoint: string, params: Record<string, string>, signal?: AbortSignal): Promise<LinesResult> => {
+  const response = await get(`${FS_PATH}/${endpoint}?${encodeParams(params)}`, { signal });
+
+  if (!response.ok) {
+    const errorText = await response.text();
+    throw new Error(`HTTP error ${response.status} (${response.statusText}): ${errorText}`);
+  }
+
+  return (await response.json()) as LinesResult;
+};
+
+export const readLines = async (mountName: string, filePath: string, start: number, count: number = 200): Promise<LinesResult> => {
+  try {
+    return await fetchLines('lines', { mount: mountName, path: filePath, start: String(start), count: String(count) });
+  } catch (err: any) {
+    console.error('FileClient: Error reading lines:', err);
+    throw new Error(err.message || 'Failed to read lines. Is the backend server running?');
+  }
+};
+
+export const tailLines = async (mountName: string, filePath: string, count: number = 200): Promise<LinesResult> => {
+  try {
+    return await fetchLines('tail', { mount: mountName, path: filePath, count: String(count) });
+  } catch (err: any) {
+    console.error('FileClient: Error tailing file:', err);
+    throw new Error(err.message || 'Failed to tail file. Is the backend server running?');
+  }
+};
+
+// Long-polls once for lines appended at or after fromLine (returns empty lines after `wait` seconds)
+export const followLines = async (
+  mountName: string,
+  filePath: string,
+  fromLine: number,
+  wait: number = 25,
+  signal?: AbortSignal
+): Promise<LinesResult> => {
+  try {
+    return await fetchLines('follow', { mount: mountName, path: filePath, from_line: String(fromLine), wait: String(wait) }, signal);
+  } catch (err: any) {
+    console.error('FileClient: Error following file:', err);
+    throw new Error(err.message || 'Failed to follow file. Is the backend server running?');
+  }
+};
+
+// --- Directory Archives ---
+
+export type ArchiveFormat = 'zip' | 'tar' | 'tar.gz';
+
+export interface ImportResult {
+  message: string;
+  files: number;
+  directories: number;
+  bytes: number;
+}
+
+// URL of a directory archive streamed by the server; use it as a link/download target so the browser streams it to disk
+export const getExportUrl = (mountName: string, dirPath: string, format: ArchiveFormat = 'zip', skipCompressed: boolean = true): string => {
+  const params = encodeParams({ mount: mountName, path: dirPath, format, skip_compressed: String(skipCompressed) });
+  return buildUrl(`${FS_PATH}/export?${params}`);
+};
+
+// Uploads a zip/tar/tar.gz archive and extracts it into a directory (format is detected by the server)
+export const importArchive = async (
+  mountName: string,
+  dirPath: string,
+  archive: Blob,
+  overwrite: boolean = false
+): Promise<ImportResult> => {
+  try {
+    const params = encodeParams({ mount: mountName, path: dirPath, overwrite: String(overwrite) });
+    const response = await postRaw(`${FS_PATH}/import?${params}`, archive, archive.type || 'application/octet-stream');
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP error ${response.status} (${response.statusText}): ${errorText}`);
+    }
+
+    return (await response.json()) as ImportResult;
+  } catch (err: any) {
+    console.error('FileClient: Error importing archive:', err);
+    throw new Error(err.message || 'Failed to import archive. Is the backend server running?');
+  }
+};
+
+// --- Versioned Reads and Patch Writes ---
+
+export interface VersionedFile {
+  content: string;
+  etag: string; // Version of the content, the base for patchFile
+}
+
+// Replace base[start:end] with text; offsets count Unicode code points, not UTF-16 units
+export interface TextEdit {
+  start: number;
+  end: number;
+  text: string;
+}
+
+export interface PatchResult {
+  message: string;
+  etag: string; // New version, the base for the next patch
+  size: number;
+}
+
+// The file changed on disk since `baseEtag`; reload it (currentEtag is the version now on disk)
+export class FileConflictError extends Error {
+  currentEtag: string | null;
+
+  constructor(message: string, currentEtag: string | null) {
+    super(message);
+    this.name = 'FileConflictError';
+    this.currentEtag = currentEtag;
+  }
+}
+
+const stripEtag = (etag: string | null): string | null => (etag ? etag.replace(/^W\//, '').replace(/"/g, '') : null);
+
+export const readFileVersioned = async (mountName: string, filePath: string): Promise<VersionedFile> => {
+  try {
+    const params = encodeParams({ mount: mountName, path: filePath });
+    const response = await get(`${FS_PATH}/read?${params}`);
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP error ${response.status} (${response.statusText}): ${errorText}`);
+    }
+
+    return { content: await response.json(), etag: stripEtag(response.headers.get('ETag')) ?? '' };
+  } catch (err: any) {
+    console.error('FileClient: Error reading file:', err);
+    throw new Error(err.message || 'Failed to read file. Is the backend server running?');
+  }
+};
+
+// Sends only the changes made since version `baseEtag`, as edits or a unified diff
+export const patchFile = async (
+  mountName: string,
+  filePath: string,
+  baseEtag: string,
+  patch: { edits: TextEdit[] } | { diff: string }
+): Promise<PatchResult> => {
+  try {
+    const response = await post(`${FS_PATH}/patch`, { mount: mountName, path: filePath, base_etag: baseEtag, ...patch });
+
+    if (response.status === 409) {
+      throw new FileConflictError(
+        `File '${filePath}' changed on disk since it was loaded; reload it or use Save As`,
+        stripEtag(response.headers.get('ETag'))
+      );
+    }
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP error ${response.status} (${response.statusText}): ${errorText}`);
+    }
+
+    return (await response.json()) as PatchResult;
+  } catch (err: any) {
+    if (err instanceof FileConflictError) throw err;
+    console.error('FileClient: Error patching file:', err);
+    throw new Error(err.message || 'Failed to patch file. Is the backend server running?');
+  }
+};
+
+const isHighSurrogate = (code: number) => (code & 0xfc00) === 0xd800;
+const isLowSurrogate = (code: number) => (code & 0xfc00) === 0xdc00;
+
+// Code points in s[from:to] (a surrogate pair counts once, as on the server)
+const countCodePoints = (s: string, from: number, to: number): number => {
+  let count = 0;
+  for (let i = from; i < to; i++) {
+    if (!(isLowSurrogate(s.charCodeAt(i)) && i > from && isHighSurrogate(s.charCodeAt(i - 1)))) count++;
+  }
+  return count;
+};
+
+// The single edit turning `before` into `after` (everything between the common prefix and suffix); null if equal
+export const diffText = (before: string, after: string): TextEdit | null => {
+  if (before === after) return null;
+  const max = Math.min(before.length, after.length);
+  let prefix = 0;
+  while (prefix < max && before.charCodeAt(prefix) === after.charCodeAt(prefix)) prefix++;
+  if (prefix > 0 && isHighSurrogate(before.charCodeAt(prefix - 1))) prefix--; // never split a pair
+  let suffix = 0;
+  while (suffix < max - prefix && before.charCodeAt(before.length - 1 - suffix) === after.charCodeAt(after.length - 1 - suffix)) suffix++;
+  if (suffix > 0 && isLowSurrogate(before.charCodeAt(before.length - suffix))) suffix--;
+
+  const start = countCodePoints(before, 0, prefix);
+  return {
+    start,
+    end: start + countCodePoints(before, prefix, before.length - suffix),
+    text: after.slice(prefix, after.length - suffix),
+  };
+};
+
+// --- Version History (when snapshots are enabled on the server) ---
+
+export interface FileVersion {
+  v: number;
+  time: number; // Unix seconds
+  op: 'write' | 'patch' | 'restore' | 'external' | 'delete'; // 'external': changed outside the app, captured before the next save
+  size: number | null; // null for a deletion
+  etag: string | null; // Matches the ETag of readFileVersioned for the same content
+}
+
+export interface RestoreResult {
+  message: string;
+  etag: string;
+  version: number | null; // The new version recording the restore; null if the file already had that content
+}
+
+export interface SnapshotGcResult {
+  paths: number;
+  versions: number;
+  versions_removed: number;
+  objects: number;
+  objects_removed: number;
+  bytes_freed: number;
+}
+
+// Versions of a file, oldest first (a deleted file keeps its history)
+export const listVersions = async (mountName: string, filePath: string): Promise<FileVersion[]> => {
+  try {
+    const params = encodeParams({ mount: mountName, path: filePath });
+    const response = await get(`${FS_PATH}/versions?${params}`);
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP error ${response.status} (${response.statusText}): ${errorText}`);
+    }
+
+    return (await response.json()) as FileVersion[];
+  } catch (err: any) {
+    console.error('FileClient: Error listing versions:', err);
+    throw new Error(err.message || 'Failed to list versions. Is the backend server running?');
+  }
+};
+
+// URL of an old version's content streamed by the server (for downloads or large files)
+export const getVersionUrl = (mountName: string, filePath: string, version: number): string => {
+  return buildUrl(`${FS_PATH}/version?${encodeParams({ mount: mountName, path: filePath, version: String(version) })}`);
+};
+
+export const readVersion = async (mountName: string, filePath: string, version: number): Promise<string> => {
+  try {
+    const params = encodeParams({ mount: mountName, path: filePath, version: String(version) });
+    const response = await get(`${FS_PATH}/version?${params}`);
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP error ${response.status} (${response.statusText}): ${errorText}`);
+    }
+
+    return (await response.text()).replace(/\r\n?/g, '\n'); // Line endings as readFile returns them
+  } catch (err: any) {
+    console.error('FileClient: Error reading version:', err);
+    throw new Error(err.message || 'Failed to read version. Is the backend server running?');
+  }
+};
+
+// Replaces the file with an old version (recreating it if deleted); the returned etag is the new base for patchFile
+export const restoreVersion = async (mountName: string, filePath: string, version: number): Promise<RestoreResult> => {
+  try {
+    const response = await post(`${FS_PATH}/restore`, { mount: mountName, path: filePath, version });
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP error ${response.status} (${response.statusText}): ${errorText}`);
+    }
+
+    return (await response.json()) as RestoreResult;
+  } catch (err: any) {
+    console.error('FileClient: Error restoring version:', err);
+    throw new Error(err.message || 'Failed to restore version. Is the backend server running?');
+  }
+};
+
+export const collectSnapshotGarbage = async (): Promise<SnapshotGcResult> => {
+  try {
+    const response = await post(`${FS_PATH}/snapshots/gc`, {});
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP error ${response.status} (${response.statusText}): ${errorText}`);
+    }
+
+    return (await response.json()) as SnapshotGcResult;
+  } catch (err: any) {
+    console.error('FileClient: Error collecting snapshot garbage:', err);
+    throw new Error(err.message || 'Failed to collect snapshot garbage. Is the backend server running?');
+  }
+};
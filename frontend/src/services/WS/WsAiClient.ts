@@ -5,17 +5,36 @@ import type { Ref } from 'vue'; // Import Ref if exposing status
 import { WebSocketStatus } from './types'; // Import status enum
 import { log } from "@/components/Logger/loggerStore";
 
+// A file the server reads and injects into the message (optionally only a line range)
+export interface ChatAttachment {
+  mount: string;
+  path: string;
+  start_line?: number; // 0-based, together with line_count
+  line_count?: number;
+}
+
 // Define the structure expected by the backend's ChatRequest (excluding request_id)
 export interface AiChatPayload {
   model: string;
   system_prompt?: string | null;
-  messages: Array<{ role: string; content: string }>;
+  // Attachments are resolved server-side, so file contents never travel in the request
+  messages: Array<{ role: string; content: string; attachments?: ChatAttachment[] }>;
   stream?: boolean;
   temperature?: number | null;
+  // Optional override of the server's context compaction policy
+  context?: {
+    policy?: 'none' | 'truncate' | 'window';
+    max_messages?: number;
+    max_tokens?: number;
+  } | null;
+  // Session mode: the server keeps the history, so `messages` holds only the new turn
+  session_id?: string | null;
+  // Resumable streaming; filled in by sendChatMessage for streamed requests
+  stream_id?: string;
 }
 
-// Internal WsClient instance
-const internalClient: WsClient = createWebSocketClient('/frontend/ws/chat');
+// Internal WsClient instance; token frames use the compact binary protocol when the server supports it
+const internalClient: WsClient = createWebSocketClient('/frontend/ws/chat', { protocol: 'msgpack' });
 
 // --- Exposed API ---
 
@@ -31,6 +50,10 @@ async function sendChatMessage(
   callback: InteractionCallback
 ): Promise<number | null> {
   log("WsAiClient.ts", `sendChatMessage called with payload: ${JSON.stringify(payload)}`);
+  // A stream id lets a dropped socket resume the answer instead of regenerating it
+  if (payload.stream && !payload.stream_id) {
+    payload = { ...payload, stream_id: crypto.randomUUID() };
+  }
   const id = await internalClient.startInteraction('', payload, callback);
   log("WsAiClient.ts", `sendChatMessage received interaction ID: ${id}`);
   return id;
@@ -3,13 +3,38 @@ import type { Ref } from 'vue';
 import { WebSocketStatus } from './types';
 import type { InteractionCallback, InteractionMessage } from './types';
 import { log } from '@/components/Logger/loggerStore';
+import { MSGPACK_SUBPROTOCOL, decodeFrame, encodeFrame } from './msgpack';
 
 /**
  * Generic WebSocket client that multiplexes interactions over one socket.
  * Each outgoing frame includes a unique `request_id`; server echoes the id
  * on every incremental packet so we can route it to the correct callback.
+ *
+ * Frames are JSON text by default. With `{ protocol: 'msgpack' }` the client
+ * offers the binary `genesis.msgpack.v1` subprotocol and uses it if the
+ * server accepts; otherwise it silently stays on JSON.
+ *
+ * An interaction ends when `isComplete` says so (by default: a frame carrying
+ * `meta` or `error`). If the socket closes first, every pending callback
+ * receives an `error` frame so awaiting callers are not left hanging.
+ *
+ * Interactions whose payload carries a `stream_id` are resumable (see
+ * backend/services/ai/streams.py): when the socket drops unexpectedly they
+ * stay pending, the client reconnects with backoff and sends
+ * `{request_id, stream_id, last_seq}` under the same id, and the server
+ * replays only the events after the last `seq` seen.
  */
 
+export interface WsClientOptions {
+  protocol?: 'json' | 'msgpack';
+  isComplete?: (message: InteractionMessage) => boolean;
+}
+
+const defaultIsComplete = (msg: InteractionMessage): boolean => Boolean(msg.meta || msg.error);
+
+// Delays before each reconnect attempt while resumable interactions are pending
+const RESUME_DELAYS_MS = [250, 1000, 3000, 10000];
+
 export interface WsClient {
   status: Ref<WebSocketStatus>;
   connect: () => Promise<void>;
@@ -25,11 +50,15 @@ export interface WsClient {
 // Define the base URL for the WebSocket server
 const WS_BASE_URL = 'ws://localhost:8000';
 
-export function createWebSocketClient(relativePath: string): WsClient {
+export function createWebSocketClient(relativePath: string, options: WsClientOptions = {}): WsClient {
   let ws: WebSocket | null = null;
   const status = ref<WebSocketStatus>(WebSocketStatus.Disconnected);
   const interactions = new Map<number, InteractionCallback>();
+  // Resumable interactions: stream id and last seq received, by request id
+  const resumable = new Map<number, { streamId: string; lastSeq: number }>();
   let nextId = 0;
+  let closedByUser = false;
+  let resuming = false;
 
   // -------------------------------------------------------------------
   // Connection helpers
@@ -38,8 +67,11 @@ export function createWebSocketClient(relativePath: string): WsClient {
   async function connect(): Promise<void> {
     if (ws && ws.readyState <= WebSocket.OPEN) return; // already connecting/connected
 
-    interactions.clear();
-    nextId = 0;
+    // Ids of interactions waiting to resume stay valid across the reconnect
+    if (!resumable.size) {
+      interactions.clear();
+      nextId = 0;
+    }
     status.value = WebSocketStatus.Connecting;
 
     return new Promise((resolve, reject) => {
@@ -47,13 +79,16 @@ export function createWebSocketClient(relativePath: string): WsClient {
       let formattedPath = relativePath.startsWith('/') ? relativePath : `/${relativePath}`;
 
       const fullUrl = `${WS_BASE_URL}${formattedPath}`;
-      ws = new WebSocket(fullUrl);
+      ws = options.protocol === 'msgpack'
+        ? new WebSocket(fullUrl, [MSGPACK_SUBPROTOCOL])
+        : new WebSocket(fullUrl);
+      ws.binaryType = 'arraybuffer';
       log('WsClientFactory.ts', `WebSocket connecting... Base: ${WS_BASE_URL}, Path: ${formattedPath}, Full URL: ${ws.url}`);
 
       ws.onopen = () => {
         status.value = WebSocketStatus.Connected;
         if (ws) {
-          log('WsClientFactory.ts', `WebSocket connected. URL: ${ws.url}`);
+          log('WsClientFactory.ts', `WebSocket connected. URL: ${ws.url}, Protocol: ${ws.protocol || 'json'}`);
         }
         resolve();
       };
@@ -76,17 +111,26 @@ export function createWebSocketClient(relativePath: string): WsClient {
           : WebSocketStatus.Error;
         log('WsClientFactory.ts', `WebSocket closed. URL: ${currentWsUrl || fullUrl}, Code: ${ev.code}, Reason: ${ev.reason}, Clean: ${clean}`, !clean);
         ws = null;
-        interactions.clear();
-        nextId = 0;
+        const keepResumable = !closedByUser;
+        closedByUser = false;
+        for (const [id, cb] of [...interactions]) {
+          if (keepResumable && resumable.has(id)) continue;
+          finish(id, cb, `WebSocket closed (code ${ev.code})`);
+        }
+        if (resumable.size) {
+          if (!resuming) void resumeStreams();
+        } else {
+          nextId = 0;
+        }
       };
 
       ws.onmessage = ev => {
         let msg: any;
         try {
-          msg = JSON.parse(ev.data);
+          msg = ev.data instanceof ArrayBuffer ? decodeFrame(ev.data) : JSON.parse(ev.data);
         } catch {
-          console.error('Invalid JSON:', ev.data);
-          log('WsClientFactory.ts', `Received invalid JSON over WebSocket. Data: ${ev.data}`, true);
+          console.error('Invalid frame:', ev.data);
+          log('WsClientFactory.ts', `Received invalid frame over WebSocket. Data: ${ev.data}`, true);
           return;
         }
         log('WsClientFactory.ts', `WebSocket message received. Data: ${JSON.stringify(msg)}`);
@@ -99,12 +143,10 @@ export function createWebSocketClient(relativePath: string): WsClient {
             return;
           }
 
-          const im: InteractionMessage = {
-            text: msg.text,
-            thinking: msg.thinking,
-            meta: msg.meta,
-            error: msg.error,
-          } as InteractionMessage;
+          // Everything but the routing id (text/thinking/meta/error for chat, chunk/result/status for FS)
+          const { request_id: _id, ...im } = msg as InteractionMessage & { request_id: number };
+          const stream = resumable.get(msg.request_id);
+          if (stream && typeof im.seq === 'number') stream.lastSeq = im.seq;
 
           try {
             cb(im);
@@ -114,8 +156,9 @@ export function createWebSocketClient(relativePath: string): WsClient {
           }
 
           // --- Automatic Cleanup ---
-          // If the message signals completion (contains meta or error), remove the interaction.
-          if (msg.meta || msg.error) {
+          // If the message signals completion (by default: contains meta or error), remove the interaction.
+          if ((options.isComplete ?? defaultIsComplete)(im)) {
+            resumable.delete(msg.request_id);
             const deleted = interactions.delete(msg.request_id);
             if (deleted) {
               log('WsClientFactory.ts', `Interaction automatically cleaned up due to completion/error signal. ID: ${msg.request_id}`);
@@ -137,6 +180,7 @@ export function createWebSocketClient(relativePath: string): WsClient {
     const currentWsUrl = ws?.url;
     if (ws) {
         log('WsClientFactory.ts', `Disconnecting WebSocket... URL: ${currentWsUrl}`);
+        closedByUser = true;
         ws.close();
     } else {
         // Ensure relativePath starts with / and ends with / for logging consistency
@@ -145,6 +189,58 @@ export function createWebSocketClient(relativePath: string): WsClient {
     }
   }
 
+  // -------------------------------------------------------------------
+  // Resuming streams after an unexpected close
+  // -------------------------------------------------------------------
+
+  function finish(id: number, cb: InteractionCallback, error: string) {
+    interactions.delete(id);
+    resumable.delete(id);
+    try {
+      cb({ error });
+    } catch (err) {
+      console.error('Interaction callback threw', err);
+    }
+  }
+
+  async function resumeStreams(): Promise<void> {
+    resuming = true;
+    try {
+      for (const delay of RESUME_DELAYS_MS) {
+        await new Promise(resolve => setTimeout(resolve, delay));
+        if (!resumable.size) return;
+        try {
+          await connect();
+        } catch {
+          continue;
+        }
+        for (const [id, { streamId, lastSeq }] of resumable) {
+          log('WsClientFactory.ts', `Resuming stream. ID: ${id}, Stream: ${streamId}, Last seq: ${lastSeq}`);
+          sendFrame({ request_id: id, stream_id: streamId, last_seq: lastSeq });
+        }
+        return;
+      }
+      log('WsClientFactory.ts', `Giving up on resuming ${resumable.size} stream(s) after ${RESUME_DELAYS_MS.length} attempts`, true);
+      for (const id of [...resumable.keys()]) {
+        const cb = interactions.get(id);
+        if (cb) finish(id, cb, 'WebSocket closed and the stream could not be resumed');
+        resumable.delete(id);
+      }
+    } finally {
+      resuming = false;
+    }
+  }
+
+  function sendFrame(message: Record<string, any>) {
+    if (!ws) return;
+    // The server accepted the binary subprotocol only if ws.protocol echoes it
+    if (ws.protocol === MSGPACK_SUBPROTOCOL) {
+      ws.send(encodeFrame(message));
+    } else {
+      ws.send(JSON.stringify(message));
+    }
+  }
+
   // -------------------------------------------------------------------
   // Interaction helpers
   // -------------------------------------------------------------------
@@ -181,6 +277,9 @@ export function createWebSocketClient(relativePath: string): WsClient {
 
     const id = nextId++;
     interactions.set(id, cb);
+    if (typeof payload?.stream_id === 'string') {
+      resumable.set(id, { streamId: payload.stream_id, lastSeq: -1 });
+    }
     log('WsClientFactory.ts', `Starting interaction. ID: ${id}, Payload: ${JSON.stringify(payload)}`); // Route removed from log
 
     // Construct the flat message by merging the id and payload
@@ -189,12 +288,13 @@ export function createWebSocketClient(relativePath: string): WsClient {
         ...payload
     };
 
-    ws.send(JSON.stringify(messageToSend));
+    sendFrame(messageToSend);
 
     return id;
   }
 
   function stopInteraction(id: number): boolean {
+    resumable.delete(id);
     const deleted = interactions.delete(id);
     if(deleted) {
         log('WsClientFactory.ts', `Stopping interaction listener. ID: ${id}`);
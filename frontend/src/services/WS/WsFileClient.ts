@@ -0,0 +1,64 @@
+import { createWebSocketClient } from './WsClientFactory';
+import type { WsClient } from './WsClientFactory';
+import type { InteractionMessage } from './types';
+
+/**
+ * File-system operations over one persistent WebSocket (`/frontend/fs/ws`).
+ *
+ * Same operations and results as `HttpFileClient.ts`, without a separate
+ * HTTP request (headers, CORS, query encoding) per call. Requests are
+ * tagged with a request_id, so many can be in flight at once and complete
+ * in any order. Large reads arrive as chunk frames and are reassembled here.
+ * See backend/services/fs_rpc.py for the wire format.
+ */
+
+export type FsOp = 'list' | 'read' | 'write' | 'delete' | 'mkdir' | 'stat';
+
+export interface FsStat {
+  name: string;
+  path: string;
+  isDirectory: boolean;
+  size: number;
+  mtime: number;
+}
+
+const internalClient: WsClient = createWebSocketClient('/frontend/fs/ws', {
+  protocol: 'msgpack',
+  isComplete: (msg: InteractionMessage) => 'result' in msg || 'error' in msg,
+});
+
+function call<T>(op: FsOp, mount: string, path: string, content?: string): Promise<T> {
+  return new Promise<T>((resolve, reject) => {
+    const chunks: string[] = [];
+    const payload = content === undefined ? { op, mount, path } : { op, mount, path, content };
+    internalClient
+      .startInteraction(op, payload, (msg) => {
+        if (msg.chunk !== undefined) {
+          chunks.push(msg.chunk);
+        } else if (msg.error !== undefined) {
+          reject(new Error(`FS ${op} failed (${msg.status ?? 'socket'}): ${msg.error}`));
+        } else {
+          // Chunked reads end with a {size, chunks} summary instead of the content
+          resolve((chunks.length ? chunks.join('') : msg.result) as T);
+        }
+      })
+      .then((id) => {
+        if (id === null) reject(new Error('FS WebSocket is not connected. Is the backend server running?'));
+      });
+  });
+}
+
+// --- Exposed API (mirrors HttpFileClient) ---
+
+export const WsFileClient = {
+  status: internalClient.status,
+  connect: internalClient.connect,
+  disconnect: internalClient.disconnect,
+  readFile: (mountName: string, filePath: string) => call<string>('read', mountName, filePath),
+  writeFile: (mountName: string, filePath: string, content: string) => call<any>('write', mountName, filePath, content),
+  deleteFile: (mountName: string, filePath: string) => call<any>('delete', mountName, filePath),
+  createDirectory: (mountName: string, dirPath: string) => call<any>('mkdir', mountName, dirPath),
+  listDirectory: (mountName: string, dirPath: string) =>
+    call<Array<{ name: string; path: string; isDirectory: boolean }>>('list', mountName, dirPath),
+  stat: (mountName: string, path: string) => call<FsStat>('stat', mountName, path),
+};
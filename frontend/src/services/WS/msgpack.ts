@@ -0,0 +1,265 @@
+/**
+ * Minimal MessagePack codec for the `genesis.msgpack.v1` WebSocket subprotocol.
+ *
+ * Covers the JSON data model (nil, bool, number, string, array, map) plus
+ * binary (Uint8Array). Integers outside ±2^53 are decoded as (lossy) numbers.
+ * Frames are `[tag, request_id, value]` arrays, with an optional fourth `seq`
+ * element on resumable chat streams; see backend/services/ws_codec.py.
+ */
+
+export const MSGPACK_SUBPROTOCOL = 'genesis.msgpack.v1';
+
+// Event tags shared with the backend
+export const FrameTag = {
+  Text: 0,
+  Thinking: 1,
+  Meta: 2,
+  Error: 3,
+  Message: 4,
+} as const;
+
+const TAG_KEYS: Record<number, string> = {
+  [FrameTag.Text]: 'text',
+  [FrameTag.Thinking]: 'thinking',
+  [FrameTag.Meta]: 'meta',
+  [FrameTag.Error]: 'error',
+};
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+// -------------------------------------------------------------------
+// Encoding
+// -------------------------------------------------------------------
+
+class Writer {
+  private buf = new Uint8Array(64);
+  private view = new DataView(this.buf.buffer);
+  length = 0;
+
+  private reserve(n: number): void {
+    if (this.length + n <= this.buf.length) return;
+    let size = this.buf.length * 2;
+    while (size < this.length + n) size *= 2;
+    const next = new Uint8Array(size);
+    next.set(this.buf.subarray(0, this.length));
+    this.buf = next;
+    this.view = new DataView(next.buffer);
+  }
+
+  u8(v: number): void {
+    this.reserve(1);
+    this.buf[this.length++] = v;
+  }
+
+  u16(v: number): void {
+    this.reserve(2);
+    this.view.setUint16(this.length, v);
+    this.length += 2;
+  }
+
+  u32(v: number): void {
+    this.reserve(4);
+    this.view.setUint32(this.length, v);
+    this.length += 4;
+  }
+
+  i32(v: number): void {
+    this.reserve(4);
+    this.view.setInt32(this.length, v);
+    this.length += 4;
+  }
+
+  f64(v: number): void {
+    this.reserve(8);
+    this.view.setFloat64(this.length, v);
+    this.length += 8;
+  }
+
+  bytes(data: Uint8Array): void {
+    this.reserve(data.length);
+    this.buf.set(data, this.length);
+    this.length += data.length;
+  }
+
+  result(): Uint8Array {
+    return this.buf.slice(0, this.length);
+  }
+}
+
+function writeLength(w: Writer, n: number, fix: number, fixMax: number, m8: number | null, m16: number, m32: number): void {
+  if (n < fixMax) w.u8(fix | n);
+  else if (m8 !== null && n < 0x100) { w.u8(m8); w.u8(n); }
+  else if (n < 0x10000) { w.u8(m16); w.u16(n); }
+  else { w.u8(m32); w.u32(n); }
+}
+
+function writeValue(w: Writer, value: any): void {
+  if (value === null || value === undefined) {
+    w.u8(0xc0);
+  } else if (value === true) {
+    w.u8(0xc3);
+  } else if (value === false) {
+    w.u8(0xc2);
+  } else if (typeof value === 'number') {
+    if (Number.isInteger(value) && value >= 0 && value < 0x100000000) {
+      if (value < 0x80) w.u8(value);
+      else if (value < 0x100) { w.u8(0xcc); w.u8(value); }
+      else if (value < 0x10000) { w.u8(0xcd); w.u16(value); }
+      else { w.u8(0xce); w.u32(value); }
+    } else if (Number.isInteger(value) && value < 0 && value >= -0x80000000) {
+      if (value >= -32) w.u8(value & 0xff);
+      else if (value >= -0x80) { w.u8(0xd0); w.u8(value & 0xff); }
+      else if (value >= -0x8000) { w.u8(0xd1); w.u16(value & 0xffff); }
+      else { w.u8(0xd2); w.i32(value); }
+    } else {
+      w.u8(0xcb);
+      w.f64(value);
+    }
+  } else if (typeof value === 'string') {
+    const data = textEncoder.encode(value);
+    writeLength(w, data.length, 0xa0, 32, 0xd9, 0xda, 0xdb);
+    w.bytes(data);
+  } else if (value instanceof Uint8Array) {
+    if (value.length < 0x100) { w.u8(0xc4); w.u8(value.length); }
+    else if (value.length < 0x10000) { w.u8(0xc5); w.u16(value.length); }
+    else { w.u8(0xc6); w.u32(value.length); }
+    w.bytes(value);
+  } else if (Array.isArray(value)) {
+    writeLength(w, value.length, 0x90, 16, null, 0xdc, 0xdd);
+    for (const item of value) writeValue(w, item);
+  } else if (typeof value === 'object') {
+    // Like JSON.stringify, keys whose value is undefined are dropped
+    const entries = Object.entries(value).filter(([, v]) => v !== undefined);
+    writeLength(w, entries.length, 0x80, 16, null, 0xde, 0xdf);
+    for (const [key, item] of entries) {
+      writeValue(w, key);
+      writeValue(w, item);
+    }
+  } else {
+    throw new TypeError(`Cannot MessagePack-encode ${typeof value}`);
+  }
+}
+
+export function encode(value: any): Uint8Array {
+  const w = new Writer();
+  writeValue(w, value);
+  return w.result();
+}
+
+// -------------------------------------------------------------------
+// Decoding
+// -------------------------------------------------------------------
+
+class Reader {
+  pos = 0;
+  private view: DataView;
+
+  constructor(private buf: Uint8Array) {
+    this.view = new DataView(buf.buffer, buf.byteOffset, buf.byteLength);
+  }
+
+  value(): any {
+    const byte = this.buf[this.pos++];
+    if (byte === undefined) throw new RangeError('Truncated MessagePack frame');
+    if (byte < 0x80) return byte;
+    if (byte >= 0xe0) return byte - 0x100;
+    if (byte >= 0xa0 && byte <= 0xbf) return this.str(byte & 0x1f);
+    if (byte >= 0x90 && byte <= 0x9f) return this.array(byte & 0x0f);
+    if (byte >= 0x80 && byte <= 0x8f) return this.map(byte & 0x0f);
+    switch (byte) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return this.bin(this.read(1));
+      case 0xc5: return this.bin(this.read(2));
+      case 0xc6: return this.bin(this.read(4));
+      case 0xca: { const v = this.view.getFloat32(this.pos); this.pos += 4; return v; }
+      case 0xcb: { const v = this.view.getFloat64(this.pos); this.pos += 8; return v; }
+      case 0xcc: return this.read(1);
+      case 0xcd: return this.read(2);
+      case 0xce: return this.read(4);
+      case 0xcf: { const v = this.view.getBigUint64(this.pos); this.pos += 8; return Number(v); }
+      case 0xd0: { const v = this.view.getInt8(this.pos); this.pos += 1; return v; }
+      case 0xd1: { const v = this.view.getInt16(this.pos); this.pos += 2; return v; }
+      case 0xd2: { const v = this.view.getInt32(this.pos); this.pos += 4; return v; }
+      case 0xd3: { const v = this.view.getBigInt64(this.pos); this.pos += 8; return Number(v); }
+      case 0xd9: return this.str(this.read(1));
+      case 0xda: return this.str(this.read(2));
+      case 0xdb: return this.str(this.read(4));
+      case 0xdc: return this.array(this.read(2));
+      case 0xdd: return this.array(this.read(4));
+      case 0xde: return this.map(this.read(2));
+      case 0xdf: return this.map(this.read(4));
+    }
+    throw new Error(`Unsupported MessagePack type byte 0x${byte.toString(16)}`);
+  }
+
+  private read(size: 1 | 2 | 4): number {
+    const v = size === 1 ? this.view.getUint8(this.pos)
+      : size === 2 ? this.view.getUint16(this.pos)
+      : this.view.getUint32(this.pos);
+    this.pos += size;
+    return v;
+  }
+
+  private str(n: number): string {
+    const s = textDecoder.decode(this.buf.subarray(this.pos, this.pos + n));
+    this.pos += n;
+    return s;
+  }
+
+  private bin(n: number): Uint8Array {
+    const b = this.buf.slice(this.pos, this.pos + n);
+    this.pos += n;
+    return b;
+  }
+
+  private array(n: number): any[] {
+    const items = new Array(n);
+    for (let i = 0; i < n; i++) items[i] = this.value();
+    return items;
+  }
+
+  private map(n: number): Record<string, any> {
+    const obj: Record<string, any> = {};
+    for (let i = 0; i < n; i++) {
+      const key = this.value();
+      obj[String(key)] = this.value();
+    }
+    return obj;
+  }
+}
+
+export function decode(data: ArrayBuffer | Uint8Array): any {
+  return new Reader(data instanceof Uint8Array ? data : new Uint8Array(data)).value();
+}
+
+// -------------------------------------------------------------------
+// Tagged frames
+// -------------------------------------------------------------------
+
+/** `{request_id, ...fields}` -> `[FrameTag.Message, request_id, fields]` (requests are always message frames). */
+export function encodeFrame(message: Record<string, any>): Uint8Array {
+  const { request_id = null, ...fields } = message;
+  return encode([FrameTag.Message, request_id, fields]);
+}
+
+/** `[tag, request_id, value(, seq)]` -> the same object shape a JSON frame would have. */
+export function decodeFrame(data: ArrayBuffer | Uint8Array): Record<string, any> {
+  const frame = decode(data);
+  if (!Array.isArray(frame) || frame.length < 3) {
+    throw new Error('Expected a [tag, request_id, value] frame');
+  }
+  const [tag, requestId, value] = frame;
+  const msg: Record<string, any> = requestId === null ? {} : { request_id: requestId };
+  if (frame.length > 3) msg.seq = frame[3];
+  if (tag === FrameTag.Message) {
+    Object.assign(msg, value);
+  } else if (tag in TAG_KEYS) {
+    msg[TAG_KEYS[tag]] = value;
+  } else {
+    throw new Error(`Unknown frame tag: ${tag}`);
+  }
+  return msg;
+}
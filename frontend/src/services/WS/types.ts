@@ -3,6 +3,11 @@ export interface InteractionMessage {
   thinking?: boolean;
   meta?: any;
   error?: any;
+  seq?: number; // position in a resumable chat stream
+  // File-system socket frames (see WsFileClient.ts)
+  chunk?: string;
+  result?: any;
+  status?: number;
 }
 
 export type InteractionCallback = (message: InteractionMessage) => void;